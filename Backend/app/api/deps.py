@@ -2,10 +2,16 @@
 Dependencies for API endpoints (auth, etc.)
 """
 
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from app.api.services.supabase.supabase_service import supabase_service
+from app.api.services.storage import storage_service
+from app.core.metrics import AUTH_SECONDS
+from app.core.config import settings
+from app.core.profiler import profile_request
+from app.core.tracing import add_span, current_trace
 
 security = HTTPBearer(auto_error=False)
 
@@ -13,26 +19,34 @@ security = HTTPBearer(auto_error=False)
 def get_current_user(
     cred: HTTPAuthorizationCredentials | None = Depends(security),
 ) -> dict:
-    """Valida el JWT de Supabase usando la API (service_role) y devuelve el payload del usuario."""
+    """Valida el Bearer token con el backend de persistencia (Supabase: JWT vía API) y devuelve el payload del usuario."""
     if cred is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Bearer token requerido",
         )
-    if not supabase_service.supabase:
+    if not storage_service.is_connected():
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Servicio no disponible",
         )
+    outcome = "error"
+    t0 = time.perf_counter()
     try:
-        r = supabase_service.supabase.auth.get_user(cred.credentials)
-        user = r.user
+        user = storage_service.get_user_from_token(cred.credentials)
         if not user:
+            outcome = "invalid"
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token inválido",
             )
-        return {"sub": str(user.id), "email": user.email}
+        outcome = "ok"
+        trace = current_trace()
+        if trace is not None:
+            trace.user_id = user.get("sub")
+        # Con el usuario ya conocido: el profiler armado decide si perfila esta petición
+        profile_request(user.get("sub"))
+        return user
     except HTTPException:
         raise
     except Exception as e:
@@ -43,3 +57,17 @@ def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido o expirado",
         )
+    finally:
+        elapsed = time.perf_counter() - t0
+        AUTH_SECONDS.labels(outcome=outcome).observe(elapsed)
+        add_span("auth", elapsed)
+
+
+def get_admin_user(user: dict = Depends(get_current_user)) -> dict:
+    """Solo usuarios listados en Settings.ADMIN_USER_IDS."""
+    if user.get("sub") not in settings.ADMIN_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo administradores",
+        )
+    return user
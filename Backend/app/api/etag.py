@@ -0,0 +1,64 @@
+"""
+ETag / If-None-Match para los GET de datos.
+El ETag se deriva de la versión de datos (accounts.data_version) de cada cuenta implicada
+más la ruta y los parámetros de la query, así que un 304 no necesita leer transactions.
+"""
+
+import hashlib
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+from app.core.metrics import cache_result
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(request: Request, versions: Dict[str, int], *extra: str) -> str:
+    """ETag fuerte: hash de ruta + query ordenada + (account_id, versión) ordenados + extras (ej. usuario)."""
+    query = sorted(request.query_params.multi_items())
+    parts = [
+        request.url.path,
+        "&".join(f"{k}={v}" for k, v in query),
+        ",".join(f"{acc}:{ver}" for acc, ver in sorted(versions.items())),
+        *extra,
+    ]
+    digest = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil (RFC 9110) contra la lista de If-None-Match."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    versions: Optional[Dict[str, int]],
+    *extra: str,
+) -> Optional[Response]:
+    """
+    Añade ETag a la respuesta y devuelve un 304 si el cliente ya tiene esa versión.
+    versions=None (no disponibles) -> sin ETag, el endpoint responde normal.
+    """
+    if versions is None:
+        return None
+    etag = compute_etag(request, versions, *extra)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    hit = etag_matches(request.headers.get("if-none-match"), etag)
+    cache_result("etag", hit)
+    if hit:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
@@ -0,0 +1,37 @@
+"""
+Respuestas JSON rápidas (orjson) para los endpoints de datos.
+Devolver directamente un FastJSONResponse evita el paso por jsonable_encoder + json.dumps
+de FastAPI, que es lo que domina el tiempo con 10k filas.
+"""
+
+from decimal import Decimal
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """ORJSONResponse que además acepta Decimal, claves no str y arrays numpy."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+
+
+def data_response(content: Any, response: Optional[Response] = None) -> FastJSONResponse:
+    """Serializa content con orjson conservando las cabeceras ya puestas en `response` (ej. ETag)."""
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    return FastJSONResponse(content, headers=headers)
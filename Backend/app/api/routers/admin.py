@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from typing import Dict, Any, Optional
+from pydantic import BaseModel, Field
+
+from app.api.deps import get_admin_user
+from app.core.profiler import list_profiles, profile_path, profile_session
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"]
+)
+
+
+class ProfileRequest(BaseModel):
+    """Perfilar las próximas `requests` peticiones (filtros opcionales: prefijo de ruta y usuario)."""
+    requests: int = Field(default=1, ge=1, le=100)
+    path_prefix: Optional[str] = None  # ej. "/upload/Transactions" para la próxima subida
+    user_id: Optional[str] = None  # solo peticiones de este usuario
+
+
+@router.post("/profile", summary="Armar el profiler para las próximas peticiones")
+def arm_profiler(
+    body: ProfileRequest,
+    _admin: dict = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    profile_session.arm(body.requests, body.path_prefix, body.user_id, armed_by=_admin.get("sub"))
+    print(f"[profiler] armado por {_admin.get('sub')}: {profile_session.status()}")
+    return profile_session.status()
+
+
+@router.delete("/profile", summary="Desarmar el profiler")
+def disarm_profiler(_admin: dict = Depends(get_admin_user)) -> Dict[str, Any]:
+    profile_session.disarm()
+    return profile_session.status()
+
+
+@router.get("/profile", summary="Estado del profiler y perfiles guardados")
+def profiler_status(_admin: dict = Depends(get_admin_user)) -> Dict[str, Any]:
+    return {**profile_session.status(), "profiles": list_profiles()}
+
+
+@router.get("/profile/{name}", summary="Descargar un perfil (.collapsed, para flamegraph.pl / speedscope)")
+def download_profile(name: str, _admin: dict = Depends(get_admin_user)):
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=name)
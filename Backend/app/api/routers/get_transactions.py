@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import date
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel
 
 from app.api.deps import get_current_user
-from app.api.services.supabase.supabase_service import supabase_service
+from app.api.etag import conditional_response
+from app.api.responses import data_response
+from app.api.routers.jobs import submit_job
+from app.api.services.storage import TransactionFilters, storage_service
 from app.api.services.account_config import is_account_shared
+from app.api.services.columnar import to_columnar
 
 router = APIRouter(
     prefix="/GET",
@@ -28,25 +34,140 @@ class TransactionDetailsUpdate(BaseModel):
     importe: Optional[float] = None
 
 
+class TransactionSelection(BaseModel):
+    """Selección masiva: lista de ids de fila y/o filtro (cuenta, rango de fechas, lote de importación)."""
+    ids: Optional[List[int]] = None
+    account_id: Optional[str] = None
+    from_date: Optional[str] = None  # YYYY-MM-DD
+    to_date: Optional[str] = None  # YYYY-MM-DD (incluye el día completo)
+    import_batch: Optional[str] = None  # devuelto por /upload/Transactions
+    # True: si algún id no existe o no es del usuario no se modifica nada.
+    # False: se procesan los propios y se informa del resto (not_found / forbidden).
+    atomic: bool = True
+
+
+class BulkTransactionChanges(TransactionDetailsUpdate):
+    """Cambios a aplicar a todas las transacciones seleccionadas."""
+    categoria: Optional[str] = None
+    subcategoria: Optional[str] = None
+
+
+class BulkTransactionUpdate(TransactionSelection):
+    changes: BulkTransactionChanges
+
+
+def _category_update_data(payload: CategoryUpdate | BulkTransactionChanges) -> Dict[str, Any]:
+    update_data: Dict[str, Any] = {}
+    if payload.categoria is not None:
+        update_data["categoria"] = payload.categoria.strip() or None
+    if payload.subcategoria is not None:
+        update_data["subcategoria"] = payload.subcategoria.strip() or None
+    if update_data:
+        # Editada a mano: la recategorización en segundo plano ya no la toca
+        update_data["categoria_manual"] = True
+    return update_data
+
+
+def _details_update_data(payload: TransactionDetailsUpdate) -> Dict[str, Any]:
+    update_data: Dict[str, Any] = {}
+    if payload.dt_date is not None:
+        val = payload.dt_date.strip() if isinstance(payload.dt_date, str) else str(payload.dt_date)
+        if val:
+            if "T" not in val and len(val) <= 10:
+                val = f"{val}T00:00:00"
+            update_data["dt_date"] = val
+    if payload.descripcion is not None:
+        update_data["descripcion"] = payload.descripcion.strip() if payload.descripcion else None
+    if payload.importe is not None:
+        update_data["importe"] = float(payload.importe)
+    return update_data
+
+
+def _resolve_selection(
+    selection: TransactionSelection, account_ids: List[str]
+) -> tuple[List[str], Optional[List[int]], List[int], List[int]]:
+    """
+    Valida la selección masiva contra las cuentas del usuario.
+    Retorna: (cuentas_en_ambito, ids_propios | None si es por filtro, ids_no_encontrados, ids_sin_permiso)
+    """
+    has_filter = bool(selection.account_id or selection.from_date or selection.to_date or selection.import_batch)
+    if not selection.ids and not has_filter:
+        raise HTTPException(status_code=400, detail="Indica ids o algún filtro (account_id, fechas, import_batch)")
+
+    scope = account_ids
+    if selection.account_id:
+        if selection.account_id not in account_ids:
+            raise HTTPException(status_code=403, detail="No tienes permiso para modificar esta cuenta")
+        scope = [selection.account_id]
+
+    if not selection.ids:
+        return scope, None, [], []
+
+    ids = list(dict.fromkeys(selection.ids))
+    owners = storage_service.get_transaction_owners(ids)
+    not_found = [i for i in ids if i not in owners]
+    forbidden = [i for i in ids if i in owners and owners[i] not in account_ids]
+    if selection.atomic and not_found:
+        raise HTTPException(status_code=404, detail=f"Transacciones no encontradas: {not_found}")
+    if selection.atomic and forbidden:
+        raise HTTPException(status_code=403, detail=f"No tienes permiso para modificar las transacciones: {forbidden}")
+    own_ids = [i for i in ids if i in owners and owners[i] in account_ids]
+    return scope, own_ids, not_found, forbidden
+
+
+def _listing_payload(data: List[Dict[str, Any]], fmt: str) -> Dict[str, Any]:
+    """Cuerpo de los listados: filas (por defecto) o columnar con diccionarios."""
+    if fmt == "columnar":
+        return {"success": True, "count": len(data), "format": "columnar", **to_columnar(data)}
+    return {"success": True, "count": len(data), "data": data}
+
+
+def listing_filters(
+    categoria: Optional[str] = Query(None, description="Solo esta categoría"),
+    subcategoria: Optional[str] = Query(None, description="Solo esta subcategoría"),
+    min_importe: Optional[float] = Query(None, description="Importe mínimo (con signo: los gastos son negativos)"),
+    max_importe: Optional[float] = Query(None, description="Importe máximo (con signo)"),
+    tipo: Optional[str] = Query(None, pattern="^(ingresos|gastos)$", description="ingresos (importe > 0) | gastos (importe < 0)"),
+) -> TransactionFilters:
+    """Filtros de columna comunes a los listados; se aplican en la consulta, no en el cliente."""
+    if min_importe is not None and max_importe is not None and min_importe > max_importe:
+        raise HTTPException(status_code=400, detail="min_importe no puede ser mayor que max_importe")
+    return TransactionFilters(
+        categoria=(categoria or "").strip() or None,
+        subcategoria=(subcategoria or "").strip() or None,
+        min_importe=min_importe,
+        max_importe=max_importe,
+        tipo=tipo,
+    )
+
+
+def _account_scope(account_id: Optional[str], account_ids: List[str]) -> List[str]:
+    """Limita el listado a account_id (si se indica), que debe ser una de las cuentas visibles."""
+    if not account_id:
+        return account_ids
+    if account_id not in account_ids:
+        raise HTTPException(status_code=403, detail="No tienes permiso para ver esta cuenta")
+    return [account_id]
+
+
+def _missing_row_error(row_id: int, action: str) -> HTTPException:
+    """Tras una escritura acotada sin filas afectadas, distingue 404 (no existe) de 403 (es de otra cuenta).
+    Solo se consulta en el caso de fallo; el camino normal es una única escritura."""
+    if row_id not in storage_service.get_transaction_owners([row_id]):
+        return HTTPException(status_code=404, detail="Transacción no encontrada")
+    return HTTPException(status_code=403, detail=f"No tienes permiso para {action} esta transacción")
+
+
 def _fetch_for_balances(account_ids: list[str]) -> list:
     """Saldos = valor 'saldo' de la última transacción de cada cuenta.
     dt_date incluye hh:mm:ss (Ibercaja: ficticias, Revolut: reales) para orden correcto."""
     if not account_ids:
         return []
     try:
-        r = (
-            supabase_service.supabase
-            .table("transactions")
-            .select("dt_date, saldo, cuenta, account_id")
-            .in_("account_id", account_ids)
-            .order("dt_date", desc=True)
-            .limit(2000)
-            .execute()
-        )
+        data = storage_service.fetch_latest_balances(account_ids, limit=2000)
     except Exception:
         return []
-    data = r.data or []
-    names = supabase_service.get_account_display_names(account_ids)
+    names = storage_service.get_account_display_names(account_ids)
     for row in data:
         row["cuenta"] = row.get("cuenta") or names.get(row.get("account_id", ""), "Cuenta")
     return data
@@ -57,12 +178,21 @@ def _fetch_for_balances(account_ids: list[str]) -> list:
     summary="Obtener saldo actual por cuenta",
     response_model=Dict[str, Any]
 )
-async def get_balances(user: dict = Depends(get_current_user)) -> Dict[str, Any]:
+async def get_balances(
+    request: Request,
+    response: Response,
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
     """Devuelve el saldo más reciente de cada cuenta del usuario."""
-    if not supabase_service.is_connected():
+    if not storage_service.is_connected():
         raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
     try:
-        account_ids = supabase_service.get_user_account_ids(user.get("sub", ""))
+        account_ids = storage_service.get_user_account_ids(user.get("sub", ""))
+        not_modified = conditional_response(
+            request, response, storage_service.get_account_versions(account_ids), user.get("sub", "")
+        )
+        if not_modified:
+            return not_modified
         data = _fetch_for_balances(account_ids)
         seen = set()
         balances = {}
@@ -79,42 +209,190 @@ async def get_balances(user: dict = Depends(get_current_user)) -> Dict[str, Any]
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get(
+    "/balances/series",
+    summary="Evolución del saldo por cuenta (diaria, semanal o mensual)",
+    response_model=Dict[str, Any]
+)
+async def get_balance_series(
+    request: Request,
+    response: Response,
+    granularity: str = Query("day", pattern="^(day|week|month)$", description="day | week | month"),
+    from_date: Optional[str] = Query(None, description="Primer periodo a devolver (YYYY-MM-DD)"),
+    to_date: Optional[str] = Query(None, description="Último periodo a devolver (YYYY-MM-DD)"),
+    account_id: Optional[str] = Query(None, description="Solo esta cuenta"),
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Saldo al cierre de cada periodo y cuenta, sin huecos (un periodo sin movimientos conserva el saldo
+    del anterior) hasta el periodo actual. Los cierres diarios se cachean por cuenta y solo se releen
+    los días que cambian."""
+    from app.api.services.balance_series import balance_series
+
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    account_ids = _account_scope(account_id, storage_service.get_user_account_ids(user.get("sub", "")))
+    if not account_ids:
+        return {"success": True, "granularity": granularity, "count": 0, "data": []}
+
+    try:
+        versions = storage_service.get_account_versions(account_ids)
+        # La serie llega hasta el periodo actual: el ETag cambia con el día
+        not_modified = conditional_response(request, response, versions, user.get("sub", ""), date.today().isoformat())
+        if not_modified:
+            return not_modified
+        series = balance_series(account_ids, versions, granularity, from_date, to_date)
+        names = storage_service.get_account_display_names(account_ids)
+        data = [
+            {"account_id": aid, "cuenta": names.get(aid, "Cuenta"), "series": points}
+            for aid, points in series.items()
+        ]
+        return data_response(
+            {"success": True, "granularity": granularity, "count": len(data), "data": data}, response
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] get_balance_series: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get(
+    "/rollups",
+    summary="Totales de ingresos y gastos agrupados (por mes, categoría, cuenta...)",
+    response_model=Dict[str, Any]
+)
+async def get_rollups(
+    request: Request,
+    response: Response,
+    group_by: str = Query("month,categoria", description="Dimensiones separadas por comas: account_id, cuenta, categoria, day, week, month"),
+    from_date: Optional[str] = Query(None, description="Fecha inicio YYYY-MM-DD"),
+    to_date: Optional[str] = Query(None, description="Fecha fin YYYY-MM-DD"),
+    exclude_internal: bool = Query(False, description="Excluir transferencias internas entre cuentas propias"),
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Agregados sobre todo el histórico del usuario (sin el límite de filas de /transactions)."""
+    from app.api.services.transaction_frame import ROLLUP_DIMENSIONS, TransactionFrame
+
+    dimensions = [d.strip() for d in group_by.split(",") if d.strip()]
+    if not dimensions or any(d not in ROLLUP_DIMENSIONS for d in dimensions):
+        raise HTTPException(status_code=400, detail=f"group_by admite: {', '.join(ROLLUP_DIMENSIONS)}")
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    account_ids = storage_service.get_user_account_ids(user.get("sub", ""))
+    if not account_ids:
+        return {"success": True, "count": 0, "data": []}
+
+    try:
+        not_modified = conditional_response(
+            request, response, storage_service.get_account_versions(account_ids), user.get("sub", "")
+        )
+        if not_modified:
+            return not_modified
+        frame = TransactionFrame.load(account_ids)
+        mask = frame.between(from_date, to_date) if from_date or to_date else None
+        internal = 0
+        if exclude_internal:
+            transfers = frame.internal_transfer_mask()
+            internal = int(transfers.sum() if mask is None else (transfers & mask).sum())
+            mask = ~transfers if mask is None else mask & ~transfers
+        data = frame.rollup(dimensions, mask)
+        return data_response(
+            {"success": True, "group_by": dimensions, "excluded_internal": internal, "count": len(data), "data": data},
+            response,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] get_rollups: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get(
+    "/recurring",
+    summary="Pagos recurrentes y suscripciones detectados (mensuales, trimestrales, anuales)",
+    response_model=Dict[str, Any]
+)
+async def get_recurring_payments(
+    request: Request,
+    response: Response,
+    include_inactive: bool = Query(False, description="Incluir los que ya no se cobran (próxima fecha vencida)"),
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Agrupa los cargos por comercio y banda de importe y detecta los periódicos, con su próxima fecha.
+    Ordenados por coste mensual equivalente."""
+    from app.api.services.recurring import recurring_payments
+
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    account_ids = storage_service.get_user_account_ids(user.get("sub", ""))
+    if not account_ids:
+        return {"success": True, "count": 0, "coste_mensual": 0.0, "data": []}
+
+    try:
+        versions = storage_service.get_account_versions(account_ids)
+        # 'activa' depende del día: el ETag también
+        not_modified = conditional_response(request, response, versions, user.get("sub", ""), date.today().isoformat())
+        if not_modified:
+            return not_modified
+        data = recurring_payments(account_ids, versions)
+        if not include_inactive:
+            data = [item for item in data if item["activa"]]
+        names = storage_service.get_account_display_names(account_ids)
+        for item in data:
+            item["cuenta"] = names.get(item.get("account_id", ""), item.get("cuenta") or "Cuenta")
+        total = round(sum(item["coste_mensual"] for item in data if item["activa"]), 2)
+        return data_response(
+            {"success": True, "count": len(data), "coste_mensual": total, "data": data}, response
+        )
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] get_recurring_payments: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get(
     "/transactions",
     summary="Obtener transacciones (opcionalmente filtradas por fechas)",
     response_model=Dict[str, Any]
 )
 async def get_transactions(
+    request: Request,
+    response: Response,
     from_date: Optional[str] = Query(None, description="Fecha inicio YYYY-MM-DD"),
     to_date: Optional[str] = Query(None, description="Fecha fin YYYY-MM-DD"),
+    fmt: str = Query("rows", alias="format", pattern="^(rows|columnar)$", description="rows (lista de objetos) | columnar ({columns, data, dictionaries})"),
+    account_id: Optional[str] = Query(None, description="Solo esta cuenta"),
+    filters: TransactionFilters = Depends(listing_filters),
     user: dict = Depends(get_current_user),
 ) -> Dict[str, Any]:
-    if not supabase_service.is_connected():
+    if not storage_service.is_connected():
         raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
-    account_ids = supabase_service.get_user_account_ids(user.get("sub", ""))
+    account_ids = storage_service.get_user_account_ids(user.get("sub", ""))
     if not account_ids:
         return {"success": True, "count": 0, "data": []}
+    account_ids = _account_scope(account_id, account_ids)
 
     try:
-        q = (
-            supabase_service.supabase
-            .table("transactions")
-            .select("*")
-            .in_("account_id", account_ids)
+        not_modified = conditional_response(
+            request, response, storage_service.get_account_versions(account_ids), user.get("sub", "")
         )
-        if from_date:
-            q = q.gte("dt_date", from_date)
-        if to_date:
-            # Incluir todo el día: hasta 23:59:59
-            q = q.lte("dt_date", f"{to_date}T23:59:59.999999")
-        response = q.order("dt_date", desc=True).limit(10000).execute()
-        data = list(response.data or [])
-        names = supabase_service.get_account_display_names(account_ids)
+        if not_modified:
+            return not_modified
+        data = storage_service.fetch_transactions(account_ids, from_date, to_date, limit=10000, filters=filters)
+        names = storage_service.get_account_display_names(account_ids)
         for row in data:
             # Priorizar siempre el display_name actual de la cuenta
             row["cuenta"] = names.get(row.get("account_id", ""), row.get("cuenta") or "Cuenta")
-        return {"success": True, "count": len(data), "data": data}
+        return data_response(_listing_payload(data, fmt), response)
     except Exception as e:
         import traceback
         print(f"[ERROR] get_transactions: {e}")
@@ -122,50 +400,128 @@ async def get_transactions(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get(
+    "/transactions/export",
+    summary="Exportar todas las transacciones (CSV, XLSX o Parquet) en streaming",
+)
+async def export_transactions(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|xlsx|parquet)$", description="csv | xlsx | parquet"),
+    from_date: Optional[str] = Query(None, description="Fecha inicio YYYY-MM-DD"),
+    to_date: Optional[str] = Query(None, description="Fecha fin YYYY-MM-DD"),
+    account_id: Optional[str] = Query(None, description="Solo esta cuenta"),
+    filters: TransactionFilters = Depends(listing_filters),
+    user: dict = Depends(get_current_user),
+) -> StreamingResponse:
+    """Sin el límite de 10k filas de /transactions: recorre el histórico por páginas y escribe según llegan."""
+    from app.api.services.export import FORMATS, export_stream, parquet_available
+
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Exportación a Parquet no disponible (falta pyarrow)")
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    account_ids = storage_service.get_user_account_ids(user.get("sub", ""))
+    if account_ids:
+        account_ids = _account_scope(account_id, account_ids)
+    filename = f"transacciones_{date.today().isoformat()}.{fmt}"
+    return StreamingResponse(
+        export_stream(fmt, account_ids, from_date, to_date, filters),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get(
+    "/transactions/search",
+    summary="Buscar transacciones por texto (descripción, mensaje Bizum, subcategoría)",
+    response_model=Dict[str, Any]
+)
+async def search_transactions(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="Texto a buscar (sin distinguir mayúsculas ni acentos)"),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Resultados por relevancia (a igualdad, los más recientes primero), paginados con limit/offset."""
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    account_ids = storage_service.get_user_account_ids(user.get("sub", ""))
+    if not account_ids:
+        return {"success": True, "count": 0, "has_more": False, "data": []}
+
+    try:
+        not_modified = conditional_response(
+            request, response, storage_service.get_account_versions(account_ids), user.get("sub", "")
+        )
+        if not_modified:
+            return not_modified
+        # Una fila de más para saber si hay otra página sin contar todos los resultados
+        data = storage_service.search_transactions(account_ids, q.strip(), limit=limit + 1, offset=offset)
+        has_more = len(data) > limit
+        data = data[:limit]
+        names = storage_service.get_account_display_names(account_ids)
+        for row in data:
+            row["cuenta"] = names.get(row.get("account_id", ""), row.get("cuenta") or "Cuenta")
+        return data_response(
+            {"success": True, "count": len(data), "offset": offset, "has_more": has_more, "data": data},
+            response,
+        )
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] search_transactions: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get(
     "/shared-transactions",
     summary="Transacciones para análisis de gastos compartidos (propias + de usuarios que comparten cuenta)",
     response_model=Dict[str, Any]
 )
 async def get_shared_transactions(
+    request: Request,
+    response: Response,
     from_date: Optional[str] = Query(None, description="Fecha inicio YYYY-MM-DD"),
     to_date: Optional[str] = Query(None, description="Fecha fin YYYY-MM-DD"),
+    fmt: str = Query("rows", alias="format", pattern="^(rows|columnar)$", description="rows (lista de objetos) | columnar ({columns, data, dictionaries})"),
+    account_id: Optional[str] = Query(None, description="Solo esta cuenta"),
+    filters: TransactionFilters = Depends(listing_filters),
     user: dict = Depends(get_current_user),
 ) -> Dict[str, Any]:
     """Devuelve gastos del usuario y de las personas que comparten alguna cuenta con él (ej. Conjunta).
     Cada fila incluye is_own_account: true si la cuenta es del usuario actual, false si es de otro."""
-    if not supabase_service.is_connected():
+    if not storage_service.is_connected():
         raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
     uid = user.get("sub", "")
-    my_account_ids = supabase_service.get_user_account_ids(uid)
+    my_account_ids = storage_service.get_user_account_ids(uid)
     # Usuarios que comparten al menos una cuenta (ej. Conjunta)
-    other_user_ids = supabase_service.get_user_ids_sharing_accounts_with(uid)
-    their_account_ids = supabase_service.get_account_ids_for_users(other_user_ids) if other_user_ids else []
+    other_user_ids = storage_service.get_user_ids_sharing_accounts_with(uid)
+    their_account_ids = storage_service.get_account_ids_for_users(other_user_ids) if other_user_ids else []
     all_account_ids = list(dict.fromkeys(my_account_ids + their_account_ids))
     my_account_set = set(my_account_ids)
 
     if not all_account_ids:
         return {"success": True, "count": 0, "data": []}
+    all_account_ids = _account_scope(account_id, all_account_ids)
 
     try:
-        q = (
-            supabase_service.supabase
-            .table("transactions")
-            .select("*")
-            .in_("account_id", all_account_ids)
+        # is_own_account depende de qué cuentas son del usuario: va en el ETag
+        not_modified = conditional_response(
+            request, response, storage_service.get_account_versions(all_account_ids),
+            uid, ",".join(sorted(my_account_set)),
         )
-        if from_date:
-            q = q.gte("dt_date", from_date)
-        if to_date:
-            q = q.lte("dt_date", f"{to_date}T23:59:59.999999")
-        response = q.order("dt_date", desc=True).limit(10000).execute()
-        data = list(response.data or [])
-        names = supabase_service.get_account_display_names(all_account_ids)
+        if not_modified:
+            return not_modified
+        data = storage_service.fetch_transactions(all_account_ids, from_date, to_date, limit=10000, filters=filters)
+        names = storage_service.get_account_display_names(all_account_ids)
         for row in data:
             row["cuenta"] = names.get(row.get("account_id", ""), row.get("cuenta") or "Cuenta")
             row["is_own_account"] = row.get("account_id") in my_account_set
-        return {"success": True, "count": len(data), "data": data}
+        return data_response(_listing_payload(data, fmt), response)
     except Exception as e:
         import traceback
         print(f"[ERROR] get_shared_transactions: {e}")
@@ -178,29 +534,30 @@ async def get_shared_transactions(
     summary="Obtener cuentas del usuario actual",
     response_model=Dict[str, Any],
 )
-async def get_accounts(user: dict = Depends(get_current_user)) -> Dict[str, Any]:
+async def get_accounts(
+    request: Request,
+    response: Response,
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
     """
     Devuelve las cuentas vinculadas al usuario actual.
     Cada item incluye id, display_name, stable_key y source.
     """
-    if not supabase_service.is_connected():
+    if not storage_service.is_connected():
         raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
     user_id = user.get("sub", "")
-    account_ids: List[str] = supabase_service.get_user_account_ids(user_id)
+    account_ids: List[str] = storage_service.get_user_account_ids(user_id)
     if not account_ids:
         return {"success": True, "data": []}
 
     try:
-        r = (
-            supabase_service.supabase
-            .table("accounts")
-            .select("id, display_name, stable_key, source")
-            .in_("id", account_ids)
-            .order("display_name", desc=False)
-            .execute()
+        not_modified = conditional_response(
+            request, response, storage_service.get_account_versions(account_ids), user_id
         )
-        data = list(r.data or [])
+        if not_modified:
+            return not_modified
+        data = storage_service.get_accounts(account_ids)
         # Anotar si la cuenta es compartida según la config
         for row in data:
             row["shared"] = is_account_shared(
@@ -215,6 +572,120 @@ async def get_accounts(user: dict = Depends(get_current_user)) -> Dict[str, Any]
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.patch(
+    "/transactions/bulk",
+    summary="Actualizar en bloque varias transacciones (por ids o por filtro)",
+    response_model=Dict[str, Any]
+)
+async def bulk_update_transactions(
+    payload: BulkTransactionUpdate = Body(...),
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Aplica los mismos cambios (categoría, fecha, descripción, importe) a todas las transacciones seleccionadas."""
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    user_id = user.get("sub", "")
+    account_ids = storage_service.get_user_account_ids(user_id)
+    if not account_ids:
+        raise HTTPException(status_code=404, detail="No se han encontrado cuentas para el usuario")
+
+    try:
+        scope, row_ids, not_found, forbidden = _resolve_selection(payload, account_ids)
+        update_data = {**_details_update_data(payload.changes), **_category_update_data(payload.changes)}
+        if not update_data or row_ids == []:
+            return {"success": True, "updated": 0, "not_found": not_found, "forbidden": forbidden}
+
+        updated = storage_service.update_transactions(
+            scope,
+            update_data,
+            row_ids=row_ids,
+            from_date=payload.from_date,
+            to_date=payload.to_date,
+            import_batch=payload.import_batch,
+        )
+        return {"success": True, "updated": len(updated), "not_found": not_found, "forbidden": forbidden}
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] bulk_update_transactions: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/transactions/bulk-delete",
+    summary="Eliminar en bloque varias transacciones (por ids o por filtro)",
+    response_model=Dict[str, Any]
+)
+async def bulk_delete_transactions(
+    payload: TransactionSelection = Body(...),
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Elimina las transacciones propias seleccionadas por ids o por filtro (cuenta, fechas, import_batch)."""
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    user_id = user.get("sub", "")
+    account_ids = storage_service.get_user_account_ids(user_id)
+    if not account_ids:
+        raise HTTPException(status_code=404, detail="No se han encontrado cuentas para el usuario")
+
+    try:
+        scope, row_ids, not_found, forbidden = _resolve_selection(payload, account_ids)
+        if row_ids == []:
+            return {"success": True, "deleted": 0, "not_found": not_found, "forbidden": forbidden}
+
+        deleted = storage_service.delete_transactions(
+            scope,
+            row_ids=row_ids,
+            from_date=payload.from_date,
+            to_date=payload.to_date,
+            import_batch=payload.import_batch,
+        )
+        return {"success": True, "deleted": len(deleted), "not_found": not_found, "forbidden": forbidden}
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] bulk_delete_transactions: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/transactions/recategorize",
+    summary="Volver a aplicar las reglas de categorías al histórico (job en segundo plano)",
+    status_code=202,
+)
+async def recategorize_user_transactions(
+    scope: str = Query("otros", pattern="^(otros|all)$", description="otros: solo sin categoría u 'otros'; all: todas"),
+    user: dict = Depends(get_current_user),
+):
+    """Encola la recategorización de las cuentas del usuario (sus reglas y luego las globales).
+    Las filas editadas a mano no se tocan. Mismas reglas y mismo scope -> mismo job (GET /jobs/{job_id})."""
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    user_id = user.get("sub", "")
+    account_ids = storage_service.get_user_account_ids(user_id)
+    if not account_ids:
+        raise HTTPException(status_code=404, detail="No se han encontrado cuentas para el usuario")
+
+    # pandas y las reglas solo se cargan al usarse (arranque rápido)
+    from app.api.services.pipe_extract_transactions.category_rules import rules_version
+    from app.api.services.recategorize import recategorize_transactions
+    from app.api.services.user_rules import UserRules
+
+    user_rules = UserRules.load(user_id)
+    return submit_job(
+        f"recategorize:{user_id}:{scope}:{rules_version()}:{user_rules.version}",
+        user_id,
+        lambda job: recategorize_transactions(account_ids, scope, progress=job.update, user_rules=user_rules),
+    )
+
+
 @router.patch(
     "/transactions/{row_id}/category",
     summary="Actualizar categoría y subcategoría de una transacción existente",
@@ -226,43 +697,24 @@ async def update_transaction_category(
     user: dict = Depends(get_current_user),
 ) -> Dict[str, Any]:
     """Permite al usuario actualizar categoria y subcategoria de una transacción propia."""
-    if not supabase_service.is_connected():
+    if not storage_service.is_connected():
         raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
     user_id = user.get("sub", "")
-    account_ids = supabase_service.get_user_account_ids(user_id)
+    account_ids = storage_service.get_user_account_ids(user_id)
     if not account_ids:
         raise HTTPException(status_code=404, detail="No se han encontrado cuentas para el usuario")
 
     try:
-        # Comprobar que la transacción existe y pertenece a alguna de las cuentas del usuario
-        r = (
-            supabase_service.supabase
-            .table("transactions")
-            .select("id, account_id")
-            .eq("id", row_id)
-            .limit(1)
-            .execute()
-        )
-        rows = r.data or []
-        if not rows:
-            raise HTTPException(status_code=404, detail="Transacción no encontrada")
-
-        tx = rows[0]
-        if tx.get("account_id") not in account_ids:
-            raise HTTPException(status_code=403, detail="No tienes permiso para modificar esta transacción")
-
-        update_data: Dict[str, Any] = {}
-        if payload.categoria is not None:
-            update_data["categoria"] = payload.categoria.strip() or None
-        if payload.subcategoria is not None:
-            update_data["subcategoria"] = payload.subcategoria.strip() or None
-
+        update_data = _category_update_data(payload)
         if not update_data:
             return {"success": True, "updated": 0}
 
-        supabase_service.supabase.table("transactions").update(update_data).eq("id", row_id).execute()
-        return {"success": True, "updated": 1}
+        # Escritura acotada a las cuentas del usuario: si no afecta a ninguna fila, no existe o no es suya
+        updated = storage_service.update_transactions(account_ids, update_data, row_ids=[row_id])
+        if not updated:
+            raise _missing_row_error(row_id, "modificar")
+        return {"success": True, "updated": len(updated)}
     except HTTPException:
         raise
     except Exception as e:
@@ -283,48 +735,24 @@ async def update_transaction_details(
     user: dict = Depends(get_current_user),
 ) -> Dict[str, Any]:
     """Permite actualizar dt_date, descripcion e importe de una transacción propia."""
-    if not supabase_service.is_connected():
+    if not storage_service.is_connected():
         raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
     user_id = user.get("sub", "")
-    account_ids = supabase_service.get_user_account_ids(user_id)
+    account_ids = storage_service.get_user_account_ids(user_id)
     if not account_ids:
         raise HTTPException(status_code=404, detail="No se han encontrado cuentas para el usuario")
 
     try:
-        r = (
-            supabase_service.supabase
-            .table("transactions")
-            .select("id, account_id")
-            .eq("id", row_id)
-            .limit(1)
-            .execute()
-        )
-        rows = r.data or []
-        if not rows:
-            raise HTTPException(status_code=404, detail="Transacción no encontrada")
-
-        tx = rows[0]
-        if tx.get("account_id") not in account_ids:
-            raise HTTPException(status_code=403, detail="No tienes permiso para modificar esta transacción")
-
-        update_data: Dict[str, Any] = {}
-        if payload.dt_date is not None:
-            val = payload.dt_date.strip() if isinstance(payload.dt_date, str) else str(payload.dt_date)
-            if val:
-                if "T" not in val and len(val) <= 10:
-                    val = f"{val}T00:00:00"
-                update_data["dt_date"] = val
-        if payload.descripcion is not None:
-            update_data["descripcion"] = payload.descripcion.strip() if payload.descripcion else None
-        if payload.importe is not None:
-            update_data["importe"] = float(payload.importe)
-
+        update_data = _details_update_data(payload)
         if not update_data:
             return {"success": True, "updated": 0}
 
-        supabase_service.supabase.table("transactions").update(update_data).eq("id", row_id).execute()
-        return {"success": True, "updated": 1}
+        # Escritura acotada a las cuentas del usuario: si no afecta a ninguna fila, no existe o no es suya
+        updated = storage_service.update_transactions(account_ids, update_data, row_ids=[row_id])
+        if not updated:
+            raise _missing_row_error(row_id, "modificar")
+        return {"success": True, "updated": len(updated)}
     except HTTPException:
         raise
     except Exception as e:
@@ -347,11 +775,11 @@ async def update_account_display_name(
     """
     Permite cambiar el display_name de una cuenta propia.
     """
-    if not supabase_service.is_connected():
+    if not storage_service.is_connected():
         raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
     user_id = user.get("sub", "")
-    account_ids = supabase_service.get_user_account_ids(user_id)
+    account_ids = storage_service.get_user_account_ids(user_id)
     if not account_ids:
         raise HTTPException(status_code=404, detail="No se han encontrado cuentas para el usuario")
 
@@ -364,9 +792,7 @@ async def update_account_display_name(
         if not new_name:
             raise HTTPException(status_code=400, detail="El nombre de cuenta no puede estar vacío")
 
-        supabase_service.supabase.table("accounts").update(
-            {"display_name": new_name}
-        ).eq("id", account_id).execute()
+        storage_service.update_account_display_name(account_id, new_name)
 
         return {"success": True, "updated": 1, "display_name": new_name}
     except HTTPException:
@@ -388,33 +814,19 @@ async def delete_transaction(
     user: dict = Depends(get_current_user),
 ) -> Dict[str, Any]:
     """Elimina una transacción propia (por id de fila)."""
-    if not supabase_service.is_connected():
+    if not storage_service.is_connected():
         raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
     user_id = user.get("sub", "")
-    account_ids = supabase_service.get_user_account_ids(user_id)
+    account_ids = storage_service.get_user_account_ids(user_id)
     if not account_ids:
         raise HTTPException(status_code=404, detail="No se han encontrado cuentas para el usuario")
 
     try:
-        r = (
-            supabase_service.supabase
-            .table("transactions")
-            .select("id, account_id")
-            .eq("id", row_id)
-            .limit(1)
-            .execute()
-        )
-        rows = r.data or []
-        if not rows:
-            raise HTTPException(status_code=404, detail="Transacción no encontrada")
-
-        tx = rows[0]
-        if tx.get("account_id") not in account_ids:
-            raise HTTPException(status_code=403, detail="No tienes permiso para eliminar esta transacción")
-
-        supabase_service.supabase.table("transactions").delete().eq("id", row_id).execute()
-        return {"success": True, "deleted": 1}
+        deleted = storage_service.delete_transactions(account_ids, row_ids=[row_id])
+        if not deleted:
+            raise _missing_row_error(row_id, "eliminar")
+        return {"success": True, "deleted": len(deleted)}
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+from typing import Callable, Dict, Any
+
+from app.api.deps import get_current_user
+from app.api.services.jobs import Job, JobQueueFull, job_manager
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"]
+)
+
+
+def submit_job(key: str, user_id: str, fn: Callable[[Job], Any]) -> JSONResponse:
+    """Encola el job (idempotente por key; kind = prefijo de la key) y responde 202 + URL de estado."""
+    try:
+        job, created = job_manager.submit(key.split(":", 1)[0], user_id, fn, key=key)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    status_url = f"/jobs/{job.id}"
+    return JSONResponse(
+        status_code=202,
+        content={**job.to_dict(), "status_url": status_url, "resubmitted": not created},
+        headers={"Location": status_url},
+    )
+
+
+@router.get("/{job_id}", summary="Estado de un job (etapa, progreso y resultado)")
+def get_job(
+    job_id: str,
+    _user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    job = job_manager.get(job_id, user_id=_user.get("sub"))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job.to_dict()
@@ -0,0 +1,149 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from typing import Dict, Any, Optional
+from pydantic import BaseModel
+
+from app.api.deps import get_current_user
+from app.api.services.storage import storage_service
+
+router = APIRouter(
+    prefix="/rules",
+    tags=["Rules"]
+)
+
+
+class RuleCreate(BaseModel):
+    """Regla propia: si `pattern` (regex) aparece en la descripción en mayúsculas, se asigna la categoría.
+    Regex limitada: sin grupos de captura, referencias, lookarounds ni cuantificadores anidados."""
+    pattern: str
+    categoria: str
+    subcategoria: Optional[str] = None
+    account_id: Optional[str] = None  # None: todas las cuentas del usuario
+    priority: int = 0  # menor = se evalúa antes
+
+
+class RuleUpdate(BaseModel):
+    pattern: Optional[str] = None
+    categoria: Optional[str] = None
+    subcategoria: Optional[str] = None
+    account_id: Optional[str] = None
+    priority: Optional[int] = None
+
+
+def _rule_data(payload: RuleCreate | RuleUpdate, user_id: str) -> Dict[str, Any]:
+    """Valida y normaliza los campos enviados (400 si no son válidos, 403 si la cuenta no es del usuario)."""
+    from app.api.services.user_rules import validate_pattern
+
+    data = payload.model_dump(exclude_unset=True)
+    if "pattern" in data:
+        try:
+            data["pattern"] = validate_pattern(data["pattern"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if "categoria" in data:
+        data["categoria"] = (data["categoria"] or "").strip()
+        if not data["categoria"] or len(data["categoria"]) > 50:
+            raise HTTPException(status_code=400, detail="categoria es obligatoria (máx. 50 caracteres)")
+    if "subcategoria" in data:
+        data["subcategoria"] = (data["subcategoria"] or "").strip()[:100] or None
+    if data.get("account_id") and data["account_id"] not in storage_service.get_user_account_ids(user_id):
+        raise HTTPException(status_code=403, detail="No tienes permiso para esta cuenta")
+    return data
+
+
+@router.get(
+    "",
+    summary="Reglas de categoría del usuario",
+    response_model=Dict[str, Any]
+)
+async def list_rules(
+    include_global: bool = Query(False, description="Incluir también las reglas globales (solo lectura)"),
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Reglas propias en orden de evaluación (por cuenta y generales), por encima de las globales."""
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    data = storage_service.get_category_rules(user.get("sub", ""))
+    response: Dict[str, Any] = {"success": True, "count": len(data), "data": data}
+    if include_global:
+        from app.api.services.pipe_extract_transactions.category_rules import CATEGORY_RULES
+        response["global"] = [
+            {"pattern": p, "categoria": c, "subcategoria": s} for p, c, s in CATEGORY_RULES
+        ]
+    return response
+
+
+@router.post(
+    "",
+    summary="Crear una regla de categoría propia",
+    response_model=Dict[str, Any]
+)
+async def create_rule(
+    payload: RuleCreate = Body(...),
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """Se aplica en las próximas subidas; para el histórico, POST /GET/transactions/recategorize."""
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    user_id = user.get("sub", "")
+    data = _rule_data(payload, user_id)
+    try:
+        rule = storage_service.create_category_rule({**data, "user_id": user_id})
+        return {"success": True, "data": rule}
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] create_rule: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.patch(
+    "/{rule_id}",
+    summary="Actualizar una regla de categoría propia",
+    response_model=Dict[str, Any]
+)
+async def update_rule(
+    rule_id: int,
+    payload: RuleUpdate = Body(...),
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    user_id = user.get("sub", "")
+    data = _rule_data(payload, user_id)
+    try:
+        rule = storage_service.update_category_rule(user_id, rule_id, data)
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] update_rule: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    if rule is None:
+        raise HTTPException(status_code=404, detail="Regla no encontrada")
+    return {"success": True, "data": rule}
+
+
+@router.delete(
+    "/{rule_id}",
+    summary="Eliminar una regla de categoría propia",
+    response_model=Dict[str, Any]
+)
+async def delete_rule(
+    rule_id: int,
+    user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
+    if not storage_service.is_connected():
+        raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+    try:
+        deleted = storage_service.delete_category_rule(user.get("sub", ""), rule_id)
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] delete_rule: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Regla no encontrada")
+    return {"success": True, "deleted": 1}
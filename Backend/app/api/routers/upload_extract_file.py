@@ -1,34 +1,19 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from typing import Dict, Any
-import math
-
-import pandas as pd
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from typing import Dict, Any, List
+import hashlib
 
 from app.api.deps import get_current_user
-from app.api.services.pipe_extract_transactions.main import main_file_parser
-from app.api.services.supabase.supabase_service import supabase_service
+from app.api.services.ingest import IngestError, check_extension, ingest_batch, ingest_statement
+from app.api.routers.jobs import submit_job
+from app.core.profiler import request_thread
 
 router = APIRouter(
     prefix="/upload",
     tags=["Upload"]
 )
 
-ALLOWED_EXTENSIONS = {".xlsx", ".xls",".csv"}
-
-
-def _sanitize_for_json(records: list[dict]) -> list[dict]:
-    """Reemplaza NaN/Inf por None para que Supabase/JSON los acepte (Revolut: subcategoria vacía)."""
-    out = []
-    for d in records:
-        clean = {}
-        for k, v in d.items():
-            if pd.isna(v) or (isinstance(v, float) and math.isinf(v)):
-                clean[k] = None
-            else:
-                clean[k] = v
-        out.append(clean)
-    return out
-
 
 @router.post(
     "/Transactions",
@@ -37,74 +22,64 @@ def _sanitize_for_json(records: list[dict]) -> list[dict]:
 )
 async def upload_transactions_file(
     file: UploadFile = File(...),
+    mode: str = Query("sync", pattern="^(sync|job)$", description="job: responde 202 y procesa en segundo plano"),
     _user: dict = Depends(get_current_user),
 ) -> Dict[str, Any]:
 
-    # Validar extensión del archivo
-    if not any(file.filename.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
-        raise HTTPException(
-            status_code=400,
-            detail="Formato no soportado. Solo Excel (.xlsx, .xls, .csv)"
-        )
+    user_id = _user.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Usuario no identificado")
 
-    # Leer contenido del archivo
-    file_bytes = await file.read()
-    print(f"Archivo leído: {file.filename}, tamaño: {len(file_bytes)} bytes")
+    try:
+        # Validar extensión antes de leer el fichero
+        check_extension(file.filename)
+        file_bytes = await file.read()
 
-    # Detectar tipo de archivo
-    is_csv = file.filename.lower().endswith('.csv')
-    
-    # Ejecutar pipeline de parseo
-    df_transactions, source_type, account_identifier, display_name = main_file_parser(
-        file_bytes, is_csv=is_csv
-    )
+        if mode == "job":
+            return _enqueue_upload(file_bytes, file.filename, user_id)
 
-    # Validar resultado no vacío
-    if df_transactions.empty:
-        raise HTTPException(
-            status_code=422,
-            detail="El fichero no contiene transacciones válidas"
-        )
+        # Parseo e inserción son bloqueantes: fuera del event loop
+        return await run_in_threadpool(request_thread(ingest_statement), file_bytes, file.filename, user_id)
+    except IngestError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    # Verificar conexión a base de datos
-    if not supabase_service.is_connected():
-        print("ERROR: Supabase no conectado")
-        raise HTTPException(
-            status_code=503,
-            detail="Servicio de base de datos no disponible"
-        )
 
-    user_id = _user.get("sub")
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Usuario no identificado")
-
-    # Crear/obtener cuenta y vincular al usuario
-    account_id = supabase_service.get_or_create_account(
-        stable_key=account_identifier,
-        source=source_type.lower(),
-        display_name=display_name,
+def _enqueue_upload(file_bytes: bytes, filename: str, user_id: str) -> JSONResponse:
+    """Crea (o reutiliza, si es el mismo fichero del mismo usuario) el job de ingesta."""
+    return submit_job(
+        f"upload:{user_id}:{hashlib.sha256(file_bytes).hexdigest()}",
+        user_id,
+        lambda job: ingest_statement(file_bytes, filename, user_id, progress=job.update),
     )
-    supabase_service.link_user_account(user_id=user_id, account_id=account_id)
-
-    # Añadir account_id (UUID) a cada transacción
-    transactions_list = df_transactions.to_dict(orient="records")
-    for t in transactions_list:
-        t["account_id"] = account_id
 
-    # Limpiar NaN/Inf (no son JSON válidos; Revolut puede tener subcategoria/categoria vacías)
-    transactions_list = _sanitize_for_json(transactions_list)
 
-    result = supabase_service.insert_transactions(transactions_list)
+@router.post(
+    "/batch",
+    summary="Subir varios extractos o un ZIP (parseo en paralelo, un único lote de importación)",
+    response_model=Dict[str, Any]
+)
+async def upload_transactions_batch(
+    files: List[UploadFile] = File(...),
+    mode: str = Query("sync", pattern="^(sync|job)$", description="job: responde 202 y procesa en segundo plano"),
+    _user: dict = Depends(get_current_user),
+) -> Dict[str, Any]:
 
-    # Retornar resumen de la operación
-    return {
-        "success": True,
-        "filename": file.filename,
-        "source_type": source_type,
-        "summary": {
-            "total_received": result["received"],
-            "total_inserted": result["inserted"],
-            "total_duplicates": len(result["duplicates"])
-        },
-    }
+    user_id = _user.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Usuario no identificado")
 
+    batch = [(f.filename, await f.read()) for f in files]
+    if mode == "job":
+        # Mismo contenido (en cualquier orden) -> mismo job
+        digest = hashlib.sha256()
+        for file_digest in sorted(hashlib.sha256(data).digest() for _, data in batch):
+            digest.update(file_digest)
+        return submit_job(
+            f"batch:{user_id}:{digest.hexdigest()}",
+            user_id,
+            lambda job: ingest_batch(batch, user_id, progress=job.update),
+        )
+    try:
+        return await run_in_threadpool(request_thread(ingest_batch), batch, user_id)
+    except IngestError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
@@ -4,7 +4,7 @@ Carga accounts.yaml y provee el mapeo para el pipeline de extracción.
 Futuro: integrar con DB (users, accounts, account_owners) cuando haya auth.
 """
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set
 import yaml
 
 _ACCOUNT_CONFIG: Optional[Dict[str, Any]] = None
@@ -22,8 +22,8 @@ def _load_config() -> Dict[str, Any]:
             "ibercaja": {
                 "base_pattern": "20859254******",
                 "accounts": {
-                    "716552": {"name": "Conjunta", "shared": True},
-                    "716650": {"name": "Personal", "shared": False},
+                    "716552": {"name": "Conjunta", "shared": True, "household_rules": True},
+                    "716650": {"name": "Personal", "shared": False, "household_rules": True},
                 },
             },
             "revolut": {"default_name": "Revolut", "shared": False},
@@ -50,6 +50,18 @@ def get_ibercaja_account_map() -> Dict[str, str]:
     }
 
 
+def get_household_ibercaja_accounts() -> Set[str]:
+    """
+    IBAN completo de las cuentas Ibercaja con household_rules: true (reglas propias de ese hogar).
+    El resto de cuentas solo usa las reglas globales y las del usuario.
+    """
+    config = _load_config()
+    ibercaja = config.get("ibercaja", {})
+    base = ibercaja.get("base_pattern", "20859254******")
+    accounts = ibercaja.get("accounts", {})
+    return {f"{base}{suffix}" for suffix, acc in accounts.items() if (acc or {}).get("household_rules")}
+
+
 def get_account_info(iban_full: str) -> Optional[Dict[str, Any]]:
     """
     Retorna info de la cuenta (name, shared) si existe.
@@ -0,0 +1,195 @@
+"""
+Series temporales de saldo por cuenta (GET /GET/balances/series).
+
+Base: saldo de cierre de cada día con movimientos (el 'saldo' de la última transacción del día, como
+TransactionFrame.balance_series). Se guarda en memoria por cuenta junto a su data_version; un cierre
+diario solo cambia si una escritura toca ese día, así que cuando la versión avanza se leen los rangos
+de fechas de account_changes y solo se vuelven a pedir esos días. Si falta algún cambio en el registro
+(edición de fecha o saldo, versión sin anotar, o ya podada: solo se guardan las últimas
+ACCOUNT_CHANGES_RETENTION versiones) se recalcula la cuenta entera.
+
+Semanas y meses salen de los cierres diarios: último cierre de cada periodo y, en los periodos sin
+movimientos, el del anterior (forward fill con searchsorted), hasta el periodo actual.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.api.services.storage import storage_service
+from app.api.services.storage.base import ACCOUNT_CHANGES_RETENTION
+from app.api.services.transaction_frame import GRANULARITIES, TransactionFrame
+from app.core.metrics import cache_result
+
+CACHE_SIZE = 512
+# account_id -> (data_version, días con movimientos (int64, días desde 1970, ordenados), saldo de cierre)
+_CACHE: "OrderedDict[str, Tuple[int, np.ndarray, np.ndarray]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+_EMPTY_DAYS = np.empty(0, dtype=np.int64)
+_EMPTY_SALDOS = np.empty(0, dtype=np.float64)
+
+
+def _day(value: str) -> int:
+    return int(np.datetime64(value[:10], "D").astype(np.int64))
+
+
+def _load_closings(
+    account_id: str, from_day: Optional[int] = None, to_day: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Cierres diarios de la cuenta leídos de storage (todo el histórico o solo [from_day, to_day])."""
+    from_date = str(np.datetime64(from_day, "D")) if from_day is not None else None
+    to_date = str(np.datetime64(to_day, "D")) if to_day is not None else None
+    frame = TransactionFrame.load([account_id], from_date=from_date, to_date=to_date)
+    series = frame.balance_series("day").get(account_id, [])
+    if not series:
+        return _EMPTY_DAYS, _EMPTY_SALDOS
+    days = np.array([item["period"] for item in series], dtype="datetime64[D]").astype(np.int64)
+    saldos = np.array([item["saldo"] for item in series], dtype=np.float64)
+    return days, saldos
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Une rangos de días solapados o contiguos: una lectura por bloque."""
+    merged: List[Tuple[int, int]] = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def _changed_ranges(account_id: str, cached_version: int, version: int) -> Optional[List[Tuple[int, int]]]:
+    """Rangos de días tocados entre cached_version y version. None si el registro no los cubre todos."""
+    if version - cached_version > ACCOUNT_CHANGES_RETENTION:
+        return None  # ya podados: ni se piden
+    changes = storage_service.get_account_changes({account_id: cached_version})
+    if changes is None:
+        return None
+    changes = [c for c in changes if int(c["data_version"]) <= version]
+    if len(changes) != version - cached_version:
+        return None
+    ranges = []
+    for change in changes:
+        from_date, to_date = change.get("from_date"), change.get("to_date")
+        if from_date is None and to_date is None:
+            continue
+        if not from_date or not to_date:
+            return None
+        ranges.append((_day(str(from_date)), _day(str(to_date))))
+    return _merge_ranges(ranges)
+
+
+def _refresh(
+    days: np.ndarray, saldos: np.ndarray, account_id: str, ranges: List[Tuple[int, int]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Sustituye los cierres de los días en ranges por los actuales de storage."""
+    for low, high in ranges:
+        keep = (days < low) | (days > high)
+        new_days, new_saldos = _load_closings(account_id, low, high)
+        inside = (new_days >= low) & (new_days <= high)
+        days = np.concatenate([days[keep], new_days[inside]])
+        saldos = np.concatenate([saldos[keep], new_saldos[inside]])
+        order = np.argsort(days, kind="stable")
+        days, saldos = days[order], saldos[order]
+    return days, saldos
+
+
+def daily_closings(account_id: str, version: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Cierres diarios de la cuenta para su data_version actual (de caché, actualizada o recalculada)."""
+    with _CACHE_LOCK:
+        entry = _CACHE.get(account_id)
+    cache_result("balance_series", entry is not None and entry[0] == version)
+    if version is None:
+        return _load_closings(account_id)
+    if entry is not None and entry[0] == version:
+        with _CACHE_LOCK:
+            if account_id in _CACHE:
+                _CACHE.move_to_end(account_id)
+        return entry[1], entry[2]
+
+    ranges = None
+    if entry is not None and entry[0] < version:
+        ranges = _changed_ranges(account_id, entry[0], version)
+    if ranges is None:
+        days, saldos = _load_closings(account_id)
+    else:
+        days, saldos = _refresh(entry[1], entry[2], account_id, ranges)
+    with _CACHE_LOCK:
+        _CACHE[account_id] = (version, days, saldos)
+        _CACHE.move_to_end(account_id)
+        while len(_CACHE) > CACHE_SIZE:
+            _CACHE.popitem(last=False)
+    return days, saldos
+
+
+def _period_starts(days: np.ndarray, granularity: str) -> np.ndarray:
+    """Inicio del periodo de cada día como entero: días (day, week: lunes) o meses desde 1970 (month)."""
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        return days - (days + 3) % 7  # 1970-01-01 fue jueves (igual que TransactionFrame.periods)
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def _period_start(value: str, granularity: str) -> int:
+    return int(_period_starts(np.array([_day(value)], dtype=np.int64), granularity)[0])
+
+
+def _label(period: int, granularity: str) -> str:
+    if granularity == "month":
+        return str(np.datetime64(period, "M"))
+    return str(np.datetime64(period, "D"))
+
+
+def resample(
+    days: np.ndarray,
+    saldos: np.ndarray,
+    granularity: str,
+    today: date,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Saldo al final de cada periodo, sin huecos, desde el primer movimiento hasta el periodo actual."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity debe ser uno de {GRANULARITIES}")
+    if not len(days):
+        return []
+    periods = _period_starts(days, granularity)
+    last = np.r_[periods[1:] != periods[:-1], True]
+    periods, closings = periods[last], saldos[last]
+
+    step = 7 if granularity == "week" else 1
+    current = _period_start(today.isoformat(), granularity)
+    timeline = np.arange(periods[0], max(periods[-1], current) + 1, step, dtype=np.int64)
+    if from_date:
+        timeline = timeline[timeline >= _period_start(from_date, granularity)]
+    if to_date:
+        timeline = timeline[timeline <= _period_start(to_date, granularity)]
+    values = closings[np.searchsorted(periods, timeline, side="right") - 1]
+    return [
+        {"period": _label(int(p), granularity), "saldo": round(float(v), 2)}
+        for p, v in zip(timeline, values)
+    ]
+
+
+def balance_series(
+    account_ids: List[str],
+    versions: Optional[Dict[str, int]],
+    granularity: str = "day",
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    today: Optional[date] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """{account_id: [{period, saldo}]} de las cuentas, con el saldo al cierre de cada periodo."""
+    versions = versions or {}
+    today = today or date.today()
+    result = {}
+    for account_id in dict.fromkeys(account_ids):
+        days, saldos = daily_closings(account_id, versions.get(account_id))
+        result[account_id] = resample(days, saldos, granularity, today, from_date, to_date)
+    return result
@@ -0,0 +1,32 @@
+"""
+Formato columnar para los listados de transacciones (format=columnar).
+En lugar de repetir las claves en cada fila devuelve {columns, data: {col: [valores...]}}.
+Las columnas de baja cardinalidad (cuenta, categoria...) se codifican con diccionario:
+data[col] son índices enteros sobre dictionaries[col].
+"""
+
+from typing import Any, Dict, Iterable, List
+
+# Candidatas a diccionario; solo se codifican si realmente tienen pocos valores distintos
+DICTIONARY_COLUMNS = ("account_id", "cuenta", "categoria", "subcategoria", "is_own_account")
+
+
+def to_columnar(
+    rows: List[Dict[str, Any]],
+    dictionary_columns: Iterable[str] = DICTIONARY_COLUMNS,
+) -> Dict[str, Any]:
+    """Convierte filas (list[dict]) a {columns, data, dictionaries}."""
+    columns: List[str] = list(dict.fromkeys(key for row in rows for key in row))
+    data: Dict[str, List[Any]] = {col: [row.get(col) for row in rows] for col in columns}
+    dictionaries: Dict[str, List[Any]] = {}
+    for col in dictionary_columns:
+        values = data.get(col)
+        if not values:
+            continue
+        index: Dict[Any, int] = {}
+        codes = [index.setdefault(v, len(index)) for v in values]
+        # Solo compensa si se repiten valores (al menos la mitad de las filas)
+        if len(index) * 2 <= len(values):
+            dictionaries[col] = list(index)
+            data[col] = codes
+    return {"columns": columns, "data": data, "dictionaries": dictionaries}
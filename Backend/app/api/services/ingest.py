@@ -0,0 +1,367 @@
+"""
+Ingesta de extractos: parseo -> cuenta -> inserción.
+  - ingest_statement: un fichero (/upload/Transactions, síncrono o en job).
+  - ingest_batch: varios ficheros o un ZIP (/upload/batch). Parsea en paralelo en procesos,
+    resuelve cada cuenta una sola vez por stable_key, deduplica entre ficheros antes de ir a la BD
+    e inserta por bloques.
+Los errores de negocio se lanzan como IngestError(status_code, detail); el router los convierte
+en HTTPException y el job los guarda como error.
+"""
+
+import io
+import math
+import multiprocessing
+import os
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.api.services.storage import storage_service
+from app.api.services.storage.base import IN_CHUNK_SIZE
+from app.core.config import settings
+from app.core.metrics import UPLOADS_IN_FLIGHT
+
+ALLOWED_EXTENSIONS = {".xlsx", ".xls", ".csv"}
+
+# Filas por insert cuando se trocea (cada bloque es una llamada a insert_transactions,
+# que consulta los transaction_id existentes con un in_() en la URL)
+INSERT_CHUNK_SIZE = IN_CHUNK_SIZE
+
+# progress(stage, fraction 0..1)
+ProgressFn = Callable[[str, float], None]
+
+
+class IngestError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def check_extension(filename: str) -> None:
+    if not any((filename or "").lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
+        raise IngestError(400, "Formato no soportado. Solo Excel (.xlsx, .xls, .csv)")
+
+
+def sanitize_for_json(records: list[dict]) -> list[dict]:
+    """Reemplaza NaN/Inf por None para que Supabase/JSON los acepte (Revolut: subcategoria vacía)."""
+    import pandas as pd
+
+    out = []
+    for d in records:
+        clean = {}
+        for k, v in d.items():
+            if pd.isna(v) or (isinstance(v, float) and math.isinf(v)):
+                clean[k] = None
+            else:
+                clean[k] = v
+        out.append(clean)
+    return out
+
+
+def _insert_with_progress(transactions: List[Dict[str, Any]], progress: ProgressFn) -> Dict[str, Any]:
+    received, inserted, duplicates = 0, 0, []
+    total = len(transactions)
+    for start in range(0, total, INSERT_CHUNK_SIZE):
+        result = storage_service.insert_transactions(transactions[start:start + INSERT_CHUNK_SIZE])
+        received += result["received"]
+        inserted += result["inserted"]
+        duplicates.extend(result["duplicates"])
+        progress("insert", min(1.0, (start + INSERT_CHUNK_SIZE) / total))
+    return {"received": received, "inserted": inserted, "duplicates": duplicates}
+
+
+def ingest_statement(
+    file_bytes: bytes,
+    filename: str,
+    user_id: str,
+    progress: Optional[ProgressFn] = None,
+) -> Dict[str, Any]:
+    """Parsea el extracto y lo inserta para el usuario. Devuelve el resumen de /upload/Transactions."""
+    with UPLOADS_IN_FLIGHT.track_inprogress():
+        check_extension(filename)
+        print(f"Archivo leído: {filename}, tamaño: {len(file_bytes)} bytes")
+        if progress:
+            progress("parse", 0.0)
+
+        # Import diferido: pandas/openpyxl no cargan al arrancar (ver app.core.prewarm)
+        from app.api.services.pipe_extract_transactions.main import main_file_parser
+
+        is_csv = filename.lower().endswith(".csv")
+        df_transactions, source_type, account_identifier, display_name = main_file_parser(
+            file_bytes, is_csv=is_csv
+        )
+
+        if df_transactions.empty:
+            raise IngestError(422, "El fichero no contiene transacciones válidas")
+
+        if not storage_service.is_connected():
+            print("ERROR: Supabase no conectado")
+            raise IngestError(503, "Servicio de base de datos no disponible")
+
+        if progress:
+            progress("account", 0.0)
+        # Crear/obtener cuenta y vincular al usuario
+        account_id = storage_service.get_or_create_account(
+            stable_key=account_identifier,
+            source=source_type.lower(),
+            display_name=display_name,
+        )
+        storage_service.link_user_account(user_id=user_id, account_id=account_id)
+
+        # Añadir account_id (UUID) y lote de importación a cada transacción
+        import_batch = str(uuid.uuid4())
+        transactions_list = df_transactions.to_dict(orient="records")
+        for t in transactions_list:
+            t["account_id"] = account_id
+            t["import_batch"] = import_batch
+
+        # Limpiar NaN/Inf (no son JSON válidos; Revolut puede tener subcategoria/categoria vacías)
+        transactions_list = sanitize_for_json(transactions_list)
+
+        # Reglas propias del usuario (por cuenta y generales) por encima de las globales
+        from app.api.services.user_rules import UserRules
+        UserRules.load(user_id).apply(transactions_list, account_id)
+
+        if progress:
+            progress("insert", 0.0)
+            result = _insert_with_progress(transactions_list, progress)
+        else:
+            result = storage_service.insert_transactions(transactions_list)
+
+        return {
+            "success": True,
+            "filename": filename,
+            "source_type": source_type,
+            "import_batch": import_batch,
+            "summary": {
+                "total_received": result["received"],
+                "total_inserted": result["inserted"],
+                "total_duplicates": len(result["duplicates"])
+            },
+        }
+
+
+# ---------- Lotes (varios ficheros / ZIP) ----------
+
+_PARSE_POOL: Optional[ProcessPoolExecutor] = None
+_PARSE_POOL_LOCK = threading.Lock()
+
+
+def _parse_processes() -> int:
+    configured = settings.PARSE_PROCESSES
+    return (os.cpu_count() or 1) if configured < 0 else configured
+
+
+def _get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """Pool de procesos compartido (spawn: los hijos no heredan hilos ni conexiones del servidor)."""
+    global _PARSE_POOL
+    workers = _parse_processes()
+    if workers <= 0:
+        return None
+    with _PARSE_POOL_LOCK:
+        if _PARSE_POOL is None:
+            _PARSE_POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _PARSE_POOL
+
+
+def shutdown_parse_pool() -> None:
+    global _PARSE_POOL
+    with _PARSE_POOL_LOCK:
+        if _PARSE_POOL is not None:
+            _PARSE_POOL.shutdown(wait=False, cancel_futures=True)
+            _PARSE_POOL = None
+
+
+def parse_statement(filename: str, file_bytes: bytes) -> Dict[str, Any]:
+    """
+    Parsea un fichero (se ejecuta en un proceso del pool). Nunca lanza: devuelve
+    {filename, source_type, account_identifier, display_name, records} o {filename, error}.
+    """
+    try:
+        check_extension(filename)
+        from app.api.services.pipe_extract_transactions.main import main_file_parser
+
+        df, source_type, account_identifier, display_name = main_file_parser(
+            file_bytes, is_csv=filename.lower().endswith(".csv")
+        )
+        if df.empty:
+            raise IngestError(422, "El fichero no contiene transacciones válidas")
+        return {
+            "filename": filename,
+            "source_type": source_type,
+            "account_identifier": account_identifier,
+            "display_name": display_name,
+            "records": sanitize_for_json(df.to_dict(orient="records")),
+        }
+    except IngestError as e:
+        return {"filename": filename, "error": e.detail}
+    except Exception as e:
+        return {"filename": filename, "error": f"{type(e).__name__}: {e}"}
+
+
+def expand_batch(files: List[Tuple[str, bytes]], limits: bool = True) -> List[Tuple[str, bytes]]:
+    """Sustituye cada .zip por sus extractos (ignora carpetas, __MACOSX y otras extensiones).
+    Aplica los límites del lote HTTP (BATCH_MAX_FILES / BATCH_MAX_BYTES) salvo con limits=False (backfill offline)."""
+    out: List[Tuple[str, bytes]] = []
+    total = 0
+
+    def add(name: str, size: int, read: Callable[[], bytes]) -> None:
+        # Tamaño comprobado antes de leer (descomprimir) cada fichero, sea suelto o de un ZIP
+        nonlocal total
+        total += size
+        if not limits:
+            out.append((name, read()))
+            return
+        if total > settings.BATCH_MAX_BYTES:
+            raise IngestError(413, f"El lote supera {settings.BATCH_MAX_BYTES} bytes descomprimido")
+        if len(out) >= settings.BATCH_MAX_FILES:
+            raise IngestError(413, f"Máximo {settings.BATCH_MAX_FILES} ficheros por lote")
+        out.append((name, read()))
+
+    for filename, data in files:
+        if not (filename or "").lower().endswith(".zip"):
+            add(filename, len(data), lambda: data)
+            continue
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile:
+            raise IngestError(400, f"ZIP no válido: {filename}")
+        with archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                    continue
+                if not any(name.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
+                    continue
+                add(f"{filename}/{name}", info.file_size, lambda: archive.read(info))
+    if not out:
+        raise IngestError(400, "El lote no contiene extractos (.xlsx, .xls, .csv)")
+    return out
+
+
+def _parse_all(files: List[Tuple[str, bytes]], progress: Optional[ProgressFn]) -> List[Dict[str, Any]]:
+    """Parsea en el pool de procesos (en orden de entrada); con un fichero o sin pool, en este hilo."""
+    pool = _get_parse_pool() if len(files) > 1 else None
+    parsed: List[Dict[str, Any]] = []
+    if pool is None:
+        for i, (name, data) in enumerate(files):
+            parsed.append(parse_statement(name, data))
+            if progress:
+                progress("parse", (i + 1) / len(files))
+        return parsed
+    try:
+        futures = [pool.submit(parse_statement, name, data) for name, data in files]
+        for i, future in enumerate(futures):
+            parsed.append(future.result())
+            if progress:
+                progress("parse", (i + 1) / len(files))
+    except BrokenProcessPool as e:
+        # Un hijo murió (ej. OOM): se recrea el pool la próxima vez y este lote se parsea aquí
+        print(f"[ERROR] pool de parseo roto: {e}; se parsea en el hilo")
+        shutdown_parse_pool()
+        return [parse_statement(name, data) for name, data in files]
+    return parsed
+
+
+def ingest_batch(
+    files: List[Tuple[str, bytes]],
+    user_id: str,
+    progress: Optional[ProgressFn] = None,
+) -> Dict[str, Any]:
+    """
+    Ingesta de varios extractos como un único lote de importación (mismo import_batch).
+    Devuelve el resumen global y uno por fichero (received, inserted, duplicates, duplicates_in_batch, error).
+    """
+    with UPLOADS_IN_FLIGHT.track_inprogress():
+        files = expand_batch(files)
+        print(f"Lote recibido: {len(files)} ficheros, {sum(len(d) for _, d in files)} bytes")
+        if not storage_service.is_connected():
+            print("ERROR: Supabase no conectado")
+            raise IngestError(503, "Servicio de base de datos no disponible")
+
+        if progress:
+            progress("parse", 0.0)
+        parsed = _parse_all(files, progress)
+
+        # Una llamada a get_or_create_account/link_user_account por stable_key distinto
+        if progress:
+            progress("account", 0.0)
+        account_ids: Dict[str, str] = {}
+        for p in parsed:
+            key = p.get("account_identifier")
+            if "error" in p or key in account_ids:
+                continue
+            account_ids[key] = storage_service.get_or_create_account(
+                stable_key=key,
+                source=p["source_type"].lower(),
+                display_name=p["display_name"],
+            )
+            storage_service.link_user_account(user_id=user_id, account_id=account_ids[key])
+
+        from app.api.services.user_rules import UserRules
+        user_rules = UserRules.load(user_id)
+
+        # Unir y deduplicar entre ficheros (gana la primera aparición) antes de tocar la BD
+        import_batch = str(uuid.uuid4())
+        merged: List[Dict[str, Any]] = []
+        owner: Dict[str, int] = {}
+        files_summary: List[Dict[str, Any]] = []
+        for idx, p in enumerate(parsed):
+            summary = {
+                "filename": p["filename"],
+                "source_type": p.get("source_type"),
+                "account": p.get("display_name"),
+                "received": len(p.get("records", [])),
+                "inserted": 0,
+                "duplicates": 0,
+                "duplicates_in_batch": 0,
+                "error": p.get("error"),
+            }
+            files_summary.append(summary)
+            if "error" in p:
+                continue
+            account_id = account_ids[p["account_identifier"]]
+            user_rules.apply(p["records"], account_id)
+            for t in p["records"]:
+                tid = t["transaction_id"]
+                if tid in owner:
+                    summary["duplicates_in_batch"] += 1
+                    continue
+                owner[tid] = idx
+                t["account_id"] = account_id
+                t["import_batch"] = import_batch
+                merged.append(t)
+
+        # Inserción por bloques; insert_transactions descarta los que ya existen en BD
+        if progress:
+            progress("insert", 0.0)
+        existing: set = set()
+        for start in range(0, len(merged), INSERT_CHUNK_SIZE):
+            result = storage_service.insert_transactions(merged[start:start + INSERT_CHUNK_SIZE])
+            existing.update(result["duplicates"])
+            if progress:
+                progress("insert", min(1.0, (start + INSERT_CHUNK_SIZE) / len(merged)))
+        for tid, idx in owner.items():
+            if tid in existing:
+                files_summary[idx]["duplicates"] += 1
+            else:
+                files_summary[idx]["inserted"] += 1
+
+        return {
+            "success": all(f["error"] is None for f in files_summary),
+            "import_batch": import_batch,
+            "summary": {
+                "files": len(files_summary),
+                "failed_files": sum(1 for f in files_summary if f["error"]),
+                "accounts": len(account_ids),
+                "total_received": sum(f["received"] for f in files_summary),
+                "total_inserted": sum(f["inserted"] for f in files_summary),
+                "total_duplicates": sum(f["duplicates"] for f in files_summary),
+                "total_duplicates_in_batch": sum(f["duplicates_in_batch"] for f in files_summary),
+            },
+            "files": files_summary,
+        }
@@ -0,0 +1,133 @@
+"""
+Jobs en segundo plano (en memoria, una instancia) con un pool de hilos acotado.
+Cada job informa etapa y progreso; el resultado o el error quedan guardados para consultarlos
+en GET /jobs/{job_id}. Con `key` (ej. sha256 del fichero + usuario) un reenvío mientras el job sigue
+en cola o en curso devuelve ese job en vez de crear otro. Uno ya terminado no se reutiliza: entre medias
+el usuario puede haber borrado el lote o cambiado reglas, y el reenvío tiene que volver a ejecutarse.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import JOBS_PENDING
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    user_id: str
+    key: Optional[str] = None
+    state: str = QUEUED
+    stage: Optional[str] = None
+    progress: float = 0.0
+    result: Any = None
+    error: Optional[Dict[str, Any]] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def update(self, stage: str, progress: float) -> None:
+        """Callback de progreso para la función del job."""
+        self.stage = stage
+        self.progress = round(max(0.0, min(1.0, progress)), 3)
+        self.updated_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "stage": self.stage,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+# fn(job) -> resultado; puede llamar job.update(stage, progress)
+JobFn = Callable[[Job], Any]
+
+
+class JobManager:
+    def __init__(self, max_workers: int, max_pending: int, retention: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_key: Dict[str, str] = {}
+        self.max_pending = max_pending
+        self.retention = retention
+
+    def submit(self, kind: str, user_id: str, fn: JobFn, key: Optional[str] = None) -> Tuple[Job, bool]:
+        """Encola fn. Devuelve (job, creado); creado=False si ya había un job en cola o en curso con esa key."""
+        with self._lock:
+            if key and key in self._by_key:
+                existing = self._jobs.get(self._by_key[key])
+                if existing is not None and existing.state in (QUEUED, RUNNING):
+                    return existing, False
+            pending = sum(1 for j in self._jobs.values() if j.state in (QUEUED, RUNNING))
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"Hay {pending} jobs en cola; reintenta más tarde")
+            job = Job(id=str(uuid.uuid4()), kind=kind, user_id=user_id, key=key)
+            self._jobs[job.id] = job
+            if key:
+                self._by_key[key] = job.id
+            self._prune()
+        JOBS_PENDING.inc()
+        self._executor.submit(self._run, job, fn)
+        return job, True
+
+    def get(self, job_id: str, user_id: Optional[str] = None) -> Optional[Job]:
+        """Job por id; con user_id solo si es suyo."""
+        job = self._jobs.get(job_id)
+        if job is None or (user_id is not None and job.user_id != user_id):
+            return None
+        return job
+
+    def _run(self, job: Job, fn: JobFn) -> None:
+        job.state = RUNNING
+        job.updated_at = time.time()
+        try:
+            job.result = fn(job)
+            job.state = DONE
+            job.progress = 1.0
+        except Exception as e:
+            status_code = getattr(e, "status_code", 500)
+            detail = getattr(e, "detail", None) or f"{type(e).__name__}: {e}"
+            if status_code >= 500:
+                import traceback
+                print(f"[ERROR] job {job.kind} {job.id}: {type(e).__name__}: {e}")
+                traceback.print_exc()
+            job.error = {"status_code": status_code, "detail": detail}
+            job.state = FAILED
+        finally:
+            job.updated_at = time.time()
+            JOBS_PENDING.dec()
+
+    def _prune(self) -> None:
+        """Olvida los jobs terminados más antiguos por encima de `retention` (con el lock tomado)."""
+        finished = [j for j in self._jobs.values() if j.state in (DONE, FAILED)]
+        for job in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job.id]
+            if job.key and self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
+
+
+job_manager = JobManager(
+    max_workers=settings.JOB_WORKERS,
+    max_pending=settings.JOB_MAX_PENDING,
+    retention=settings.JOB_RETENTION,
+)
@@ -1,5 +1,9 @@
+import hashlib
 import re
+import threading
+import numpy as np
 import pandas as pd
+from collections import OrderedDict
 from typing import Optional, Tuple, Dict
 
 CATEGORY_RULES = [
@@ -141,6 +145,23 @@ CATEGORY_RULES = [
     (r'TAL ASSETS EUROPE LTD', 'INVERSIONES', 'Crypto_Revolut'),
 ]
 
+def precompile_rules(category_rules=CATEGORY_RULES) -> int:
+    """Compila los patrones en la caché de `re` para que la primera subida no pague la compilación."""
+    patterns = [(pattern, 0) for pattern, _, _ in category_rules]
+    patterns += [
+        (r'(RESTAURANTE|TABERNA|BAR|CERVECERIA|CAFETERIA)\s+(.+)$', re.IGNORECASE),
+        (r'desde\s+([^,]+)', re.IGNORECASE),
+        (r'ORDEN:\s*([^,]+)', re.IGNORECASE),
+        (r'BENEF:\s*([^,]+)', re.IGNORECASE),
+        (r'(BENEF|ORDEN):\s*([^,]+)', re.IGNORECASE),
+        (r'BIZUM\s+(?:CARGO|ABONO).*?\s(.+?)\s*\.', re.IGNORECASE),
+    ]
+    for pattern, flags in patterns:
+        re.compile(pattern, flags)
+    get_matcher(category_rules)
+    return len(patterns)
+
+
 def categorize_transaction(description: str, category_rules) -> Tuple[str, Optional[str]]:
     """Categoriza una transacción según las reglas definidas"""
     desc = description.upper()
@@ -208,46 +229,200 @@ def analyze_description(description: str, category_rules) -> Dict[str, Optional[
     return result
 
 
-def apply_unique_cuotes(df: pd.DataFrame) -> pd.DataFrame:
-    """Aplica reglas específicas de categorización y elimina duplicados"""
-    
-    # Crear máscaras booleanas para todas las condiciones
-    desc = df['Descripción'].str
-    ref = df['Referencia']
-    concepto = df['Concepto'].str
-    
-    #======================================================
-    # Compra Inmueble - Asignaciones
-    #======================================================
-    rules = [
-        (desc.contains('DONACION PARTE ALEX  ORDEN: ALEJANDRO MARTIN IGLESIAS', na=False), 'Compra_Inmueble', 'Donacion_Alex'),
-        (desc.contains('DONACION A LUCIA ARANZANA SANCHEZ', na=False), 'Compra_Inmueble', 'Donacion_Lucia'),
-        (desc.contains('PAGO HIPOTECA  ORDEN: ALEJANDRO MARTIN IGLESIAS', na=False), 'Compra_Inmueble', 'Aportación_Alex'),
-        (desc.contains('APORTE LUCIA  ORDEN: LUCIA ARANZANA SANCHE', na=False), 'Compra_Inmueble', 'Aportación_Lucia'),
-        (desc.contains('60103201400943H0000', na=False) & ref.str.contains('40094370000', na=False), 'Compra_Inmueble', 'Prestamo_Ibercaja'),
-        (desc.contains('CANCELACION HIPOTECA', na=False) | desc.contains('TRANSMISION INMUEBLE', na=False), 'Compra_Inmueble', 'Transferencia_Marga'),
-        (ref == '6010301400943', 'Compra_Inmueble', 'Provision_Fondos'),
-        (concepto.contains('COMISIONES Y GASTOS VARIOS', na=False), 'Compra_Inmueble', 'Provision_Fondos'),
-        (desc.contains('MOVIMIENTO CONJUNTA REVOLUT A CONJUNTA', na=False), 'Transferencia', 'Inicio_Conjunta_Revolut'),
-    ]
-    
-    for mask, categoria, subcategoria in rules:
-        df.loc[mask, ['Categoria', 'Subcategoria']] = [categoria, subcategoria]
-    
-    #======================================================
-    # Eliminar transacciones duplicadas/innecesarias
-    #======================================================
-    eliminaciones = [
-        desc.contains('PAGO HIPOTECA', na=False) & (ref == '6010303307165'),
-        desc.contains('BENIGNO MARTIN GARCIA 06539399Q DONACION', na=False),
-        desc.contains('ALEJANDRO MARTIN IGLESIAS 70943328N', na=False) & (ref == '653296441873'),
-        desc.contains('ALEJANDRO MARTIN IGLESIAS 70943328N', na=False) & (ref == '653186134379'),
-        desc.contains('DONACION PARTE ALEX', na=False) & (ref == '6010303307165'),
-        desc.contains('LUCIA ME ECHA LA BRONCA', na=False),
-    ]
-    
-    mask_eliminar = pd.Series([False] * len(df), index=df.index)
-    for cond in eliminaciones:
-        mask_eliminar |= cond
-    
-    return df[~mask_eliminar]
\ No newline at end of file
+def rules_version(category_rules=CATEGORY_RULES) -> str:
+    """Huella de las reglas: cambia al añadir/editar una regla (clave de jobs y cachés)."""
+    return hashlib.sha256(repr(list(category_rules)).encode("utf-8")).hexdigest()[:16]
+
+
+def _extract(values: pd.Series, pattern: str, group: int) -> pd.Series:
+    """Grupo `group` de la primera coincidencia (IGNORECASE), sin espacios; None si no hay coincidencia."""
+    found = values.str.extract(pattern, flags=re.IGNORECASE, expand=True)[group - 1].str.strip()
+    return found.astype(object).where(found.notna(), None)
+
+
+class RuleMatcher:
+    """Reglas (patrón, categoría, subcategoría) compiladas una sola vez. Gana la primera que coincide."""
+
+    def __init__(self, category_rules):
+        self.rules = [(re.compile(pattern), category, subcategory) for pattern, category, subcategory in category_rules]
+        # Un único regex con todas las reglas descarta de golpe las filas que no coinciden con ninguna.
+        # Solo sin grupos: al unirlos se renumeran y las referencias (\1) dejarían de coincidir.
+        self.any_rule = None
+        if self.rules and not any(compiled.groups for compiled, _, _ in self.rules):
+            try:
+                self.any_rule = re.compile("|".join(f"(?:{pattern})" for pattern, _, _ in category_rules))
+            except re.error:
+                pass  # p. ej. flags en línea: se evalúa regla a regla
+
+    def match(self, upper: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        """upper: descripciones en mayúsculas (dtype object).
+        Devuelve (categoria, subcategoria); categoria es None en las filas sin coincidencia."""
+        categoria = pd.Series([None] * len(upper), index=upper.index, dtype=object)
+        subcategoria = pd.Series([None] * len(upper), index=upper.index, dtype=object)
+        if not self.rules:
+            return categoria, subcategoria
+        pending = upper
+        if self.any_rule is not None:
+            pending = upper[upper.str.contains(self.any_rule, regex=True).to_numpy(dtype=bool)]
+        for pattern, category, subcategory in self.rules:
+            if pending.empty:
+                break
+            hit = pending.str.contains(pattern, regex=True).to_numpy(dtype=bool)
+            if hit.any():
+                idx = pending.index[hit]
+                categoria[idx] = category
+                subcategoria[idx] = subcategory
+                pending = pending[~hit]
+        return categoria, subcategoria
+
+
+# Matchers compilados por versión de reglas (globales + capas de cada usuario/cuenta)
+MATCHER_CACHE_SIZE = 256
+_MATCHERS: "OrderedDict[str, RuleMatcher]" = OrderedDict()
+_MATCHERS_LOCK = threading.Lock()
+
+
+def get_matcher(category_rules=CATEGORY_RULES) -> RuleMatcher:
+    """Matcher de las reglas, compilado la primera vez y reutilizado mientras no cambien (LRU)."""
+    version = rules_version(category_rules)
+    with _MATCHERS_LOCK:
+        matcher = _MATCHERS.get(version)
+        if matcher is not None:
+            _MATCHERS.move_to_end(version)
+            return matcher
+    matcher = RuleMatcher(category_rules)
+    with _MATCHERS_LOCK:
+        _MATCHERS[version] = matcher
+        while len(_MATCHERS) > MATCHER_CACHE_SIZE:
+            _MATCHERS.popitem(last=False)
+    return matcher
+
+
+def upper_descriptions(descriptions: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """(original, mayúsculas) en dtype object: str.contains/extract usan `re`, igual que analyze_description."""
+    original = descriptions.fillna("").astype(str).astype(object)
+    return original, original.str.upper()
+
+
+def analyze_descriptions(descriptions: pd.Series, category_rules=CATEGORY_RULES) -> pd.DataFrame:
+    """Versión vectorizada de analyze_description: mismo resultado fila a fila (mismo índice que la entrada).
+    category_rules: lista de reglas o RuleMatcher ya compilado.
+    Cada descripción distinta se analiza una sola vez (los extractos repiten mucho los mismos comercios)."""
+    matcher = category_rules if isinstance(category_rules, RuleMatcher) else get_matcher(category_rules)
+    original = descriptions.fillna("").astype(str).astype(object)
+    codes, uniques = pd.factorize(original)
+    result = _analyze_unique(pd.Series(uniques, dtype=object), matcher).take(codes)
+    result.index = original.index
+    return result
+
+
+def _analyze_unique(original: pd.Series, matcher: RuleMatcher) -> pd.DataFrame:
+    categoria, subcategoria = matcher.match(original.str.upper())
+    categoria = categoria.where(categoria.notna(), "otros")
+
+    result = pd.DataFrame(
+        {"Categoria": categoria, "Subcategoria": subcategoria, "Contraparte": None, "BizumMensaje": None},
+        index=original.index,
+    ).astype(object)
+
+    bizum = (categoria == "bizum").to_numpy()
+    if bizum.any():
+        desc = original[bizum]
+        contact = _extract(desc, r'(BENEF|ORDEN):\s*([^,]+)', 2)
+        result.loc[bizum, "Contraparte"] = contact
+        result.loc[bizum, "Subcategoria"] = contact
+        result.loc[bizum, "BizumMensaje"] = _extract(desc, r'BIZUM\s+(?:CARGO|ABONO).*?\s(.+?)\s*\.', 1)
+
+    restaurante = ((categoria == "restaurantes") & subcategoria.isna()).to_numpy()
+    if restaurante.any():
+        result.loc[restaurante, "Subcategoria"] = _extract(
+            original[restaurante], r'(RESTAURANTE|TABERNA|BAR|CERVECERIA|CAFETERIA)\s+(.+)$', 2
+        )
+
+    transferencia = ((categoria == "Transferencia") & subcategoria.isna()).to_numpy()
+    if transferencia.any():
+        desc = original[transferencia]
+        cp = pd.Series([None] * len(desc), index=desc.index, dtype=object)
+        for pattern in [r'desde\s+([^,]+)', r'ORDEN:\s*([^,]+)', r'BENEF:\s*([^,]+)']:
+            cp = cp.where(cp.notna(), _extract(desc, pattern, 1))
+        result.loc[transferencia, "Contraparte"] = cp
+        result.loc[transferencia, "Subcategoria"] = cp
+
+    return result
+
+
+class MaskRules:
+    """
+    Reglas sobre columnas de la tabla evaluadas en una sola pasada (en lugar de una máscara str.contains por regla).
+    Condición: (columna, "contains", regex) como str.contains(na=False), o (columna, "eq", valor). Las condiciones
+    de una regla se combinan con AND.
+      - overrides: [(condiciones, categoria, subcategoria)]; si coinciden varias gana la última (como con
+        asignaciones .loc encadenadas).
+      - deletions: [condiciones]; se descarta la fila si se cumple cualquiera.
+    Todas las condiciones se evalúan sobre los valores de entrada, antes de aplicar ningún override.
+    """
+
+    def __init__(self, overrides, deletions=()):
+        self.overrides = [(tuple(conditions), categoria, subcategoria) for conditions, categoria, subcategoria in overrides]
+        self.deletions = [tuple(conditions) for conditions in deletions]
+        conditions = [c for rule in self.overrides for c in rule[0]] + [c for rule in self.deletions for c in rule]
+        self.conditions = list(dict.fromkeys(conditions))
+        self.columns = list(dict.fromkeys(column for column, _, _ in self.conditions))
+        # Por columna: un único regex con todos sus patrones, para descartar de golpe las filas que no tocan ninguno
+        self._patterns: Dict[str, list] = {}
+        for column, op, value in self.conditions:
+            if op == "contains":
+                self._patterns.setdefault(column, []).append(((column, op, value), re.compile(value)))
+            elif op != "eq":
+                raise ValueError(f"Operador no soportado: {op}")
+        self._prefilters = {
+            column: re.compile("|".join(f"(?:{p.pattern})" for _, p in patterns))
+            for column, patterns in self._patterns.items()
+        }
+
+    def _evaluate(self, arrays: Dict[str, np.ndarray], n: int) -> Dict[tuple, np.ndarray]:
+        hits: Dict[tuple, np.ndarray] = {}
+        for column, op, value in self.conditions:
+            if op == "eq":
+                hits[(column, op, value)] = arrays[column] == value
+        for column, patterns in self._patterns.items():
+            values = arrays[column]
+            search = self._prefilters[column].search
+            # Única pasada por la columna; cada patrón solo se prueba en las pocas filas que superan el filtro
+            candidates = [i for i, v in enumerate(values) if isinstance(v, str) and search(v)]
+            for condition, pattern in patterns:
+                mask = np.zeros(n, dtype=bool)
+                mask[[i for i in candidates if pattern.search(values[i])]] = True
+                hits[condition] = mask
+        return hits
+
+    def evaluate(self, columns) -> Tuple[np.ndarray, np.ndarray]:
+        """columns: DataFrame o dict {columna: valores}.
+        Devuelve (override, delete): índice del override que se aplica a cada fila (-1 si ninguno) y máscara de borrado."""
+        arrays = {column: np.asarray(columns[column], dtype=object) for column in self.columns}
+        n = len(next(iter(arrays.values()))) if arrays else 0
+        hits = self._evaluate(arrays, n)
+
+        def all_of(conditions) -> np.ndarray:
+            mask = np.ones(n, dtype=bool)
+            for condition in conditions:
+                mask &= hits[condition]
+            return mask
+
+        override = np.full(n, -1, dtype=np.int64)
+        for k, (conditions, _, _) in enumerate(self.overrides):
+            override[all_of(conditions)] = k
+        delete = np.zeros(n, dtype=bool)
+        for conditions in self.deletions:
+            delete |= all_of(conditions)
+        return override, delete
+
+    def labels(self, override: np.ndarray, categoria, subcategoria) -> Tuple[np.ndarray, np.ndarray]:
+        """(categoria, subcategoria) con los overrides aplicados sobre los valores dados (arrays nuevos, dtype object)."""
+        categoria = np.array(categoria, dtype=object)
+        subcategoria = np.array(subcategoria, dtype=object)
+        for k, (_, cat, subcat) in enumerate(self.overrides):
+            hit = override == k
+            categoria[hit] = cat
+            subcategoria[hit] = subcat
+        return categoria, subcategoria
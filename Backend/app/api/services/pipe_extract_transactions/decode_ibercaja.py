@@ -4,13 +4,62 @@ import numpy as np
 import warnings
 from app.api.services.pipe_extract_transactions.category_rules import (
     CATEGORY_RULES,
-    apply_unique_cuotes,
-    analyze_description,
+    MaskRules,
+    analyze_descriptions,
 )
-from app.api.services.account_config import get_ibercaja_account_map
+from app.api.services.account_config import get_household_ibercaja_accounts, get_ibercaja_account_map
 
 warnings.filterwarnings("ignore", message="Workbook contains no default style*")
 
+FORMAT_CHUNK_ROWS = 4096
+
+TABLE_COLUMNS = ['Nº Orden', 'Fecha Operacion', 'Concepto', 'Descripción', 'Referencia', 'Importe', 'Saldo']
+ORDER_COLUMNS = ['DT_DATE', 'Nº Orden']
+OUTPUT_COLUMNS = [
+    'DT_DATE',
+    'Importe',
+    'Saldo',
+    'Cuenta',
+    'Descripción',
+    'Categoria',
+    'Subcategoria',
+    'BizumMensaje',
+    'Referencia',
+]
+
+# Reglas por Concepto (se evalúan sobre la categoría de CATEGORY_RULES, antes de cualquier override)
+CONCEPT_OVERRIDES = [
+    ([('Concepto', 'eq', 'TRANSFERENCIA INTERNA')], 'Transferencia', 'Interna'),
+    ([('Concepto', 'eq', 'TRANSFERENCIA OTRA ENTIDAD'), ('Categoria', 'eq', 'None')], 'Transferencia', 'Interna'),
+    ([('Concepto', 'eq', 'LIQUIDACION INTERESES DE LA CUENTA')], 'Banco', 'Intereses'),
+    ([('Concepto', 'eq', 'OPERACION PRESTAMO-CREDITO-AVAL')], 'Vivienda', 'Hipoteca'),
+]
+
+#======================================================
+# Reglas de un hogar concreto: solo en sus cuentas (household_rules en config/accounts.yaml).
+# Aquí quedan las que miran Concepto/Referencia o descartan filas; las que solo miran la descripción
+# son reglas del usuario (config/household_rules.yaml, se cargan con app.cli.import_rules).
+#======================================================
+HOUSEHOLD_OVERRIDES = [
+    ([('Concepto', 'eq', 'TRANSFERENCIA INTERNA')], 'Transferencia', 'Aportacion_Conjunta_Alex'),
+    ([('Concepto', 'eq', 'TRANSFERENCIA INTERNA'), ('Descripción', 'contains', 'ARANZANA SANCHEZ')], 'Transferencia', 'Aportacion_Conjunta_Lucia'),
+    ([('Descripción', 'contains', '60103201400943H0000'), ('Referencia', 'contains', '40094370000')], 'Compra_Inmueble', 'Prestamo_Ibercaja'),
+    ([('Referencia', 'eq', '6010301400943')], 'Compra_Inmueble', 'Provision_Fondos'),
+    ([('Concepto', 'contains', 'COMISIONES Y GASTOS VARIOS')], 'Compra_Inmueble', 'Provision_Fondos'),
+]
+# Transacciones duplicadas/innecesarias
+HOUSEHOLD_DELETIONS = [
+    [('Descripción', 'contains', 'PAGO HIPOTECA'), ('Referencia', 'eq', '6010303307165')],
+    [('Descripción', 'contains', 'BENIGNO MARTIN GARCIA 06539399Q DONACION')],
+    [('Descripción', 'contains', 'ALEJANDRO MARTIN IGLESIAS 70943328N'), ('Referencia', 'eq', '653296441873')],
+    [('Descripción', 'contains', 'ALEJANDRO MARTIN IGLESIAS 70943328N'), ('Referencia', 'eq', '653186134379')],
+    [('Descripción', 'contains', 'DONACION PARTE ALEX'), ('Referencia', 'eq', '6010303307165')],
+    [('Descripción', 'contains', 'LUCIA ME ECHA LA BRONCA')],
+]
+
+IBERCAJA_RULES = MaskRules(CONCEPT_OVERRIDES)
+HOUSEHOLD_RULES = MaskRules(CONCEPT_OVERRIDES + HOUSEHOLD_OVERRIDES, HOUSEHOLD_DELETIONS)
+
 
 def main_decode_ibercaja(df: pd.DataFrame, account_map: dict | None = None) -> tuple[pd.DataFrame, str, str]:
     """Decodifica extractos de Ibercaja y normaliza la tabla de transacciones.
@@ -38,66 +87,57 @@ def main_decode_ibercaja(df: pd.DataFrame, account_map: dict | None = None) -> t
     if not display_name:
         display_name = f"Cuenta {suffix}"
 
-    # 2. Leer tabla de transacciones
-    df = df.iloc[6:].reset_index(drop=True)
-    df.columns = df.iloc[0]
-    df = df.iloc[1:].reset_index(drop=True)
+    # 2. Leer tabla de transacciones: solo las columnas que se usan (sin copiar el resto de la hoja)
+    header = pd.Index(df.iloc[6])
+    df = pd.DataFrame({name: df.iloc[7:, header.get_loc(name)].to_numpy() for name in TABLE_COLUMNS})
 
-    
-    # 4. Procesamiento inicial
-    df['DT_DATE'] = pd.to_datetime(df['Fecha Operacion'], format='%d/%m/%Y', errors='coerce')
+    # 4. Procesamiento inicial (importes convertidos aquí, con la tabla aún pequeña en memoria)
+    df['DT_DATE'] = pd.to_datetime(df.pop('Fecha Operacion'), format='%d/%m/%Y', errors='coerce')
     df["Cuenta"] = display_name
     df["Descripción"] = df["Descripción"].fillna("").astype(str).str.strip()
-    
-    # 5. Aplicar análisis semántico
-    analysis_df = pd.DataFrame(df["Descripción"].apply(lambda x: analyze_description(x, CATEGORY_RULES)).tolist())
-    df = pd.concat([df.reset_index(drop=True), analysis_df], axis=1)
-    
-    # 6. Reglas de categorización específicas (usando máscaras booleanas)
-    transferencia_interna = df['Concepto'] == 'TRANSFERENCIA INTERNA'
-    transferencia_otra = (df['Concepto'] == 'TRANSFERENCIA OTRA ENTIDAD') & (df['Categoria'] == 'None')
-    lucia_transfer = transferencia_interna & df['Descripción'].str.contains('ARANZANA SANCHEZ', na=False)
-    liquidacion = df['Concepto'] == 'LIQUIDACION INTERESES DE LA CUENTA'
-    prestamo = df['Concepto'] == 'OPERACION PRESTAMO-CREDITO-AVAL'
-    
-    df.loc[transferencia_interna, ['Categoria', 'Subcategoria']] = ['Transferencia', 'Aportacion_Conjunta_Alex']
-    df.loc[transferencia_otra, ['Categoria', 'Subcategoria']] = ['Transferencia', 'Interna']
-    df.loc[lucia_transfer, ['Categoria', 'Subcategoria']] = ['Transferencia', 'Aportacion_Conjunta_Lucia']
-    df.loc[liquidacion, ['Categoria', 'Subcategoria']] = ['Banco', 'Intereses']
-    df.loc[prestamo, ['Categoria', 'Subcategoria']] = ['Vivienda', 'Hipoteca']
-    
-    # 7. Aplicar cuotas únicas
-    df = apply_unique_cuotes(df)
-    
+    for col in ['Importe', 'Saldo']:
+        df[col] = _to_number(df[col])
+    df['Referencia'] = df['Referencia'].where(df['Referencia'].notna(), None)
+
+    # 5. Aplicar análisis semántico (vectorizado)
+    analysis_df = analyze_descriptions(df["Descripción"], CATEGORY_RULES)
+
+    # 6-7. Reglas por Concepto (y las del hogar en sus cuentas): todas las máscaras en una sola pasada
+    rules = HOUSEHOLD_RULES if account_number in get_household_ibercaja_accounts() else IBERCAJA_RULES
+    override, delete = rules.evaluate({**df, 'Categoria': analysis_df['Categoria']})
+    categoria, subcategoria = rules.labels(override, analysis_df['Categoria'], analysis_df['Subcategoria'])
+    df['Categoria'] = categoria
+    df['Subcategoria'] = pd.Series(subcategoria, index=df.index, dtype=object)
+    df['BizumMensaje'] = analysis_df['BizumMensaje']
+    del analysis_df, categoria, subcategoria
+    df = df.loc[~delete, ORDER_COLUMNS + OUTPUT_COLUMNS[1:]]
+
     # 8. Por cada día (DT_DATE): ordenar por "Nº de Orden" ascendente (la última tiene número más bajo).
     #    Luego asignar horas ficticias según ese orden (0s, 1s, 2s...).
-    df['DT_DATE'] = pd.to_datetime(df['DT_DATE'])
-    df = df.sort_values(['DT_DATE', 'Nº Orden'], ascending=[False, True])
-
-    # Contar cuántos hay por día para invertir el offset
-    group_sizes = df.groupby(df['DT_DATE'].dt.date)['DT_DATE'].transform('count')
-    rank_per_day = df.groupby(df['DT_DATE'].dt.date).cumcount()
-
-    # El primero (Nº de Orden menor) recibe el offset más alto → aparece último en orden asc, primero en desc
-    df['DT_DATE'] = (df['DT_DATE'] + pd.to_timedelta(group_sizes - rank_per_day - 1, unit='s')).dt.strftime('%Y-%m-%d %H:%M:%S')
-    
-    df = df[
-        [
-            'DT_DATE', 
-            'Importe', 
-            'Saldo',
-            'Cuenta', 
-            'Descripción', 
-            'Categoria', 
-            'Subcategoria', 
-            'BizumMensaje', 
-            'Referencia'
-        ]
-    ]
-    # 11. Limpiar valores nulos y convertir importes
-    df = df.replace({pd.NA: None, np.nan: None})
-    for col in ['Importe', 'Saldo']:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col].astype(str).str.replace(",", "."), errors='coerce')
+    df = df.sort_values(ORDER_COLUMNS, ascending=[False, True])
+
+    # El primero (Nº de Orden menor) recibe el offset más alto → aparece último en orden asc, primero en desc.
+    # Agrupar por día como datetime64 (normalize) evita crear un objeto date por fila
+    by_day = df.groupby(df['DT_DATE'].dt.normalize())
+    offset = by_day['DT_DATE'].transform('count') - by_day.cumcount() - 1
+    df['DT_DATE'] = _format_timestamps(df['DT_DATE'] + pd.to_timedelta(offset, unit='s'))
+
+    return df[OUTPUT_COLUMNS], account_identifier, display_name
+
+
+def _to_number(values: pd.Series) -> pd.Series:
+    """Importes con coma decimal ("1234,56") o ya numéricos; NaN si no se puede convertir."""
+    return pd.to_numeric(values.astype(str).str.replace(",", "."), errors='coerce')
+
 
-    return df, account_identifier, display_name
\ No newline at end of file
+def _format_timestamps(values: pd.Series, chunk_rows: int = FORMAT_CHUNK_ROWS) -> pd.Series:
+    """'YYYY-MM-DD HH:MM:SS' (None en NaT) sin strftime fila a fila.
+    Por bloques: el array de texto intermedio de numpy ocupa más que los propios str resultantes."""
+    seconds = values.to_numpy(dtype='datetime64[s]')
+    text = np.empty(len(seconds), dtype=object)
+    for start in range(0, len(seconds), chunk_rows):
+        part = np.datetime_as_string(seconds[start:start + chunk_rows], unit='s')
+        part.view(np.uint32).reshape(len(part), -1)[:, 10] = ord(' ')  # 'T' -> ' ' sobre el propio bloque
+        text[start:start + chunk_rows] = part
+    text[values.isna().to_numpy()] = None
+    return pd.Series(text, index=values.index, dtype=object)
@@ -7,7 +7,7 @@ import numpy as np
 import warnings
 from app.api.services.pipe_extract_transactions.category_rules import (
     CATEGORY_RULES,
-    analyze_description,
+    analyze_descriptions,
 )
 from app.api.services.account_config import get_pluxee_default_name
 
@@ -91,41 +91,29 @@ def main_decode_pluxee(df: pd.DataFrame, account_name: str | None = None) -> tup
     df_tx["Cuenta"] = display_name
     df_tx["Referencia"] = "NONE"
 
-    # 6. Calcular Saldo hacia atrás: última fila = saldo_final, anterior = saldo - importe
+    # 6. Calcular Saldo hacia atrás: última fila = saldo_final, anterior = saldo - importe.
+    #    subtract.accumulate resta en el mismo orden que un bucle (mismo redondeo que saldo -= importe)
     df_tx = df_tx.sort_values("DT_DATE", ascending=False).reset_index(drop=True)
-    saldos = [float(saldo_final)]
-    for i in range(len(df_tx) - 1):
-        imp = df_tx.iloc[i]["Importe"]
-        saldos.append(saldos[-1] - imp)
-    df_tx["Saldo"] = saldos
+    importes = df_tx["Importe"].to_numpy(dtype=float)
+    df_tx["Saldo"] = np.subtract.accumulate(np.concatenate(([float(saldo_final)], importes[:-1])))
 
     # 7. Ordenar por fecha ascendente (cronológico)
     df_tx = df_tx.sort_values("DT_DATE").reset_index(drop=True)
 
     # 8. Categoría: cargas (positivos) = NOMINA/INDRA PLUXEE; gastos (negativos) = Restaurantes
-    analysis_df = pd.DataFrame(
-        df_tx["Descripción"].apply(lambda x: analyze_description(x, CATEGORY_RULES)).tolist()
-    )
-    df_tx = pd.concat([df_tx.reset_index(drop=True), analysis_df], axis=1)
-    cargas = df_tx["Importe"] > 0
-    df_tx.loc[cargas, ["Categoria", "Subcategoria"]] = ["Nómina", "INDRA PLUXEE"]
-    df_tx.loc[~cargas, "Categoria"] = "Restaurantes"
-    # Subcategoria para gastos: de category_rules o descripción truncada
-    def _subcat(row):
-        if row["Importe"] > 0:
-            return "INDRA PLUXEE"
-        sc = row.get("Subcategoria")
-        desc = (row.get("Descripción") or "").strip()
-        if sc and str(sc) != "None" and str(sc) != "Restaurantes":
-            return sc
-        return (desc[:50] + "…") if len(desc) > 50 else desc if desc else "Restaurante"
-
-    df_tx["Subcategoria"] = df_tx.apply(_subcat, axis=1)
+    #    Subcategoria de gastos: la de category_rules o, si no hay, la descripción truncada
+    subcat = analyze_descriptions(df_tx["Descripción"], CATEGORY_RULES)["Subcategoria"]
+    desc = df_tx["Descripción"].astype(object)
+    truncated = desc.where(desc.str.len() <= 50, desc.str[:50] + "…").where(desc != "", "Restaurante")
+    use_rule = subcat.notna() & ~subcat.isin(["", "None", "Restaurantes"])
+    cargas = (df_tx["Importe"] > 0).to_numpy()
+    df_tx["Categoria"] = np.where(cargas, "Nómina", "Restaurantes")
+    df_tx["Subcategoria"] = np.where(cargas, "INDRA PLUXEE", np.where(use_rule, subcat, truncated))
     df_tx["BizumMensaje"] = None
 
     # 9. Añadir hh:mm:ss ficticias por orden dentro de cada día (como Ibercaja)
     df_tx["DT_DATE"] = pd.to_datetime(df_tx["DT_DATE"])
-    rank_per_day = df_tx.groupby(df_tx["DT_DATE"].dt.date).cumcount()
+    rank_per_day = df_tx.groupby(df_tx["DT_DATE"].dt.normalize()).cumcount()
     df_tx["DT_DATE"] = (df_tx["DT_DATE"] + pd.to_timedelta(rank_per_day, unit="s")).dt.strftime("%Y-%m-%d %H:%M:%S")
 
     # 10. Columnas finales
@@ -1,6 +1,6 @@
 import pandas as pd
 import warnings
-from app.api.services.pipe_extract_transactions.category_rules import analyze_description, CATEGORY_RULES
+from app.api.services.pipe_extract_transactions.category_rules import analyze_descriptions, CATEGORY_RULES
 from app.api.services.account_config import get_revolut_default_name
 
 warnings.filterwarnings("ignore", message="Workbook contains no default style*")
@@ -21,16 +21,14 @@ def main_decode_revolut(df: pd.DataFrame, account_name: str | None = None) -> tu
     # 2. Normalizar descripción
     df["Descripción"] = df["Descripción"].fillna("").astype(str).str.strip()
     
-    # 3. Aplicar análisis semántico usando la función compartida
-    analysis_df = pd.DataFrame(
-        df["Descripción"].apply(lambda x: analyze_description(x, CATEGORY_RULES)).tolist()
-    )
+    # 3. Aplicar análisis semántico usando la función compartida (vectorizada)
+    analysis_df = analyze_descriptions(df["Descripción"], CATEGORY_RULES)
     
     # 4. Renombrar columnas
     df = df.rename(columns={'Fecha de inicio': 'DT_DATE'})
     
     # 5. Concatenar DataFrames
-    df = pd.concat([df.reset_index(drop=True), analysis_df], axis=1)
+    df = pd.concat([df, analysis_df], axis=1).reset_index(drop=True)
     
     # 6. Normalizar Saldo
     df['Saldo'] = df['Saldo'].fillna(0.0)
@@ -1,4 +1,5 @@
 import hashlib
+import time
 import pandas as pd
 import numpy as np
 from io import BytesIO
@@ -8,6 +9,8 @@ from pathlib import Path
 from app.api.services.pipe_extract_transactions.decode_ibercaja import main_decode_ibercaja
 from app.api.services.pipe_extract_transactions.decode_revolut import main_decode_revolut
 from app.api.services.pipe_extract_transactions.decode_pluxee import main_decode_pluxee, is_pluxee_file
+from app.core.metrics import PIPELINE_STAGE_SECONDS
+from app.core.tracing import add_span
 
 
 def _norm_val(x, decimals: bool = False) -> str:
@@ -50,54 +53,78 @@ def generate_transaction_id(row: pd.Series) -> str:
     return hash_object.hexdigest()[:32]
 
 
-def main_file_parser(file_content: bytes, is_csv: bool = False) -> tuple[pd.DataFrame, str, str, str]:
-    """
-    Parsea el archivo y devuelve (DataFrame, tipo_origen, account_identifier, display_name).
-    tipo_origen: 'Revolut' | 'Ibercaja'
-    account_identifier: identificador estable (ibercaja_716552, revolut)
-    display_name: nombre mostrado (Conjunta, Revolut, etc.)
-    """
+REVOLUT_HEADER = [
+    'Tipo',
+    'Producto',
+    'Fecha de inicio',
+    'Fecha de finalización',
+    'Descripción',
+    'Importe',
+    'Comisión',
+    'Divisa',
+    'State',
+    'Saldo'
+]
+
+DECODERS = {
+    "Ibercaja": main_decode_ibercaja,
+    "Revolut": main_decode_revolut,
+    "Pluxee": main_decode_pluxee,
+}
+
+COLUMN_RENAMES = {
+    "DT_DATE": "dt_date",
+    "Importe": "importe",
+    "Saldo": "saldo",
+    "Cuenta": "cuenta",
+    "Descripción": "descripcion",
+    "Categoria": "categoria",
+    "Subcategoria": "subcategoria",
+    "BizumMensaje": "bizum_mensaje",
+    "Referencia": "referencia"
+}
+
+
+# ---------- Etapas del pipeline (también las usan los benchmarks) ----------
+
+def read_statement(file_content: bytes, is_csv: bool = False) -> pd.DataFrame:
+    """Lee el fichero crudo: CSV con cabecera (Revolut) o Excel sin cabecera."""
     if is_csv:
-        df = pd.read_csv(BytesIO(file_content))
-    else:
-        df = pd.read_excel(BytesIO(file_content), engine="openpyxl", header=None)
+        return pd.read_csv(BytesIO(file_content))
+    return pd.read_excel(BytesIO(file_content), engine="openpyxl", header=None)
+
 
+def detect_source(df: pd.DataFrame) -> str:
+    """Identifica el banco de origen: 'Ibercaja' | 'Revolut' | 'Pluxee'."""
     # Ibercaja -> Identificar en celda texto
     cell_value = str(df.iloc[2, 0]).strip().upper()
 
-    # Revolut -> Identificar cabecera
-    df_columns = df.columns.tolist()
-    revolut_header = [
-        'Tipo', 
-        'Producto', 
-        'Fecha de inicio', 
-        'Fecha de finalización', 
-        'Descripción', 
-        'Importe',
-        'Comisión',
-        'Divisa',
-        'State',
-        'Saldo'
-    ]
-
     if "CONSULTA MOVIMIENTOS DE LA CUENTA" in cell_value:
         print("Archivo identificado como IBERCAJA")
-        df_transactions, account_identifier, display_name = main_decode_ibercaja(df)
-        source_type = "Ibercaja"
-    elif df_columns == revolut_header:
+        return "Ibercaja"
+    # Revolut -> Identificar cabecera
+    if df.columns.tolist() == REVOLUT_HEADER:
         print("Archivo identificado como Revolut")
-        df_transactions, account_identifier, display_name = main_decode_revolut(df)
-        source_type = "Revolut"
-    elif is_pluxee_file(df):
+        return "Revolut"
+    if is_pluxee_file(df):
         print("Archivo identificado como Pluxee")
-        df_transactions, account_identifier, display_name = main_decode_pluxee(df)
-        source_type = "Pluxee"
-    else:
-        raise ValueError("Formato de archivo no reconocido")
-    
-    # Generar transaction_id para cada fila
+        return "Pluxee"
+    raise ValueError("Formato de archivo no reconocido")
+
+
+def decode_statement(df: pd.DataFrame, source_type: str) -> tuple[pd.DataFrame, str, str]:
+    """Decodifica y categoriza con el decoder del banco. Retorna (DataFrame, account_identifier, display_name)."""
+    return DECODERS[source_type](df)
+
+
+def assign_transaction_ids(df_transactions: pd.DataFrame) -> pd.DataFrame:
+    """Genera transaction_id para cada fila."""
     df_transactions['transaction_id'] = df_transactions.apply(generate_transaction_id, axis=1)
+    return df_transactions
+
 
+def check_duplicate_ids(df_transactions: pd.DataFrame) -> None:
+    """Aborta si el hash genera el mismo transaction_id para dos filas del fichero."""
     duplicated_mask = df_transactions["transaction_id"].duplicated(keep=False)
 
     if duplicated_mask.any():
@@ -126,17 +153,40 @@ def main_file_parser(file_content: bytes, is_csv: bool = False) -> tuple[pd.Data
             "en el archivo. Revisa el criterio del hash."
         )
 
-    # Rename for consistency
-    df_transactions = df_transactions.rename(columns={
-        "DT_DATE": "dt_date",
-        "Importe": "importe",
-        "Saldo": "saldo",
-        "Cuenta": "cuenta",
-        "Descripción": "descripcion",
-        "Categoria": "categoria",
-        "Subcategoria": "subcategoria",
-        "BizumMensaje": "bizum_mensaje",
-        "Referencia": "referencia"
-    })
-
-    return df_transactions, source_type, account_identifier, display_name
\ No newline at end of file
+
+def rename_columns(df_transactions: pd.DataFrame) -> pd.DataFrame:
+    """Rename for consistency (nombres de columna de la tabla transactions)."""
+    return df_transactions.rename(columns=COLUMN_RENAMES)
+
+
+def main_file_parser(file_content: bytes, is_csv: bool = False) -> tuple[pd.DataFrame, str, str, str]:
+    """
+    Parsea el archivo y devuelve (DataFrame, tipo_origen, account_identifier, display_name).
+    tipo_origen: 'Revolut' | 'Ibercaja' | 'Pluxee'
+    account_identifier: identificador estable (ibercaja_716552, revolut)
+    display_name: nombre mostrado (Conjunta, Revolut, etc.)
+    """
+    # Duraciones por etapa; se publican al final porque el banco se conoce tras "detect"
+    timings: dict[str, float] = {}
+    source_type = "desconocido"
+
+    def timed(stage: str, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timings[stage] = time.perf_counter() - t0
+
+    try:
+        df = timed("read", read_statement, file_content, is_csv=is_csv)
+        source_type = timed("detect", detect_source, df)
+        df_transactions, account_identifier, display_name = timed("decode", decode_statement, df, source_type)
+        df_transactions = timed("hash", assign_transaction_ids, df_transactions)
+        timed("dup-check", check_duplicate_ids, df_transactions)
+        df_transactions = timed("rename", rename_columns, df_transactions)
+    finally:
+        for stage, seconds in timings.items():
+            PIPELINE_STAGE_SECONDS.labels(stage=stage, source=source_type).observe(seconds)
+            add_span(f"parse-{stage}", seconds)
+
+    return df_transactions, source_type, account_identifier, display_name
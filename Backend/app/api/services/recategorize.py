@@ -0,0 +1,173 @@
+"""
+Recategorización en segundo plano: vuelve a pasar las reglas (las del usuario y luego las globales con
+analyze_descriptions) por las transacciones ya guardadas, para que una regla nueva se aplique también al histórico.
+
+Recorre las cuentas por páginas (keyset por id), compara la categoría guardada con la nueva y solo escribe
+las filas que cambian, agrupadas por (categoria, subcategoria): un UPDATE por grupo y bloque de ids.
+No toca filas editadas a mano (categoria_manual), tampoco las marcadas mientras corre: la condición va en
+el propio UPDATE (skip_manual), no solo en la lectura de la página.
+Las reglas globales tampoco tocan (las del usuario sí):
+  - cuentas Pluxee (su categoría sale del signo del importe, no de las reglas)
+  - etiquetas que ponen los decoders con datos que no se guardan (Concepto y Referencia de Ibercaja)
+"""
+
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.api.services.pipe_extract_transactions.category_rules import (
+    CATEGORY_RULES,
+    analyze_descriptions,
+    rules_version,
+)
+from app.api.services.storage import storage_service
+from app.api.services.storage.base import IN_CHUNK_SIZE
+from app.api.services.user_rules import UserRules
+
+PAGE_SIZE = 1000
+SCOPES = ("otros", "all")
+
+SKIPPED_SOURCES = {"pluxee"}
+# Asignadas en decode_ibercaja (por Concepto/Referencia, también las del hogar): no se pueden recalcular
+# desde la descripción
+DECODER_LABELS = {
+    ("Transferencia", "Aportacion_Conjunta_Alex"),
+    ("Transferencia", "Aportacion_Conjunta_Lucia"),
+    ("Transferencia", "Interna"),
+    ("Transferencia", "Inicio_Conjunta_Revolut"),
+    ("Banco", "Intereses"),
+    ("Vivienda", "Hipoteca"),
+}
+DECODER_CATEGORIES = {"Compra_Inmueble"}
+
+PAGE_COLUMNS = "id, account_id, descripcion, categoria, subcategoria, categoria_manual"
+
+ProgressFn = Callable[[str, float], None]
+Label = Tuple[Optional[str], Optional[str]]
+
+
+def _is_decoder_label(categoria: Optional[str], subcategoria: Optional[str]) -> bool:
+    return categoria in DECODER_CATEGORIES or (categoria, subcategoria) in DECODER_LABELS
+
+
+def recategorize_transactions(
+    account_ids: List[str],
+    scope: str = "otros",
+    progress: Optional[ProgressFn] = None,
+    page_size: int = PAGE_SIZE,
+    category_rules=CATEGORY_RULES,
+    user_rules: Optional[UserRules] = None,
+) -> Dict[str, Any]:
+    """
+    scope="otros": solo filas sin categoría o en "otros". scope="all": todas (salvo las excepciones del módulo).
+    Devuelve el resumen (filas leídas, omitidas, actualizadas y cambios por categoría).
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"scope debe ser uno de {SCOPES}")
+
+    accounts = storage_service.get_accounts(account_ids)
+    all_ids = [a["id"] for a in accounts]
+    rule_accounts = [a["id"] for a in accounts if (a.get("source") or "").lower() not in SKIPPED_SOURCES]
+    total = storage_service.count_transactions(all_ids)
+
+    summary: Dict[str, Any] = {
+        "scope": scope,
+        "rules_version": rules_version(category_rules),
+        "user_rules": len(user_rules.rules) if user_rules else 0,
+        "accounts": len(all_ids),
+        "skipped_accounts": len(all_ids) - len(rule_accounts),
+        "scanned": 0,
+        "skipped_manual": 0,
+        "skipped_decoder": 0,
+        "matched_user_rules": 0,
+        "changed": 0,
+        "updated": 0,
+    }
+    pending: Dict[Label, List[int]] = defaultdict(list)
+    changes: Dict[Label, int] = defaultdict(int)
+
+    def flush(label: Label) -> None:
+        ids = pending.pop(label)
+        categoria, subcategoria = label
+        updated = storage_service.update_transactions(
+            all_ids, {"categoria": categoria, "subcategoria": subcategoria}, row_ids=ids, skip_manual=True
+        )
+        summary["updated"] += len(updated)
+
+    if progress:
+        progress("scan", 0.0)
+    after_id = 0
+    while all_ids:
+        page = storage_service.fetch_transactions_page(all_ids, after_id=after_id, limit=page_size, columns=PAGE_COLUMNS)
+        if not page:
+            break
+        after_id = page[-1]["id"]
+        summary["scanned"] += len(page)
+
+        df = pd.DataFrame(page).astype(object)
+        df = df.where(df.notna(), None)
+        manual = df["categoria_manual"].map(bool)
+        summary["skipped_manual"] += int(manual.sum())
+        candidates = ~manual
+        if scope == "otros":
+            candidates &= df["categoria"].isna() | (df["categoria"] == "otros")
+        new_cat = df["categoria"].copy()
+        new_sub = df["subcategoria"].copy()
+
+        # 1. Reglas del usuario (por cuenta): ganan a todo lo demás
+        user_hit = pd.Series(False, index=df.index)
+        if user_rules is not None and user_rules.rules:
+            for account_id, rows in df[candidates].groupby("account_id").groups.items():
+                matched = user_rules.match(account_id, df.loc[rows, "descripcion"])
+                if matched is None:
+                    continue
+                categoria, subcategoria = matched
+                hit = categoria.index[categoria.notna()]
+                new_cat.loc[hit] = categoria.loc[hit]
+                new_sub.loc[hit] = subcategoria.loc[hit]
+                user_hit.loc[hit] = True
+        summary["matched_user_rules"] += int(user_hit.sum())
+
+        # 2. Reglas globales: fuera de Pluxee y sin pisar etiquetas de los decoders
+        decoder = pd.Series(
+            [_is_decoder_label(c, s) for c, s in zip(df["categoria"], df["subcategoria"])], index=df.index
+        )
+        summary["skipped_decoder"] += int((candidates & ~user_hit & decoder).sum())
+        use_global = candidates & ~user_hit & ~decoder & df["account_id"].isin(rule_accounts)
+        if use_global.any():
+            new = analyze_descriptions(df.loc[use_global, "descripcion"], category_rules)
+            new_cat.loc[new.index] = new["Categoria"]
+            new_sub.loc[new.index] = new["Subcategoria"]
+
+        for row_id, old_cat, old_sub, cat, sub in zip(
+            df["id"], df["categoria"], df["subcategoria"], new_cat, new_sub
+        ):
+            if (old_cat, old_sub) == (cat, sub):
+                continue
+            label = (cat, sub)
+            changes[label] += 1
+            pending[label].append(int(row_id))
+            if len(pending[label]) >= IN_CHUNK_SIZE:
+                flush(label)
+
+        if progress and total:
+            progress("scan", summary["scanned"] / total)
+        if len(page) < page_size:
+            break
+
+    for label in list(pending):
+        flush(label)
+    if progress:
+        progress("write", 1.0)
+
+    summary["changed"] = sum(changes.values())
+    summary["changes"] = sorted(
+        ({"categoria": c, "subcategoria": s, "count": n} for (c, s), n in changes.items()),
+        key=lambda item: -item["count"],
+    )
+    print(
+        f"Recategorización ({scope}): {summary['scanned']} leídas, {summary['changed']} cambiadas, "
+        f"{summary['skipped_manual']} manuales omitidas"
+    )
+    return summary
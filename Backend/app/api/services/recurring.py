@@ -0,0 +1,237 @@
+"""
+Detección de pagos recurrentes y suscripciones (Digi, Naturgy, Wellhub, Apple, seguros...).
+
+Sobre un TransactionFrame con descripciones (load(details=True)):
+  1. Solo cargos (importe < 0) que no son transferencias entre cuentas.
+  2. Comercio normalizado: la descripción sin referencias, números ni palabras de relleno (una vez por
+     descripción distinta).
+  3. Dentro de cada comercio, bandas de importe: importes ordenados que no saltan más de AMOUNT_STEP entre
+     uno y el siguiente (una factura de luz que varía cae en la misma banda; dos tarifas distintas, no).
+  4. Por banda, intervalos en días entre cargos (los del mismo día cuentan como uno) y su mediana: si cae en
+     el rango de una frecuencia y la mayoría de intervalos también, es un pago recurrente.
+Todo con operaciones por grupo de NumPy (lexsort/bincount), sin bucles por transacción.
+
+El resultado de cada cuenta se guarda en memoria con su data_version: mientras la cuenta no cambie,
+la petición no vuelve a leer el histórico.
+"""
+
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.api.services.transaction_frame import TransactionFrame
+from app.core.metrics import cache_result
+
+# frecuencia -> (periodo en días, intervalo mínimo, intervalo máximo, ocurrencias mínimas)
+FREQUENCIES: Dict[str, Tuple[float, int, int, int]] = {
+    "mensual": (30.44, 25, 36, 3),
+    "trimestral": (91.31, 80, 102, 3),
+    "anual": (365.25, 345, 385, 2),
+}
+# Fracción mínima de intervalos dentro del rango (tolera algún mes saltado o cobrado tarde)
+MIN_REGULARITY = 0.7
+# Salto máximo entre importes consecutivos de una misma banda (25 %)
+AMOUNT_STEP = 1.25
+EXCLUDED_CATEGORIES = {"transferencia"}
+
+# Palabras que no identifican al comercio (tipo de operación del banco)
+_NOISE_WORDS = {
+    "COMPRA", "TARJ", "TARJETA", "RECIBO", "ADEUDO", "CARGO", "PAGO", "DOMICILIACION", "SEPA", "CUOTA",
+    "BIZUM", "TPV", "WWW", "COM", "ES",
+}
+_TAIL_RE = re.compile(r"\s\.?\s*(BENEF|ORDEN):.*$")
+_WORD_RE = re.compile(r"[A-Z]{2,}")
+MERCHANT_WORDS = 3
+
+CACHE_SIZE = 512
+_CACHE: "OrderedDict[str, Tuple[int, List[Dict[str, Any]]]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def merchant_key(descripcion: Optional[str]) -> str:
+    """'COMERCIALIZADORA RE 005378170000SDD000062334' -> 'COMERCIALIZADORA RE'; 'Revolut**5454*' -> 'REVOLUT'."""
+    if not descripcion:
+        return ""
+    text = unicodedata.normalize("NFKD", str(descripcion).upper())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _TAIL_RE.sub("", text)
+    # Palabras pegadas a dígitos (referencias, números de tarjeta) fuera
+    words = [w for w in re.split(r"[^A-Z0-9]+", text) if w and not any(c.isdigit() for c in w)]
+    words = [w for w in words if _WORD_RE.fullmatch(w) and w not in _NOISE_WORDS]
+    return " ".join(words[:MERCHANT_WORDS])
+
+
+def _group_starts(sorted_groups: np.ndarray) -> np.ndarray:
+    """Posiciones donde empieza cada grupo en un array de códigos ordenado."""
+    return np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+
+
+def detect_recurring(frame: TransactionFrame) -> List[Dict[str, Any]]:
+    """Pagos recurrentes del frame (todas sus cuentas), sin el estado activa/inactiva (depende de hoy)."""
+    if not len(frame):
+        return []
+    ts = frame.ts
+    excluded = np.array([str(c or "").lower() in EXCLUDED_CATEGORIES for c in frame.categorias], dtype=bool)
+    merchants = np.array([merchant_key(d) for d in frame.descripciones], dtype=object)
+    merchant_values, merchant_of_desc = np.unique(merchants.astype(str), return_inverse=True)
+    merchant_codes = merchant_of_desc[frame.descripcion_codes]
+    empty_merchant = np.flatnonzero(merchant_values == "")
+    rows = np.flatnonzero(
+        (frame.importe < 0)
+        & ~np.isnat(ts)
+        & ~excluded[frame.categoria_codes]
+        & ~np.isin(merchant_codes, empty_merchant)
+    )
+    if not len(rows):
+        return []
+
+    # Bandas de importe: orden (cuenta, comercio, |importe|) y corte donde el salto supera AMOUNT_STEP
+    amount = -frame.importe[rows]
+    account = frame.account_codes[rows]
+    merchant = merchant_codes[rows]
+    order = np.lexsort((amount, merchant, account))
+    rows, amount, account, merchant = rows[order], amount[order], account[order], merchant[order]
+    new_band = np.r_[True, (account[1:] != account[:-1]) | (merchant[1:] != merchant[:-1])
+                     | (amount[1:] > amount[:-1] * AMOUNT_STEP)]
+    band = np.cumsum(new_band) - 1
+
+    # Ocurrencias: cargos de la misma banda el mismo día cuentan como uno (importe sumado)
+    day = ts[rows].astype("datetime64[D]").astype(np.int64)
+    order = np.lexsort((day, band))
+    rows, band, day, amount = rows[order], band[order], day[order], amount[order]
+    new_occ = np.r_[True, (band[1:] != band[:-1]) | (day[1:] != day[:-1])]
+    occ_start = np.flatnonzero(new_occ)
+    occ_band = band[occ_start]
+    occ_day = day[occ_start]
+    occ_amount = np.add.reduceat(amount, occ_start)
+    occ_last_row = rows[np.r_[occ_start[1:], len(rows)] - 1]  # última fila de la ocurrencia
+
+    n_bands = int(band[-1]) + 1
+    occurrences = np.bincount(occ_band, minlength=n_bands)
+
+    # Intervalos entre ocurrencias consecutivas de la misma banda
+    same = occ_band[1:] == occ_band[:-1]
+    gaps = (occ_day[1:] - occ_day[:-1])[same].astype(np.float64)
+    gap_band = occ_band[1:][same]
+    if not len(gaps):
+        return []
+    order = np.lexsort((gaps, gap_band))
+    gaps_sorted, gap_band_sorted = gaps[order], gap_band[order]
+    starts = _group_starts(gap_band_sorted)
+    counts = np.diff(np.r_[starts, len(gaps_sorted)])
+    median = (gaps_sorted[starts + (counts - 1) // 2] + gaps_sorted[starts + counts // 2]) / 2
+    bands_with_gaps = gap_band_sorted[starts]
+
+    median_by_band = np.full(n_bands, np.nan)
+    median_by_band[bands_with_gaps] = median
+    frequency = np.full(n_bands, "", dtype=object)
+    period = np.full(n_bands, np.nan)
+    for name, (days, low, high, min_occ) in FREQUENCIES.items():
+        in_range = (gaps >= low) & (gaps <= high)
+        regular = np.bincount(gap_band, weights=in_range, minlength=n_bands) / np.maximum(
+            np.bincount(gap_band, minlength=n_bands), 1
+        )
+        hit = (
+            (frequency == "")
+            & (median_by_band >= low) & (median_by_band <= high)
+            & (regular >= MIN_REGULARITY)
+            & (occurrences >= min_occ)
+        )
+        frequency[hit] = name
+        period[hit] = days
+
+    detected = np.flatnonzero(frequency != "")
+    if not len(detected):
+        return []
+    occ_starts = _group_starts(occ_band)
+    first_occ = occ_starts[detected]
+    last_occ = np.r_[occ_starts[1:], len(occ_band)][detected] - 1
+    mean_amount = np.bincount(occ_band, weights=occ_amount, minlength=n_bands)[detected] / occurrences[detected]
+    next_day = occ_day[last_occ] + np.round(median_by_band[detected]).astype(np.int64)
+
+    result = []
+    for i, b in enumerate(detected):
+        last_row = occ_last_row[last_occ[i]]
+        monthly = mean_amount[i] * FREQUENCIES["mensual"][0] / period[b]
+        result.append({
+            "comercio": str(merchant_values[merchant_codes[last_row]]),
+            "descripcion": frame.descripciones[frame.descripcion_codes[last_row]],
+            "account_id": frame.accounts[frame.account_codes[last_row]],
+            "cuenta": frame.cuentas[frame.cuenta_codes[last_row]],
+            "categoria": frame.categorias[frame.categoria_codes[last_row]],
+            "subcategoria": frame.subcategorias[frame.subcategoria_codes[last_row]],
+            "frecuencia": frequency[b],
+            "periodo_dias": round(float(median_by_band[b]), 1),
+            "ocurrencias": int(occurrences[b]),
+            "primera_fecha": str(np.datetime64(int(occ_day[first_occ[i]]), "D")),
+            "ultima_fecha": str(np.datetime64(int(occ_day[last_occ[i]]), "D")),
+            "proxima_fecha": str(np.datetime64(int(next_day[i]), "D")),
+            "ultimo_importe": -round(float(occ_amount[last_occ[i]]), 2),
+            "importe_medio": -round(float(mean_amount[i]), 2),
+            "coste_mensual": round(float(monthly), 2),
+        })
+    result.sort(key=lambda r: (-r["coste_mensual"], r["comercio"]))
+    return result
+
+
+def _cached(account_id: str, version: Optional[int]) -> Optional[List[Dict[str, Any]]]:
+    if version is None:
+        return None
+    with _CACHE_LOCK:
+        entry = _CACHE.get(account_id)
+        if entry is None or entry[0] != version:
+            return None
+        _CACHE.move_to_end(account_id)
+        return entry[1]
+
+
+def _store(account_id: str, version: Optional[int], items: List[Dict[str, Any]]) -> None:
+    if version is None:
+        return
+    with _CACHE_LOCK:
+        _CACHE[account_id] = (version, items)
+        _CACHE.move_to_end(account_id)
+        while len(_CACHE) > CACHE_SIZE:
+            _CACHE.popitem(last=False)
+
+
+def recurring_payments(
+    account_ids: List[str],
+    versions: Optional[Dict[str, int]],
+    today: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Pagos recurrentes de las cuentas, con 'activa' (la próxima fecha aún no ha vencido con margen).
+    Solo se leen de storage las cuentas sin resultado en caché para su data_version actual.
+    """
+    versions = versions or {}
+    by_account: Dict[str, List[Dict[str, Any]]] = {}
+    missing = []
+    for account_id in dict.fromkeys(account_ids):
+        items = _cached(account_id, versions.get(account_id))
+        cache_result("recurring", items is not None)
+        if items is None:
+            missing.append(account_id)
+        else:
+            by_account[account_id] = items
+    if missing:
+        detected = detect_recurring(TransactionFrame.load(missing, details=True))
+        for account_id in missing:
+            items = [r for r in detected if r["account_id"] == account_id]
+            _store(account_id, versions.get(account_id), items)
+            by_account[account_id] = items
+
+    today_day = np.datetime64(today or date.today(), "D")
+    result = []
+    for items in by_account.values():
+        for item in items:
+            _, low, high, _ = FREQUENCIES[item["frecuencia"]]
+            grace = np.timedelta64(high - low, "D")
+            result.append({**item, "activa": bool(np.datetime64(item["proxima_fecha"], "D") + grace >= today_day)})
+    result.sort(key=lambda r: (-r["coste_mensual"], r["comercio"]))
+    return result
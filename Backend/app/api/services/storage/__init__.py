@@ -0,0 +1,51 @@
+"""
+Storage Package
+Selección del backend de persistencia según Settings.STORAGE_BACKEND:
+  - "supabase" (por defecto): Supabase hospedado.
+  - "sqlite": fichero SQLite local (Settings.SQLITE_PATH), sin red.
+La instancia compartida va envuelta en InstrumentedStorage (métricas por llamada) y se crea
+en el primer uso: importar los routers no importa el cliente de Supabase (arranque en frío rápido).
+"""
+
+from typing import Optional
+
+from app.core.config import settings
+from app.api.services.storage.base import StorageBackend, TransactionFilters
+from app.api.services.storage.instrumented import InstrumentedStorage
+
+_STORAGE_SERVICE: Optional[StorageBackend] = None
+
+
+def create_storage_service(backend: str | None = None) -> StorageBackend:
+    backend = (backend or settings.STORAGE_BACKEND).lower()
+    if backend == "sqlite":
+        from app.api.services.storage.sqlite_service import SQLiteService
+        return SQLiteService(settings.SQLITE_PATH, dev_auth=settings.SQLITE_DEV_AUTH)
+    if backend == "supabase":
+        from app.api.services.supabase.supabase_service import SupabaseService
+        return SupabaseService()
+    raise ValueError(f"STORAGE_BACKEND no soportado: {backend}")
+
+
+def get_storage_service() -> StorageBackend:
+    """Instancia única del backend configurado (se crea en el primer uso), con métricas."""
+    global _STORAGE_SERVICE
+    if _STORAGE_SERVICE is None:
+        _STORAGE_SERVICE = InstrumentedStorage(create_storage_service())
+    return _STORAGE_SERVICE
+
+
+class _LazyStorage:
+    """`storage_service` de los routers: delega en get_storage_service() al usarse, no al importarse."""
+
+    def __getattr__(self, name: str):
+        return getattr(get_storage_service(), name)
+
+
+storage_service = _LazyStorage()
+
+
+__all__ = [
+    "InstrumentedStorage", "StorageBackend", "TransactionFilters",
+    "create_storage_service", "get_storage_service", "storage_service",
+]
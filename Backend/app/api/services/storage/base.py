@@ -0,0 +1,233 @@
+"""
+Interfaz de persistencia. Todas las operaciones que hacen los routers sobre cuentas
+y transacciones pasan por aquí, de modo que el backend (Supabase o SQLite local)
+se elige en Settings.STORAGE_BACKEND sin tocar los endpoints.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Máximo de ids por filtro in_() (PostgREST los pasa en la URL)
+IN_CHUNK_SIZE = 500
+
+
+def chunks(values: List[Any], size: int = IN_CHUNK_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+# Rango de fechas (dt_date mínimo, máximo) que toca una escritura en cada cuenta; None = no afecta a fechas ni saldos
+Touched = Dict[str, Optional[Tuple[str, str]]]
+# Columnas cuya edición cambia las series de saldo (el resto, p. ej. categoría, no)
+BALANCE_COLUMNS = ("dt_date", "saldo")
+# Versiones que se conservan por cuenta en account_changes (en Supabase, el trigger account_changes_retention)
+ACCOUNT_CHANGES_RETENTION = 100
+
+
+def touched_ranges(rows: Iterable[Dict[str, Any]]) -> Touched:
+    """(dt_date mínimo, máximo) por cuenta de las filas insertadas o borradas."""
+    ranges: Dict[str, Tuple[str, str]] = {}
+    for row in rows:
+        account_id, dt = row.get("account_id"), row.get("dt_date")
+        if not account_id or not dt:
+            continue
+        dt = str(dt)
+        low, high = ranges.get(account_id, (dt, dt))
+        ranges[account_id] = (min(low, dt), max(high, dt))
+    return ranges
+
+
+def update_touched(data: Dict[str, Any], rows: Iterable[Dict[str, Any]]) -> Optional[Touched]:
+    """Rango de una edición: sin efecto en saldos si no cambia fecha ni saldo. Si los cambia, None (las fechas
+    anteriores ya no se conocen): quien cachee por periodos invalida la cuenta entera."""
+    if any(column in data for column in BALANCE_COLUMNS):
+        return None
+    return {row["account_id"]: None for row in rows if row.get("account_id")}
+
+
+@dataclass(frozen=True)
+class TransactionFilters:
+    """Filtros de columna de los listados (además de las cuentas y el rango de fechas)."""
+    categoria: Optional[str] = None
+    subcategoria: Optional[str] = None
+    min_importe: Optional[float] = None
+    max_importe: Optional[float] = None
+    tipo: Optional[str] = None  # "ingresos" (importe > 0) | "gastos" (importe < 0)
+
+
+class StorageBackend(ABC):
+    """Operaciones de persistencia que usan los routers y el pipeline de subida."""
+
+    @abstractmethod
+    def is_connected(self) -> bool:
+        ...
+
+    def warm_up(self) -> None:
+        """Abre conexiones antes de la primera petición (prewarm de arranque). Por defecto no hace nada."""
+
+    def uses_service_role(self) -> bool:
+        """True si las escrituras no están sujetas a RLS."""
+        return True
+
+    # ---------- Auth ----------
+
+    @abstractmethod
+    def get_user_from_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Valida el Bearer token. Devuelve {"sub", "email"} o None si no es válido."""
+
+    # ---------- Cuentas ----------
+
+    @abstractmethod
+    def get_or_create_account(self, stable_key: str, source: str, display_name: str) -> str:
+        """Obtiene o crea una cuenta por stable_key. Devuelve account.id (UUID)."""
+
+    @abstractmethod
+    def link_user_account(self, user_id: str, account_id: str) -> None:
+        """Vincula usuario a cuenta. Ignora si ya existe."""
+
+    @abstractmethod
+    def get_user_account_ids(self, user_id: str) -> List[str]:
+        """Devuelve los account_id (UUID) de las cuentas del usuario."""
+
+    @abstractmethod
+    def get_user_ids_sharing_accounts_with(self, user_id: str) -> List[str]:
+        """Usuarios que comparten al menos una cuenta con este usuario."""
+
+    @abstractmethod
+    def get_account_ids_for_users(self, user_ids: List[str]) -> List[str]:
+        """Devuelve todos los account_id de los usuarios indicados."""
+
+    @abstractmethod
+    def get_account_display_names(self, account_ids: List[str]) -> Dict[str, str]:
+        """Mapeo account_id -> display_name para mostrar en la UI."""
+
+    @abstractmethod
+    def get_accounts(self, account_ids: List[str]) -> List[Dict[str, Any]]:
+        """Cuentas (id, display_name, stable_key, source) ordenadas por display_name."""
+
+    @abstractmethod
+    def update_account_display_name(self, account_id: str, display_name: str) -> None:
+        ...
+
+    @abstractmethod
+    def get_account_versions(self, account_ids: List[str]) -> Optional[Dict[str, int]]:
+        """Mapeo account_id -> data_version. None si no se puede leer (entonces no se usan ETags)."""
+
+    @abstractmethod
+    def bump_account_versions(self, account_ids: List[str], touched: Optional[Touched] = None) -> None:
+        """Incrementa data_version de las cuentas modificadas (invalida los ETag de sus GET).
+        Con touched, registra en account_changes el rango de fechas afectado por cuenta (ver get_account_changes);
+        sin él no se registra nada y las cachés por periodo tratan el cambio como que afecta a todo.
+        Del registro solo quedan las últimas ACCOUNT_CHANGES_RETENTION versiones de cada cuenta."""
+
+    @abstractmethod
+    def get_account_changes(self, after_versions: Dict[str, int]) -> Optional[List[Dict[str, Any]]]:
+        """Cambios registrados con data_version posterior a after_versions[account_id]:
+        [{account_id, data_version, from_date, to_date}] (fechas None: sin efecto en saldos). None si no se pueden leer."""
+
+    # ---------- Transacciones: lectura ----------
+
+    @abstractmethod
+    def fetch_transactions(
+        self,
+        account_ids: List[str],
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        limit: int = 10000,
+        filters: Optional[TransactionFilters] = None,
+    ) -> List[Dict[str, Any]]:
+        """Transacciones de las cuentas indicadas, por dt_date descendente."""
+
+    @abstractmethod
+    def count_transactions(self, account_ids: List[str]) -> int:
+        """Número de transacciones de las cuentas (para informar progreso al recorrerlas)."""
+
+    @abstractmethod
+    def fetch_transactions_page(
+        self,
+        account_ids: List[str],
+        after_id: int = 0,
+        limit: int = 1000,
+        columns: str = "*",
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        filters: Optional[TransactionFilters] = None,
+    ) -> List[Dict[str, Any]]:
+        """Página por id ascendente (keyset: id > after_id) para recorrer todo el histórico sin OFFSET.
+        from_date/to_date y filters filtran como en fetch_transactions."""
+
+    @abstractmethod
+    def fetch_latest_balances(self, account_ids: List[str], limit: int = 2000) -> List[Dict[str, Any]]:
+        """Filas (dt_date, saldo, cuenta, account_id) más recientes, por dt_date descendente."""
+
+    @abstractmethod
+    def search_transactions(
+        self, account_ids: List[str], query: str, limit: int = 50, offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Búsqueda de texto en descripcion, bizum_mensaje y subcategoria (sin mayúsculas ni acentos).
+        Filas con 'rank', de más a menos relevante (a igual relevancia, las más recientes primero)."""
+
+    @abstractmethod
+    def get_existing_transaction_ids(self, transaction_ids: List[str]) -> Set[str]:
+        ...
+
+    @abstractmethod
+    def get_transaction_owners(self, row_ids: List[int]) -> Dict[int, str]:
+        """Mapeo id de fila -> account_id para las filas que existen."""
+
+    # ---------- Transacciones: escritura ----------
+
+    @abstractmethod
+    def insert_transactions(self, transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Inserta transacciones. Devuelve {received, inserted, duplicates}."""
+
+    @abstractmethod
+    def delete_transactions(
+        self,
+        account_ids: List[str],
+        row_ids: Optional[List[int]] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        import_batch: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Borra transacciones limitadas a account_ids, por ids de fila o por filtro.
+        Devuelve las filas borradas (id, account_id).
+        """
+
+    @abstractmethod
+    def update_transactions(
+        self,
+        account_ids: List[str],
+        data: Dict[str, Any],
+        row_ids: Optional[List[int]] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        import_batch: Optional[str] = None,
+        skip_manual: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Aplica los mismos cambios a todas las transacciones seleccionadas (limitadas a account_ids).
+        skip_manual: la condición categoria_manual = false va en la propia escritura (no pisa una edición
+        manual hecha después de leer las filas, p. ej. durante la recategorización).
+        Devuelve las filas actualizadas (id, account_id).
+        """
+
+    # ---------- Reglas de categoría del usuario ----------
+
+    @abstractmethod
+    def get_category_rules(self, user_id: str) -> List[Dict[str, Any]]:
+        """Reglas del usuario (globales de usuario y por cuenta) por priority e id. [] si no se pueden leer."""
+
+    @abstractmethod
+    def create_category_rule(self, rule: Dict[str, Any]) -> Dict[str, Any]:
+        """Crea la regla (user_id, account_id, pattern, categoria, subcategoria, priority). Devuelve la fila."""
+
+    @abstractmethod
+    def update_category_rule(self, user_id: str, rule_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Actualiza una regla del usuario. None si no existe o no es suya."""
+
+    @abstractmethod
+    def delete_category_rule(self, user_id: str, rule_id: int) -> bool:
+        """Borra una regla del usuario. False si no existe o no es suya."""
@@ -0,0 +1,69 @@
+"""
+Proxy de un StorageBackend que mide cada llamada pública (latencia, filas y errores)
+en las métricas banka_storage_* y como span de la traza de la petición.
+Los routers lo usan sin saberlo (get_storage_service).
+"""
+
+import time
+from typing import Any, Dict
+
+from app.core.metrics import STORAGE_CALL_SECONDS, STORAGE_ERRORS, STORAGE_ROWS
+from app.core.tracing import add_span
+
+# Sin E/S: no merece la pena medirlas
+_UNTIMED = {"is_connected", "uses_service_role"}
+# Ya tienen su propio span en la traza (deps.get_current_user lo anota como "auth"): solo métricas
+_UNTRACED = {"get_user_from_token"}
+# Devuelven un objeto, no filas
+_NO_ROWS = {"get_user_from_token", "create_category_rule", "update_category_rule"}
+
+
+def _row_count(result: Any) -> int | None:
+    if isinstance(result, dict) and "inserted" in result:
+        return result["inserted"]
+    if isinstance(result, (list, set, tuple, dict)):
+        return len(result)
+    return None
+
+
+class InstrumentedStorage:
+    """Misma interfaz que el backend envuelto (`wrapped`); cada método público queda medido."""
+
+    def __init__(self, wrapped: Any):
+        self.wrapped = wrapped
+        self._methods: Dict[str, Any] = {}
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.wrapped, name)
+        if name.startswith("_") or name in _UNTIMED or not callable(attr):
+            return attr
+        method = self._methods.get(name)
+        if method is None:
+            method = self._methods[name] = self._instrument(name)
+        return method
+
+    def _instrument(self, name: str):
+        seconds = STORAGE_CALL_SECONDS.labels(method=name)
+        rows = None if name in _NO_ROWS else STORAGE_ROWS.labels(method=name)
+        errors = STORAGE_ERRORS.labels(method=name)
+        traced = name not in _UNTRACED
+
+        def call(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                result = getattr(self.wrapped, name)(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                elapsed = time.perf_counter() - t0
+                seconds.observe(elapsed)
+                if traced:
+                    add_span(name, elapsed)
+            count = _row_count(result) if rows is not None else None
+            if count is not None:
+                rows.observe(count)
+            return result
+
+        call.__name__ = name
+        return call
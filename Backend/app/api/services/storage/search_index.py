@@ -0,0 +1,85 @@
+"""
+Índice invertido en memoria para la búsqueda de texto del backend SQLite (el equivalente en Postgres es
+tsvector + pg_trgm, ver supabase_migration_search.sql).
+Término (minúsculas, sin acentos) -> {id de fila: apariciones}. Una búsqueda solo toca las listas de los
+términos de la consulta, así que su coste depende de los resultados y no del tamaño del histórico.
+"""
+
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
+
+SEARCH_COLUMNS = ("descripcion", "bizum_mensaje", "subcategoria")
+# Un término de la consulta que es prefijo de otro del índice ("merca" -> "mercadona") puntúa menos que el exacto
+PREFIX_WEIGHT = 0.5
+
+_TOKEN_RE = re.compile(r"[^\W_]+")  # "Aportacion_Conjunta" -> aportacion, conjunta
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin acentos (como immutable_unaccent + lower en Postgres)."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+class InvertedIndex:
+    """Índice de las transacciones de una cuenta sobre SEARCH_COLUMNS."""
+
+    def __init__(self, rows: Iterable[Dict[str, Any]]):
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.dates: Dict[int, str] = {}
+        # Las descripciones se repiten mucho (mismo comercio): cada texto distinto se tokeniza una vez
+        seen: Dict[str, List[str]] = {}
+        for row in rows:
+            row_id = row["id"]
+            self.dates[row_id] = str(row.get("dt_date") or "")
+            text = " ".join(str(row[col]) for col in SEARCH_COLUMNS if row.get(col))
+            terms = seen.get(text)
+            if terms is None:
+                terms = seen[text] = tokenize(text)
+            for term in terms:
+                posting = self.postings[term]
+                posting[row_id] = posting.get(row_id, 0) + 1
+        self.postings = dict(self.postings)
+        self.terms = sorted(self.postings)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def _term_scores(self, term: str) -> Dict[int, float]:
+        """Puntuación por fila para un término: tf·idf del exacto y, con menos peso, de los que empiezan por él."""
+        scores: Dict[int, float] = {}
+        start = bisect_left(self.terms, term)
+        for candidate in self.terms[start:]:
+            if not candidate.startswith(term):
+                break
+            posting = self.postings[candidate]
+            weight = math.log(1 + len(self.dates) / len(posting))
+            if candidate != term:
+                weight *= PREFIX_WEIGHT
+            for row_id, tf in posting.items():
+                score = weight * (1 + math.log(tf))
+                if score > scores.get(row_id, 0.0):
+                    scores[row_id] = score
+        return scores
+
+    def search(self, query: str) -> List[Tuple[float, str, int]]:
+        """(puntuación, dt_date, id) de las filas que contienen todos los términos de la consulta."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        # Empezar por el término más selectivo: las intersecciones siguientes recorren menos filas
+        per_term = sorted((self._term_scores(term) for term in terms), key=len)
+        total = dict(per_term[0])
+        for scores in per_term[1:]:
+            total = {row_id: score + scores[row_id] for row_id, score in total.items() if row_id in scores}
+            if not total:
+                return []
+        return [(score, self.dates[row_id], row_id) for row_id, score in total.items()]
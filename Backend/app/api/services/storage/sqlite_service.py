@@ -0,0 +1,528 @@
+"""
+Backend de persistencia embebido (SQLite) con el mismo esquema e índices que supabase_schema_v2.sql.
+Permite ejecutar el servicio sin red, medir el coste real de las consultas y hacer pruebas de carga.
+Auth local: el Bearer token se interpreta como el user_id (solo para desarrollo).
+"""
+
+import heapq
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.api.services.storage.base import (
+    ACCOUNT_CHANGES_RETENTION, StorageBackend, Touched, TransactionFilters, chunks, touched_ranges, update_touched,
+)
+from app.api.services.storage.search_index import SEARCH_COLUMNS, InvertedIndex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id TEXT PRIMARY KEY,
+    stable_key VARCHAR(50) UNIQUE NOT NULL,
+    display_name VARCHAR(100),
+    source VARCHAR(20) NOT NULL DEFAULT 'ibercaja',
+    data_version INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS user_accounts (
+    user_id TEXT NOT NULL,
+    account_id TEXT NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    PRIMARY KEY (user_id, account_id)
+);
+
+CREATE TABLE IF NOT EXISTS account_changes (
+    account_id TEXT NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    data_version INTEGER NOT NULL,
+    from_date TEXT,
+    to_date TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    PRIMARY KEY (account_id, data_version)
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transaction_id VARCHAR(64) UNIQUE NOT NULL,
+    account_id TEXT NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    dt_date TEXT NOT NULL,
+    importe REAL NOT NULL,
+    saldo REAL,
+    cuenta VARCHAR(100),
+    descripcion TEXT,
+    categoria VARCHAR(50),
+    subcategoria VARCHAR(100),
+    categoria_manual INTEGER NOT NULL DEFAULT 0,
+    bizum_mensaje TEXT,
+    referencia VARCHAR(100),
+    import_batch TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_account_dt_date ON transactions(account_id, dt_date DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_categoria_dt_date ON transactions(account_id, categoria, dt_date DESC);
+DROP INDEX IF EXISTS idx_transactions_account_id;  -- sustituido por los compuestos (ficheros .db ya creados)
+CREATE INDEX IF NOT EXISTS idx_transactions_dt_date ON transactions(dt_date DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_transaction_id ON transactions(transaction_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_import_batch ON transactions(import_batch);
+
+CREATE TABLE IF NOT EXISTS category_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    account_id TEXT REFERENCES accounts(id) ON DELETE CASCADE,
+    pattern TEXT NOT NULL,
+    categoria VARCHAR(50) NOT NULL,
+    subcategoria VARCHAR(100),
+    priority INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_category_rules_user_id ON category_rules(user_id);
+"""
+
+TRANSACTION_COLUMNS = (
+    "transaction_id", "account_id", "dt_date", "importe", "saldo", "cuenta",
+    "descripcion", "categoria", "subcategoria", "bizum_mensaje", "referencia", "import_batch",
+)
+# Editables con update_transactions (categoria_manual no viene del extracto: lo marca la edición manual)
+UPDATABLE_COLUMNS = (*TRANSACTION_COLUMNS, "categoria_manual")
+
+RULE_COLUMNS = ("user_id", "account_id", "pattern", "categoria", "subcategoria", "priority")
+
+# Columnas añadidas después de la primera versión del esquema (ficheros .db ya creados)
+ADDED_COLUMNS = {"categoria_manual": "INTEGER NOT NULL DEFAULT 0"}
+
+
+def _normalize_dt(value: Any) -> Optional[str]:
+    """dt_date como lo devuelve Postgres (timestamptz en UTC): YYYY-MM-DDTHH:MM:SS+00:00.
+    Con zona se pasa a UTC y sin ella se toma como UTC: todas las filas con el mismo offset, así las
+    comparaciones de texto con from_date/to_date y el orden funcionan igual que en Supabase."""
+    if value is None:
+        return None
+    text = str(value).strip()
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        return text
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S") + "+00:00"
+
+
+def _placeholders(values: List[Any]) -> str:
+    return ", ".join("?" for _ in values)
+
+
+class SQLiteService(StorageBackend):
+    """Persistencia local en un fichero SQLite (o ":memory:").
+    Sin validación de tokens: con dev_auth el Bearer token es el user_id (solo desarrollo); sin él se rechazan todos."""
+
+    def __init__(self, path: str = ":memory:", dev_auth: bool = False):
+        self.path = path
+        self.dev_auth = dev_auth
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+        self._search_indexes: Dict[str, Tuple[int, InvertedIndex]] = {}
+        existing = {r["name"] for r in self.conn.execute("PRAGMA table_info(transactions)").fetchall()}
+        for column, ddl in ADDED_COLUMNS.items():
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE transactions ADD COLUMN {column} {ddl}")
+
+    def _query(self, sql: str, params: List[Any] | tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def _write(self, sql: str, params: List[Any] | tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock, self.conn:
+            return [dict(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def is_connected(self) -> bool:
+        return True
+
+    def get_user_from_token(self, token: str) -> Optional[Dict[str, Any]]:
+        token = (token or "").strip()
+        if not token or not self.dev_auth:
+            return None
+        return {"sub": token, "email": None}
+
+    # ---------- Cuentas ----------
+
+    def get_or_create_account(self, stable_key: str, source: str, display_name: str) -> str:
+        rows = self._query("SELECT id FROM accounts WHERE stable_key = ? LIMIT 1", (stable_key,))
+        if rows:
+            return rows[0]["id"]
+        new_id = str(uuid.uuid4())
+        self._write(
+            "INSERT INTO accounts (id, stable_key, display_name, source) VALUES (?, ?, ?, ?)",
+            (new_id, stable_key, display_name or stable_key, source.lower()),
+        )
+        return new_id
+
+    def link_user_account(self, user_id: str, account_id: str) -> None:
+        self._write(
+            "INSERT OR IGNORE INTO user_accounts (user_id, account_id) VALUES (?, ?)",
+            (str(user_id).strip(), account_id),
+        )
+
+    def get_user_account_ids(self, user_id: str) -> List[str]:
+        rows = self._query("SELECT account_id FROM user_accounts WHERE user_id = ?", (str(user_id).strip(),))
+        return [r["account_id"] for r in rows]
+
+    def get_user_ids_sharing_accounts_with(self, user_id: str) -> List[str]:
+        uid = str(user_id).strip()
+        rows = self._query(
+            """
+            SELECT DISTINCT other.user_id FROM user_accounts AS mine
+            JOIN user_accounts AS other ON other.account_id = mine.account_id
+            WHERE mine.user_id = ? AND other.user_id != ?
+            """,
+            (uid, uid),
+        )
+        return [r["user_id"] for r in rows]
+
+    def get_account_ids_for_users(self, user_ids: List[str]) -> List[str]:
+        if not user_ids:
+            return []
+        uids = [str(u).strip() for u in user_ids]
+        rows = self._query(
+            f"SELECT account_id FROM user_accounts WHERE user_id IN ({_placeholders(uids)})", uids
+        )
+        return list(dict.fromkeys(r["account_id"] for r in rows))
+
+    def get_account_display_names(self, account_ids: List[str]) -> Dict[str, str]:
+        return {
+            row["id"]: (row.get("display_name") or row.get("stable_key") or "Cuenta")
+            for row in self.get_accounts(account_ids)
+        }
+
+    def get_accounts(self, account_ids: List[str]) -> List[Dict[str, Any]]:
+        if not account_ids:
+            return []
+        return self._query(
+            f"SELECT id, display_name, stable_key, source FROM accounts WHERE id IN ({_placeholders(account_ids)}) "
+            "ORDER BY display_name ASC",
+            account_ids,
+        )
+
+    def update_account_display_name(self, account_id: str, display_name: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE accounts SET display_name = ? WHERE id = ?", (display_name, account_id))
+            self._bump_in_transaction([account_id], {account_id: None})
+
+    def get_account_versions(self, account_ids: List[str]) -> Optional[Dict[str, int]]:
+        if not account_ids:
+            return None
+        rows = self._query(
+            f"SELECT id, data_version FROM accounts WHERE id IN ({_placeholders(account_ids)})", account_ids
+        )
+        return {r["id"]: int(r["data_version"] or 0) for r in rows}
+
+    def bump_account_versions(self, account_ids: List[str], touched: Optional[Touched] = None) -> None:
+        ids = [a for a in dict.fromkeys(account_ids) if a]
+        if not ids:
+            return
+        with self._lock, self.conn:
+            self._bump_in_transaction(ids, touched)
+
+    def _bump_in_transaction(self, ids: List[str], touched: Optional[Touched]) -> None:
+        """Incremento y registro sin commit: dentro del `with self.conn` de la escritura que lo provoca."""
+        bumped = self.conn.execute(
+            f"UPDATE accounts SET data_version = data_version + 1 WHERE id IN ({_placeholders(ids)}) "
+            "RETURNING id, data_version",
+            ids,
+        ).fetchall()
+        if touched is not None:
+            self.conn.executemany(
+                "INSERT INTO account_changes (account_id, data_version, from_date, to_date) VALUES (?, ?, ?, ?)",
+                [(r["id"], r["data_version"], *(touched.get(r["id"]) or (None, None))) for r in bumped],
+            )
+            self.conn.executemany(
+                "DELETE FROM account_changes WHERE account_id = ? AND data_version <= ?",
+                [(r["id"], r["data_version"] - ACCOUNT_CHANGES_RETENTION) for r in bumped],
+            )
+
+    def get_account_changes(self, after_versions: Dict[str, int]) -> Optional[List[Dict[str, Any]]]:
+        if not after_versions:
+            return []
+        ids = list(after_versions)
+        rows = self._query(
+            "SELECT account_id, data_version, from_date, to_date FROM account_changes "
+            f"WHERE account_id IN ({_placeholders(ids)}) AND data_version > ? ORDER BY data_version",
+            [*ids, min(after_versions.values())],
+        )
+        return [r for r in rows if r["data_version"] > after_versions[r["account_id"]]]
+
+    # ---------- Transacciones: lectura ----------
+
+    def fetch_transactions(
+        self,
+        account_ids: List[str],
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        limit: int = 10000,
+        filters: Optional[TransactionFilters] = None,
+    ) -> List[Dict[str, Any]]:
+        if not account_ids:
+            return []
+        where, params = self._transaction_filters(account_ids, from_date, to_date, filters=filters)
+        return self._query(
+            f"SELECT * FROM transactions WHERE {where} ORDER BY dt_date DESC LIMIT ?", [*params, limit]
+        )
+
+    def count_transactions(self, account_ids: List[str]) -> int:
+        if not account_ids:
+            return 0
+        rows = self._query(
+            f"SELECT COUNT(*) AS n FROM transactions WHERE account_id IN ({_placeholders(account_ids)})", account_ids
+        )
+        return int(rows[0]["n"])
+
+    def fetch_transactions_page(
+        self,
+        account_ids: List[str],
+        after_id: int = 0,
+        limit: int = 1000,
+        columns: str = "*",
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        filters: Optional[TransactionFilters] = None,
+    ) -> List[Dict[str, Any]]:
+        if not account_ids:
+            return []
+        where, params = self._transaction_filters(account_ids, from_date, to_date, filters=filters)
+        return self._query(
+            f"SELECT {columns} FROM transactions WHERE {where} AND id > ? ORDER BY id ASC LIMIT ?",
+            [*params, after_id, limit],
+        )
+
+    def fetch_latest_balances(self, account_ids: List[str], limit: int = 2000) -> List[Dict[str, Any]]:
+        if not account_ids:
+            return []
+        return self._query(
+            f"SELECT dt_date, saldo, cuenta, account_id FROM transactions WHERE account_id IN ({_placeholders(account_ids)}) "
+            "ORDER BY dt_date DESC LIMIT ?",
+            [*account_ids, limit],
+        )
+
+    def _search_index(self, account_id: str, version: int) -> InvertedIndex:
+        """Índice de la cuenta; se reconstruye cuando cambia su data_version (cualquier escritura la incrementa)."""
+        cached = self._search_indexes.get(account_id)
+        if cached and cached[0] == version:
+            return cached[1]
+        rows = self._query(
+            f"SELECT id, dt_date, {', '.join(SEARCH_COLUMNS)} FROM transactions WHERE account_id = ?", [account_id]
+        )
+        index = InvertedIndex(rows)
+        self._search_indexes[account_id] = (version, index)
+        return index
+
+    def search_transactions(
+        self, account_ids: List[str], query: str, limit: int = 50, offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        if not account_ids:
+            return []
+        versions = self.get_account_versions(account_ids) or {}
+        matches = []
+        for account_id in dict.fromkeys(account_ids):
+            matches.extend(self._search_index(account_id, versions.get(account_id, 0)).search(query))
+        page = heapq.nlargest(offset + limit, matches)[offset:]
+        if not page:
+            return []
+        ids = [row_id for _, _, row_id in page]
+        rows = {row["id"]: row for row in self._query(
+            f"SELECT * FROM transactions WHERE id IN ({_placeholders(ids)})", ids
+        )}
+        result = []
+        for score, _, row_id in page:
+            row = rows.get(row_id)
+            if row is not None:
+                row["rank"] = round(score, 4)
+                result.append(row)
+        return result
+
+    def get_existing_transaction_ids(self, transaction_ids: List[str]) -> Set[str]:
+        existing: Set[str] = set()
+        for chunk in chunks(list(transaction_ids)):
+            rows = self._query(
+                f"SELECT transaction_id FROM transactions WHERE transaction_id IN ({_placeholders(chunk)})", chunk
+            )
+            existing.update(r["transaction_id"] for r in rows)
+        return existing
+
+    def get_transaction_owners(self, row_ids: List[int]) -> Dict[int, str]:
+        owners: Dict[int, str] = {}
+        for chunk in chunks(list(row_ids)):
+            rows = self._query(f"SELECT id, account_id FROM transactions WHERE id IN ({_placeholders(chunk)})", chunk)
+            owners.update({r["id"]: r["account_id"] for r in rows})
+        return owners
+
+    # ---------- Transacciones: escritura ----------
+
+    def insert_transactions(self, transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if not transactions:
+            return {"received": 0, "inserted": 0, "duplicates": []}
+        ids = [t["transaction_id"] for t in transactions]
+        existing = self.get_existing_transaction_ids(ids)
+        new_ones = [t for t in transactions if t["transaction_id"] not in existing]
+        if new_ones:
+            cols = ", ".join(TRANSACTION_COLUMNS)
+            rows = [
+                tuple(_normalize_dt(t.get(c)) if c == "dt_date" else t.get(c) for c in TRANSACTION_COLUMNS)
+                for t in new_ones
+            ]
+            touched = touched_ranges({**t, "dt_date": _normalize_dt(t.get("dt_date"))} for t in new_ones)
+            # Filas y data_version en la misma transacción: un fallo entre ambas no deja ETags atrás
+            with self._lock, self.conn:
+                self.conn.executemany(
+                    f"INSERT INTO transactions ({cols}) VALUES ({_placeholders(list(TRANSACTION_COLUMNS))})", rows
+                )
+                self._bump_in_transaction(list(dict.fromkeys(t["account_id"] for t in new_ones)), touched)
+        return {
+            "received": len(transactions),
+            "inserted": len(new_ones),
+            "duplicates": list(existing),
+        }
+
+    def _transaction_filters(
+        self,
+        account_ids: List[str],
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        import_batch: Optional[str] = None,
+        filters: Optional[TransactionFilters] = None,
+    ) -> tuple[str, List[Any]]:
+        clauses = [f"account_id IN ({_placeholders(account_ids)})"]
+        params: List[Any] = list(account_ids)
+        if from_date:
+            clauses.append("dt_date >= ?")
+            params.append(from_date)
+        if to_date:
+            clauses.append("dt_date <= ?")
+            params.append(f"{to_date}T23:59:59.999999")
+        if import_batch:
+            clauses.append("import_batch = ?")
+            params.append(import_batch)
+        if filters:
+            if filters.categoria:
+                clauses.append("categoria = ?")
+                params.append(filters.categoria)
+            if filters.subcategoria:
+                clauses.append("subcategoria = ?")
+                params.append(filters.subcategoria)
+            if filters.min_importe is not None:
+                clauses.append("importe >= ?")
+                params.append(filters.min_importe)
+            if filters.max_importe is not None:
+                clauses.append("importe <= ?")
+                params.append(filters.max_importe)
+            if filters.tipo == "ingresos":
+                clauses.append("importe > 0")
+            elif filters.tipo == "gastos":
+                clauses.append("importe < 0")
+        return " AND ".join(clauses), params
+
+    def _scoped_write(
+        self,
+        statement: str,
+        statement_params: List[Any],
+        account_ids: List[str],
+        row_ids: Optional[List[int]],
+        from_date: Optional[str],
+        to_date: Optional[str],
+        import_batch: Optional[str],
+        touched: Callable[[List[Dict[str, Any]]], Optional[Touched]],
+        condition: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Escritura sobre la selección (una sentencia por bloque de ids) y el incremento de data_version de las
+        cuentas afectadas, todo en una transacción: si falla un bloque no queda aplicado ninguno."""
+        where, params = self._transaction_filters(account_ids, from_date, to_date, import_batch)
+        if condition:
+            where = f"{where} AND {condition}"
+        affected: List[Dict[str, Any]] = []
+        id_blocks = list(chunks(list(row_ids))) if row_ids is not None else [None]
+        with self._lock, self.conn:
+            for block in id_blocks:
+                block_where, block_params = where, params
+                if block is not None:
+                    block_where = f"id IN ({_placeholders(block)}) AND {where}"
+                    block_params = [*block, *params]
+                affected.extend(dict(row) for row in self.conn.execute(
+                    f"{statement} WHERE {block_where} RETURNING id, account_id, dt_date",
+                    [*statement_params, *block_params],
+                ).fetchall())
+            ids = list(dict.fromkeys(r["account_id"] for r in affected))
+            if ids:
+                self._bump_in_transaction(ids, touched(affected))
+        return [{"id": r["id"], "account_id": r["account_id"]} for r in affected]
+
+    def delete_transactions(
+        self,
+        account_ids: List[str],
+        row_ids: Optional[List[int]] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        import_batch: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        if not account_ids:
+            return []
+        return self._scoped_write(
+            "DELETE FROM transactions", [], account_ids, row_ids, from_date, to_date, import_batch,
+            touched=touched_ranges,
+        )
+
+    def update_transactions(
+        self,
+        account_ids: List[str],
+        data: Dict[str, Any],
+        row_ids: Optional[List[int]] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        import_batch: Optional[str] = None,
+        skip_manual: bool = False,
+    ) -> List[Dict[str, Any]]:
+        if not account_ids or not data:
+            return []
+        cols = [c for c in data if c in UPDATABLE_COLUMNS]
+        if not cols:
+            return []  # nada que asignar (como en Supabase)
+        values = [_normalize_dt(data[c]) if c == "dt_date" else data[c] for c in cols]
+        assignments = ", ".join(f"{c} = ?" for c in cols)
+        return self._scoped_write(
+            f"UPDATE transactions SET {assignments}", values, account_ids, row_ids, from_date, to_date, import_batch,
+            touched=lambda rows: update_touched(data, rows),
+            condition="NOT categoria_manual" if skip_manual else None,
+        )
+
+    # ---------- Reglas de categoría del usuario ----------
+
+    def get_category_rules(self, user_id: str) -> List[Dict[str, Any]]:
+        return self._query(
+            "SELECT * FROM category_rules WHERE user_id = ? ORDER BY priority ASC, id ASC", (str(user_id).strip(),)
+        )
+
+    def create_category_rule(self, rule: Dict[str, Any]) -> Dict[str, Any]:
+        cols = [c for c in RULE_COLUMNS if c in rule]
+        return self._write(
+            f"INSERT INTO category_rules ({', '.join(cols)}) VALUES ({_placeholders(cols)}) RETURNING *",
+            [rule[c] for c in cols],
+        )[0]
+
+    def update_category_rule(self, user_id: str, rule_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        cols = [c for c in data if c in RULE_COLUMNS and c != "user_id"]
+        if not cols:
+            rows = self._query("SELECT * FROM category_rules WHERE id = ? AND user_id = ?", (rule_id, user_id))
+            return rows[0] if rows else None
+        rows = self._write(
+            f"UPDATE category_rules SET {', '.join(f'{c} = ?' for c in cols)} WHERE id = ? AND user_id = ? RETURNING *",
+            [*(data[c] for c in cols), rule_id, user_id],
+        )
+        return rows[0] if rows else None
+
+    def delete_category_rule(self, user_id: str, rule_id: int) -> bool:
+        return bool(self._write("DELETE FROM category_rules WHERE id = ? AND user_id = ? RETURNING id", (rule_id, user_id)))
@@ -6,13 +6,27 @@ import uuid
 from typing import Optional, List, Dict, Any, Set
 from supabase import create_client, Client
 from app.core.config import settings
+# Los errores que se absorben aquí (devuelven vacío) también se cuentan en las métricas
+from app.core.metrics import STORAGE_ERRORS
+from app.api.services.storage.base import (
+    StorageBackend, Touched, TransactionFilters, chunks as _chunks,
+)
+
+
+# Columnas de transactions que se devuelven al leer (sin search_text/search_tsv, ver supabase_migration_search.sql)
+TRANSACTION_SELECT = (
+    "id, transaction_id, account_id, dt_date, importe, saldo, cuenta, descripcion, categoria, subcategoria, "
+    "categoria_manual, bizum_mensaje, referencia, import_batch, created_at"
+)
+# Columnas que acepta update_transactions (las que cambia bulk_update_transactions, ver supabase_migration_bulk_writes.sql)
+UPDATABLE_COLUMNS = ("dt_date", "importe", "saldo", "descripcion", "categoria", "subcategoria", "categoria_manual")
 
 
 def _uuid_str(val: str) -> str:
     return str(val).strip()
 
 
-class SupabaseService:
+class SupabaseService(StorageBackend):
     """Conexión a Supabase. Usa Service Role Key para bypass RLS."""
 
     def __init__(self):
@@ -29,10 +43,28 @@ class SupabaseService:
     def is_connected(self) -> bool:
         return self.supabase is not None
 
+    def warm_up(self) -> None:
+        """Consulta mínima para abrir el pool HTTP (TLS) de PostgREST antes de la primera petición real."""
+        if not self.supabase:
+            return
+        try:
+            self.supabase.table("accounts").select("id").limit(1).execute()
+        except Exception as e:
+            print(f"[Supabase] Error en warm-up: {e}")
+
     def uses_service_role(self) -> bool:
         """True si estamos usando service_role (necesario para inserts con RLS)."""
         return self._uses_service_role
 
+    def get_user_from_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Valida el JWT de Supabase usando la API (service_role)."""
+        if not self.supabase:
+            return None
+        user = self.supabase.auth.get_user(token).user
+        if not user:
+            return None
+        return {"sub": str(user.id), "email": user.email}
+
     def get_or_create_account(
         self, stable_key: str, source: str, display_name: str
     ) -> str:
@@ -97,6 +129,7 @@ class SupabaseService:
             )
             return [x["account_id"] for x in (r.data or [])]
         except Exception:
+            STORAGE_ERRORS.labels(method="get_user_account_ids").inc()
             return []
 
     def get_user_ids_sharing_accounts_with(self, user_id: str) -> List[str]:
@@ -117,6 +150,7 @@ class SupabaseService:
             other = [x["user_id"] for x in (r.data or []) if x.get("user_id") != uid]
             return list(dict.fromkeys(other))
         except Exception:
+            STORAGE_ERRORS.labels(method="get_user_ids_sharing_accounts_with").inc()
             return []
 
     def get_account_ids_for_users(self, user_ids: List[str]) -> List[str]:
@@ -133,6 +167,7 @@ class SupabaseService:
             )
             return list(dict.fromkeys([x["account_id"] for x in (r.data or [])]))
         except Exception:
+            STORAGE_ERRORS.labels(method="get_account_ids_for_users").inc()
             return []
 
     def get_account_display_names(self, account_ids: List[str]) -> Dict[str, str]:
@@ -151,8 +186,180 @@ class SupabaseService:
                 for row in (r.data or [])
             }
         except Exception:
+            STORAGE_ERRORS.labels(method="get_account_display_names").inc()
             return {}
 
+    def get_accounts(self, account_ids: List[str]) -> List[Dict[str, Any]]:
+        if not self.supabase or not account_ids:
+            return []
+        r = (
+            self.supabase.table("accounts")
+            .select("id, display_name, stable_key, source")
+            .in_("id", account_ids)
+            .order("display_name", desc=False)
+            .execute()
+        )
+        return list(r.data or [])
+
+    def get_account_versions(self, account_ids: List[str]) -> Optional[Dict[str, int]]:
+        """Mapeo account_id -> data_version. None si no se puede leer (entonces no se usan ETags)."""
+        if not self.supabase or not account_ids:
+            return None
+        try:
+            r = (
+                self.supabase.table("accounts")
+                .select("id, data_version")
+                .in_("id", account_ids)
+                .execute()
+            )
+            return {row["id"]: int(row.get("data_version") or 0) for row in (r.data or [])}
+        except Exception as e:
+            STORAGE_ERRORS.labels(method="get_account_versions").inc()
+            print(f"[Supabase] Error leyendo data_version: {e}")
+            return None
+
+    def bump_account_versions(self, account_ids: List[str], touched: Optional[Touched] = None) -> None:
+        """Incrementa data_version de las cuentas modificadas (invalida los ETag de sus GET).
+        Con touched, anota en account_changes el rango de fechas tocado con la versión nueva."""
+        ids = [a for a in dict.fromkeys(account_ids) if a]
+        if not self.supabase or not ids:
+            return
+        try:
+            r = self.supabase.rpc("bump_account_versions", {"p_account_ids": ids}).execute()
+            if touched is not None and r.data:
+                changes = []
+                for row in r.data:
+                    from_date, to_date = touched.get(row["id"]) or (None, None)
+                    changes.append({
+                        "account_id": row["id"],
+                        "data_version": row["data_version"],
+                        "from_date": from_date,
+                        "to_date": to_date,
+                    })
+                self.supabase.table("account_changes").insert(changes).execute()
+        except Exception as e:
+            # Sin el incremento los ETag se quedan atrás (304 con datos viejos): la escritura debe fallar
+            STORAGE_ERRORS.labels(method="bump_account_versions").inc()
+            print(f"[Supabase] Error incrementando data_version: {e}")
+            raise
+
+    def get_account_changes(self, after_versions: Dict[str, int]) -> Optional[List[Dict[str, Any]]]:
+        """Cambios de account_changes posteriores a la versión dada por cuenta. None si no se pueden leer."""
+        if not self.supabase:
+            return None
+        if not after_versions:
+            return []
+        try:
+            r = (
+                self.supabase.table("account_changes")
+                .select("account_id, data_version, from_date, to_date")
+                .in_("account_id", list(after_versions))
+                .gt("data_version", min(after_versions.values()))
+                .order("data_version")
+                .execute()
+            )
+            return [
+                row for row in (r.data or [])
+                if int(row["data_version"]) > after_versions.get(row["account_id"], 0)
+            ]
+        except Exception as e:
+            STORAGE_ERRORS.labels(method="get_account_changes").inc()
+            print(f"[Supabase] Error leyendo account_changes: {e}")
+            return None
+
+    def update_account_display_name(self, account_id: str, display_name: str) -> None:
+        """Renombrado y data_version en una sola transacción (RPC rename_account)."""
+        if not self.supabase:
+            raise RuntimeError("Supabase no inicializado")
+        self.supabase.rpc(
+            "rename_account", {"p_account_id": account_id, "p_display_name": display_name}
+        ).execute()
+
+    def fetch_transactions(
+        self,
+        account_ids: List[str],
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        limit: int = 10000,
+        filters: Optional[TransactionFilters] = None,
+    ) -> List[Dict[str, Any]]:
+        if not self.supabase or not account_ids:
+            return []
+        q = (
+            self.supabase.table("transactions")
+            .select(TRANSACTION_SELECT)
+            .in_("account_id", account_ids)
+        )
+        if from_date:
+            q = q.gte("dt_date", from_date)
+        if to_date:
+            # Incluir todo el día: hasta 23:59:59
+            q = q.lte("dt_date", f"{to_date}T23:59:59.999999")
+        q = self._apply_column_filters(q, filters)
+        r = q.order("dt_date", desc=True).limit(limit).execute()
+        return list(r.data or [])
+
+    def count_transactions(self, account_ids: List[str]) -> int:
+        if not self.supabase or not account_ids:
+            return 0
+        r = (
+            self.supabase.table("transactions")
+            .select("id", count="exact", head=True)
+            .in_("account_id", account_ids)
+            .execute()
+        )
+        return int(r.count or 0)
+
+    def fetch_transactions_page(
+        self,
+        account_ids: List[str],
+        after_id: int = 0,
+        limit: int = 1000,
+        columns: str = "*",
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        filters: Optional[TransactionFilters] = None,
+    ) -> List[Dict[str, Any]]:
+        if not self.supabase or not account_ids:
+            return []
+        q = (
+            self.supabase.table("transactions")
+            .select(TRANSACTION_SELECT if columns == "*" else columns)
+            .in_("account_id", account_ids)
+            .gt("id", after_id)
+        )
+        if from_date:
+            q = q.gte("dt_date", from_date)
+        if to_date:
+            q = q.lte("dt_date", f"{to_date}T23:59:59.999999")
+        q = self._apply_column_filters(q, filters)
+        r = q.order("id").limit(limit).execute()
+        return list(r.data or [])
+
+    def fetch_latest_balances(self, account_ids: List[str], limit: int = 2000) -> List[Dict[str, Any]]:
+        if not self.supabase or not account_ids:
+            return []
+        r = (
+            self.supabase.table("transactions")
+            .select("dt_date, saldo, cuenta, account_id")
+            .in_("account_id", account_ids)
+            .order("dt_date", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return list(r.data or [])
+
+    def search_transactions(
+        self, account_ids: List[str], query: str, limit: int = 50, offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        if not self.supabase or not account_ids:
+            return []
+        r = self.supabase.rpc(
+            "search_transactions",
+            {"p_account_ids": account_ids, "p_query": query, "p_limit": limit, "p_offset": offset},
+        ).execute()
+        return list(r.data or [])
+
     def get_existing_transaction_ids(self, transaction_ids: List[str]) -> Set[str]:
         if not self.supabase or not transaction_ids:
             return set()
@@ -165,6 +372,7 @@ class SupabaseService:
             )
             return {row["transaction_id"] for row in (r.data or [])}
         except Exception:
+            STORAGE_ERRORS.labels(method="get_existing_transaction_ids").inc()
             return set()
 
     def insert_transactions(
@@ -172,6 +380,7 @@ class SupabaseService:
     ) -> Dict[str, Any]:
         """
         Inserta transacciones. Devuelve {received, inserted, duplicates}.
+        Filas, data_version y account_changes en una sola transacción (RPC insert_transactions).
         """
         if not self.supabase:
             raise RuntimeError("Supabase no inicializado")
@@ -180,19 +389,178 @@ class SupabaseService:
         ids = [t["transaction_id"] for t in transactions]
         existing = self.get_existing_transaction_ids(ids)
         new_ones = [t for t in transactions if t["transaction_id"] not in existing]
+        inserted = 0
         if new_ones:
             try:
-                self.supabase.table("transactions").insert(new_ones).execute()
+                r = self.supabase.rpc("insert_transactions", {"p_rows": new_ones}).execute()
             except Exception as e:
                 print(f"[Supabase] Error insert: {e}")
                 if not self._uses_service_role:
                     print("[Supabase] HINT: Si ves 'permission denied' o RLS, configura SUPABASE_SERVICE_ROLE_KEY en Render")
                 raise
+            inserted = len(r.data or [])
         return {
             "received": len(transactions),
-            "inserted": len(new_ones),
+            "inserted": inserted,
             "duplicates": list(existing),
         }
 
+    def _apply_transaction_filters(
+        self,
+        q,
+        account_ids: List[str],
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        import_batch: Optional[str] = None,
+    ):
+        """Aplica el ámbito (cuentas) y los filtros de selección masiva a una query de transactions."""
+        q = q.in_("account_id", account_ids)
+        if from_date:
+            q = q.gte("dt_date", from_date)
+        if to_date:
+            q = q.lte("dt_date", f"{to_date}T23:59:59.999999")
+        if import_batch:
+            q = q.eq("import_batch", import_batch)
+        return q
+
+    @staticmethod
+    def _apply_column_filters(q, filters: Optional[TransactionFilters]):
+        """Filtros de columna de los listados (categoría, importe, ingresos/gastos) en la query de PostgREST."""
+        if not filters:
+            return q
+        if filters.categoria:
+            q = q.eq("categoria", filters.categoria)
+        if filters.subcategoria:
+            q = q.eq("subcategoria", filters.subcategoria)
+        if filters.min_importe is not None:
+            q = q.gte("importe", filters.min_importe)
+        if filters.max_importe is not None:
+            q = q.lte("importe", filters.max_importe)
+        if filters.tipo == "ingresos":
+            q = q.gt("importe", 0)
+        elif filters.tipo == "gastos":
+            q = q.lt("importe", 0)
+        return q
+
+    def get_transaction_owners(self, row_ids: List[int]) -> Dict[int, str]:
+        """Mapeo id de fila -> account_id para las filas que existen (una query por bloque de ids)."""
+        if not self.supabase or not row_ids:
+            return {}
+        owners: Dict[int, str] = {}
+        for chunk in _chunks(list(row_ids)):
+            r = (
+                self.supabase.table("transactions")
+                .select("id, account_id")
+                .in_("id", chunk)
+                .execute()
+            )
+            owners.update({row["id"]: row.get("account_id") for row in (r.data or [])})
+        return owners
+
+    @staticmethod
+    def _selection_params(
+        account_ids: List[str],
+        row_ids: Optional[List[int]],
+        from_date: Optional[str],
+        to_date: Optional[str],
+        import_batch: Optional[str],
+    ) -> Dict[str, Any]:
+        """Parámetros de selección de bulk_delete_transactions / bulk_update_transactions (mismo ámbito que
+        _apply_transaction_filters)."""
+        return {
+            "p_account_ids": account_ids,
+            "p_ids": list(row_ids) if row_ids is not None else None,
+            "p_from_date": from_date or None,
+            "p_to_date": f"{to_date}T23:59:59.999999" if to_date else None,
+            "p_import_batch": import_batch or None,
+        }
+
+    def delete_transactions(
+        self,
+        account_ids: List[str],
+        row_ids: Optional[List[int]] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        import_batch: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Borra transacciones limitadas a account_ids, por ids de fila o por filtro.
+        Una sola transacción en Postgres (RPC bulk_delete_transactions, que también incrementa data_version):
+        o se borra toda la selección o nada. Devuelve las filas borradas (id, account_id).
+        """
+        if not self.supabase:
+            raise RuntimeError("Supabase no inicializado")
+        if not account_ids or row_ids == []:
+            return []
+        params = self._selection_params(account_ids, row_ids, from_date, to_date, import_batch)
+        r = self.supabase.rpc("bulk_delete_transactions", params).execute()
+        return [{"id": row.get("id"), "account_id": row.get("account_id")} for row in (r.data or [])]
+
+    def update_transactions(
+        self,
+        account_ids: List[str],
+        data: Dict[str, Any],
+        row_ids: Optional[List[int]] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        import_batch: Optional[str] = None,
+        skip_manual: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Aplica los mismos cambios a todas las transacciones seleccionadas (limitadas a account_ids).
+        Una sola transacción en Postgres (RPC bulk_update_transactions). Devuelve las filas actualizadas (id, account_id).
+        skip_manual: la escritura excluye las filas con categoria_manual (no solo la lectura previa).
+        """
+        if not self.supabase:
+            raise RuntimeError("Supabase no inicializado")
+        changes = {c: v for c, v in data.items() if c in UPDATABLE_COLUMNS}
+        if not account_ids or not changes or row_ids == []:
+            return []
+        params = self._selection_params(account_ids, row_ids, from_date, to_date, import_batch)
+        r = self.supabase.rpc(
+            "bulk_update_transactions", {**params, "p_data": changes, "p_skip_manual": skip_manual}
+        ).execute()
+        return [{"id": row.get("id"), "account_id": row.get("account_id")} for row in (r.data or [])]
+
+    # ---------- Reglas de categoría del usuario ----------
+
+    def get_category_rules(self, user_id: str) -> List[Dict[str, Any]]:
+        if not self.supabase:
+            return []
+        try:
+            r = (
+                self.supabase.table("category_rules")
+                .select("*")
+                .eq("user_id", str(user_id).strip())
+                .order("priority")
+                .order("id")
+                .execute()
+            )
+            return list(r.data or [])
+        except Exception as e:
+            # Sin la migración (tabla inexistente) se categoriza solo con las reglas globales
+            STORAGE_ERRORS.labels(method="get_category_rules").inc()
+            print(f"[Supabase] Error leyendo category_rules: {e}")
+            return []
+
+    def create_category_rule(self, rule: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.supabase:
+            raise RuntimeError("Supabase no inicializado")
+        r = self.supabase.table("category_rules").insert(rule).execute()
+        return (r.data or [{}])[0]
 
-supabase_service = SupabaseService()
+    def update_category_rule(self, user_id: str, rule_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not self.supabase:
+            raise RuntimeError("Supabase no inicializado")
+        data = {k: v for k, v in data.items() if k != "user_id"}
+        if not data:
+            r = self.supabase.table("category_rules").select("*").eq("id", rule_id).eq("user_id", user_id).execute()
+        else:
+            r = self.supabase.table("category_rules").update(data).eq("id", rule_id).eq("user_id", user_id).execute()
+        return (r.data or [None])[0]
+
+    def delete_category_rule(self, user_id: str, rule_id: int) -> bool:
+        if not self.supabase:
+            raise RuntimeError("Supabase no inicializado")
+        r = self.supabase.table("category_rules").delete().eq("id", rule_id).eq("user_id", user_id).execute()
+        return bool(r.data)
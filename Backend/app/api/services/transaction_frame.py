@@ -0,0 +1,345 @@
+"""
+Transacciones en columnas NumPy para la analítica del servidor (transferencias internas, saldos, agregados).
+
+En lugar de decenas de miles de dicts con fechas en texto y float() en cada acceso, se construye una vez por
+petición un contenedor compacto:
+  - importe, saldo: float64 (saldo NaN si falta)
+  - ts: datetime64[s] con la fecha tal como viene (hora de pared, sin convertir zona; NaT si no se entiende)
+  - cuenta, account_id, categoria, subcategoria, descripcion, fecha en texto: códigos enteros sobre sus
+    valores distintos (subcategoria y descripcion solo con details=True)
+  - ids: transaction_id (o id) de cada fila
+~60 bytes por fila frente a ~1 KB de un dict de Supabase. `load` lo llena por páginas de storage sin
+tener nunca todo el histórico como list[dict].
+"""
+
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+PAGE_SIZE = 5000
+LOAD_COLUMNS = "id, account_id, dt_date, importe, saldo, cuenta, categoria"
+# load(details=True): para la analítica por comercio (pagos recurrentes); los agregados no las necesitan
+DETAIL_COLUMNS = LOAD_COLUMNS + ", subcategoria, descripcion"
+
+GRANULARITIES = ("day", "week", "month")
+ROLLUP_DIMENSIONS = ("account_id", "cuenta", "categoria", "day", "week", "month")
+
+
+def _importe(value: Any) -> float:
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _saldo(value: Any) -> float:
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _parse_ts(text: str) -> np.datetime64:
+    try:
+        return np.datetime64(datetime.fromisoformat(text).replace(tzinfo=None), "s")
+    except ValueError:
+        return np.datetime64("NaT", "s")
+
+
+def _parse_dates(dates: np.ndarray) -> np.ndarray:
+    """datetime64[s] de cada fecha distinta, sin zona (hora de pared). Camino rápido: parser ISO de NumPy
+    sobre YYYY-MM-DD[THH:MM:SS]; si algún texto no encaja, fecha a fecha con fromisoformat."""
+    try:
+        return np.array([d[:19] for d in dates], dtype="datetime64[s]")
+    except ValueError:
+        return np.array([_parse_ts(d) if d else np.datetime64("NaT", "s") for d in dates], dtype="datetime64[s]")
+
+
+class _Codes:
+    """Códigos enteros sobre los valores distintos de una columna, en orden de aparición."""
+
+    def __init__(self):
+        self.index: Dict[Any, int] = {}
+        self.codes = array("i")
+
+    def add(self, value: Any) -> None:
+        self.codes.append(self.index.setdefault(value, len(self.index)))
+
+    def arrays(self):
+        values = np.empty(len(self.index), dtype=object)
+        values[:] = list(self.index)
+        return values, np.frombuffer(self.codes, dtype=np.int32)
+
+
+class _Builder:
+    """Acumula filas en arrays compactos (array.array) sin guardar los dicts.
+    details=False: subcategoria y descripcion no se leen (quedan a None)."""
+
+    def __init__(self, details: bool = False):
+        self.details = details
+        self.ids: List[Any] = []
+        self.importe = array("d")
+        self.saldo = array("d")
+        self.dates = _Codes()
+        self.accounts = _Codes()
+        self.cuentas = _Codes()
+        self.categorias = _Codes()
+        self.subcategorias = _Codes()
+        self.descripciones = _Codes()
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for t in rows:
+            self.ids.append(t.get("transaction_id") or t.get("id") or str(t.get("id", "")))
+            self.importe.append(_importe(t.get("importe") if "importe" in t else t.get("amount")))
+            self.saldo.append(_saldo(t.get("saldo")))
+            self.dates.add(str(t.get("dt_date") or t.get("transaction_date") or ""))
+            self.accounts.add(t.get("account_id"))
+            self.cuentas.add(str(t.get("cuenta") or t.get("account_number") or "").strip())
+            self.categorias.add(t.get("categoria"))
+            if self.details:
+                self.subcategorias.add(t.get("subcategoria"))
+                self.descripciones.add(t.get("descripcion"))
+
+    def _detail(self, codes: _Codes):
+        if self.details:
+            return codes.arrays()
+        return np.array([None], dtype=object), np.zeros(len(self.ids), dtype=np.int32)
+
+    def build(self) -> "TransactionFrame":
+        ids = np.empty(len(self.ids), dtype=object)
+        ids[:] = self.ids
+        return TransactionFrame(
+            ids=ids,
+            importe=np.frombuffer(self.importe, dtype=np.float64),
+            saldo=np.frombuffer(self.saldo, dtype=np.float64),
+            dates=self.dates.arrays(),
+            accounts=self.accounts.arrays(),
+            cuentas=self.cuentas.arrays(),
+            categorias=self.categorias.arrays(),
+            subcategorias=self._detail(self.subcategorias),
+            descripciones=self._detail(self.descripciones),
+        )
+
+
+class TransactionFrame:
+    """Columnas de un conjunto de transacciones (ver docstring del módulo). Inmutable una vez construido."""
+
+    def __init__(self, ids, importe, saldo, dates, accounts, cuentas, categorias, subcategorias, descripciones):
+        self.ids = ids
+        self.importe = importe
+        self.saldo = saldo
+        self.dates, self.date_codes = dates
+        self._ts: Optional[np.ndarray] = None
+        self.accounts, self.account_codes = accounts
+        self.cuentas, self.cuenta_codes = cuentas
+        self.categorias, self.categoria_codes = categorias
+        self.subcategorias, self.subcategoria_codes = subcategorias
+        self.descripciones, self.descripcion_codes = descripciones
+
+    def __len__(self) -> int:
+        return len(self.importe)
+
+    @property
+    def ts(self) -> np.ndarray:
+        """datetime64[s] por fila; se calcula al primer uso (la detección de transferencias no lo necesita)."""
+        if self._ts is None:
+            self._ts = _parse_dates(self.dates)[self.date_codes]
+        return self._ts
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria de los arrays (sin contar los objetos de ids y de los valores distintos)."""
+        arrays = (self.ids, self.importe, self.saldo, self.date_codes, self.ts,
+                  self.account_codes, self.cuenta_codes, self.categoria_codes,
+                  self.subcategoria_codes, self.descripcion_codes)
+        return sum(a.nbytes for a in arrays)
+
+    # ---------- Construcción ----------
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]], details: bool = False) -> "TransactionFrame":
+        """Desde filas de Supabase/SQLite (acepta también las claves alternativas de detect_internal_transfer_ids)."""
+        builder = _Builder(details)
+        builder.extend(rows)
+        return builder.build()
+
+    @classmethod
+    def load(
+        cls,
+        account_ids: List[str],
+        page_size: int = PAGE_SIZE,
+        details: bool = False,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+    ) -> "TransactionFrame":
+        """Histórico de las cuentas (opcionalmente solo [from_date, to_date], YYYY-MM-DD), leído por páginas
+        (keyset por id) y solo con las columnas necesarias (details=True: también subcategoria y descripcion).
+        ids son los id de fila."""
+        from app.api.services.storage import storage_service
+
+        columns = DETAIL_COLUMNS if details else LOAD_COLUMNS
+        builder = _Builder(details)
+        after_id = 0
+        while account_ids:
+            page = storage_service.fetch_transactions_page(
+                account_ids, after_id=after_id, limit=page_size, columns=columns,
+                from_date=from_date, to_date=to_date,
+            )
+            if not page:
+                break
+            after_id = page[-1]["id"]
+            builder.extend(page)
+            if len(page) < page_size:
+                break
+        return builder.build()
+
+    # ---------- Filtros ----------
+
+    def between(self, from_date: Optional[str] = None, to_date: Optional[str] = None) -> np.ndarray:
+        """Máscara de filas con fecha en [from_date, to_date] (YYYY-MM-DD; to_date incluye el día completo)."""
+        mask = ~np.isnat(self.ts)
+        if from_date:
+            mask &= self.ts >= np.datetime64(from_date, "D")
+        if to_date:
+            mask &= self.ts < np.datetime64(to_date, "D") + np.timedelta64(1, "D")
+        return mask
+
+    # ---------- Transferencias internas ----------
+
+    def internal_transfer_mask(self) -> np.ndarray:
+        """
+        Filas que forman parte de un par de transferencia interna: misma fecha, mismo importe absoluto
+        (redondeado a céntimos), una negativa y otra positiva, cuentas distintas. Mismo emparejamiento que
+        detect_internal_transfer_ids: cada negativa, en orden, con la primera positiva libre de otra cuenta.
+        """
+        matched = np.zeros(len(self), dtype=bool)
+        empty_cuenta = self.cuentas == ""
+        empty_date = self.dates == ""
+        valid = ~empty_cuenta[self.cuenta_codes] & ~empty_date[self.date_codes] & (self.importe != 0)
+        rows = np.flatnonzero(valid)
+        if not len(rows):
+            return matched
+
+        # Importe absoluto a céntimos con round() de Python (no np.round), una vez por importe distinto
+        values, inverse = np.unique(self.importe[rows], return_inverse=True)
+        amount_codes = np.unique(np.array([abs(round(float(v), 2)) for v in values]), return_inverse=True)[1][inverse]
+        # Cada NaN es su propio grupo (en un dict, NaN != NaN)
+        nan = np.isnan(self.importe[rows])
+        amount_codes = np.where(nan, len(values) + np.arange(len(rows)), amount_codes)
+
+        group = self.date_codes[rows].astype(np.int64) * (int(amount_codes.max()) + 1) + amount_codes
+        order = np.argsort(group, kind="stable")  # dentro de cada grupo, orden original
+        rows, group = rows[order], group[order]
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        ends = np.r_[starts[1:], len(rows)]
+
+        sign = np.sign(self.importe[rows])
+        has_neg = np.maximum.reduceat(sign < 0, starts)
+        has_pos = np.maximum.reduceat(sign > 0, starts)
+        for start, end in zip(starts[has_neg & has_pos], ends[has_neg & has_pos]):
+            members = rows[start:end]
+            imp = self.importe[members]
+            negatives = members[imp < 0]
+            positives = members[imp > 0].tolist()
+            used = [False] * len(positives)
+            for neg in negatives:
+                c_neg = self.cuenta_codes[neg]
+                for i, pos in enumerate(positives):
+                    if not used[i] and self.cuenta_codes[pos] != c_neg:
+                        matched[neg] = matched[pos] = True
+                        used[i] = True
+                        break
+        return matched
+
+    def internal_transfer_ids(self) -> Set[Any]:
+        return set(self.ids[self.internal_transfer_mask()].tolist())
+
+    # ---------- Periodos ----------
+
+    def periods(self, granularity: str) -> np.ndarray:
+        """Inicio del periodo de cada fila (datetime64[D]): día, lunes de la semana o día 1 del mes."""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity debe ser uno de {GRANULARITIES}")
+        days = self.ts.astype("datetime64[D]")
+        if granularity == "day":
+            return days
+        if granularity == "week":
+            # 1970-01-01 fue jueves: +3 para que la semana empiece en lunes
+            weekday = (days.astype(np.int64) + 3) % 7
+            return days - weekday.astype("timedelta64[D]")
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+
+    @staticmethod
+    def period_label(start: np.datetime64, granularity: str) -> str:
+        text = str(start)
+        return text[:7] if granularity == "month" else text
+
+    # ---------- Saldos ----------
+
+    def balance_series(self, granularity: str = "day", mask: Optional[np.ndarray] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Saldo de cierre por cuenta y periodo: el saldo de la última transacción del periodo (por fecha; a igual
+        fecha, la última en el orden de entrada). Solo periodos con movimientos. {account_id: [{period, saldo}]}"""
+        rows = ~np.isnat(self.ts) & ~np.isnan(self.saldo)
+        if mask is not None:
+            rows &= mask
+        rows = np.flatnonzero(rows)
+        if not len(rows):
+            return {}
+        periods = self.periods(granularity)[rows]
+        accounts = self.account_codes[rows]
+        order = np.lexsort((rows, self.ts[rows], periods, accounts))
+        rows, periods, accounts = rows[order], periods[order], accounts[order]
+        last = np.r_[(accounts[1:] != accounts[:-1]) | (periods[1:] != periods[:-1]), True]
+
+        series: Dict[str, List[Dict[str, Any]]] = {}
+        for row, period, account in zip(rows[last], periods[last], accounts[last]):
+            series.setdefault(self.accounts[account], []).append(
+                {"period": self.period_label(period, granularity), "saldo": float(self.saldo[row])}
+            )
+        return series
+
+    # ---------- Agregados ----------
+
+    def _dimension(self, name: str):
+        """(códigos por fila, etiquetas) de una dimensión de agregación."""
+        if name == "account_id":
+            return self.account_codes, self.accounts
+        if name == "cuenta":
+            return self.cuenta_codes, self.cuentas
+        if name == "categoria":
+            return self.categoria_codes, self.categorias
+        starts, codes = np.unique(self.periods(name), return_inverse=True)
+        return codes, [None if np.isnat(s) else self.period_label(s, name) for s in starts]
+
+    def rollup(self, by: Sequence[str], mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Totales por combinación de dimensiones (ROLLUP_DIMENSIONS): ingresos, gastos (negativo), neto y nº de filas.
+        Ordenado por las dimensiones en el orden pedido (vacíos al final)."""
+        unknown = [d for d in by if d not in ROLLUP_DIMENSIONS]
+        if unknown or not by:
+            raise ValueError(f"Dimensiones válidas: {ROLLUP_DIMENSIONS}")
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+        if not len(rows):
+            return []
+        dimensions = [self._dimension(d) for d in by]
+        keys = np.stack([codes[rows] for codes, _ in dimensions], axis=1)
+        groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        importe = self.importe[rows]
+        ingresos = np.bincount(inverse, weights=np.where(importe > 0, importe, 0.0), minlength=len(groups))
+        gastos = np.bincount(inverse, weights=np.where(importe < 0, importe, 0.0), minlength=len(groups))
+        counts = np.bincount(inverse, minlength=len(groups))
+
+        result = []
+        for g, key in enumerate(groups):
+            item = {name: labels[code] for name, (_, labels), code in zip(by, dimensions, key)}
+            item.update(
+                ingresos=round(float(ingresos[g]), 2),
+                gastos=round(float(gastos[g]), 2),
+                neto=round(float(ingresos[g] + gastos[g]), 2),
+                count=int(counts[g]),
+            )
+            result.append(item)
+        result.sort(key=lambda item: [(item[d] is None, str(item[d])) for d in by])
+        return result
@@ -0,0 +1,149 @@
+"""
+Reglas de categoría de cada usuario (tabla category_rules), por encima de CATEGORY_RULES.
+Para una transacción de la cuenta A se evalúan, en este orden: las reglas del usuario para A, las reglas
+del usuario para todas sus cuentas y, si ninguna coincide, la categorización normal (decoder + reglas globales).
+Cada capa se compila una sola vez (get_matcher: caché por versión de reglas), así que da igual cuántos
+usuarios tengan reglas propias: cada subida solo paga una consulta y el matching vectorizado.
+"""
+
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+from app.api.services.pipe_extract_transactions.category_rules import (
+    RuleMatcher,
+    get_matcher,
+    rules_version,
+    upper_descriptions,
+)
+from app.api.services.storage import storage_service
+
+MAX_PATTERN_LENGTH = 200
+MAX_UNBOUNDED_REPEATS = 2  # *, + y {n,} por patrón
+
+# Subconjunto seguro de regex (sin backtracking exponencial): literales, clases, ., anclas, alternativas y
+# grupos sin captura. Un cuantificador solo se aplica a caracteres sueltos o secuencias de ellos.
+_CHAR_OPS = {sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN}
+_REPEAT_OPS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None)}
+
+
+def _check_items(items, in_repeat: bool) -> int:
+    """Recorre el árbol de sre_parse. Devuelve los cuantificadores sin límite; ValueError si algo no está permitido."""
+    unbounded = 0
+    for op, av in items:
+        if op in _CHAR_OPS or op is sre_parse.AT:
+            continue
+        if op is sre_parse.SUBPATTERN:
+            group, add_flags, del_flags, body = av
+            if group is not None:
+                raise ValueError("Los grupos de captura no están permitidos: usa (?:...)")
+            if add_flags or del_flags:
+                raise ValueError("Los flags en línea no están permitidos (la descripción ya va en mayúsculas)")
+            unbounded += _check_items(body, in_repeat)
+        elif op in _REPEAT_OPS:
+            low, high, body = av
+            if in_repeat:
+                raise ValueError("Los cuantificadores anidados no están permitidos")
+            unbounded += (high == sre_parse.MAXREPEAT) + _check_items(body, True)
+        elif op is sre_parse.BRANCH:
+            if in_repeat:
+                raise ValueError("Las alternativas dentro de un cuantificador no están permitidas")
+            unbounded += sum(_check_items(branch, in_repeat) for branch in av[1])
+        elif op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            raise ValueError("Las referencias a grupos no están permitidas")
+        else:
+            raise ValueError("Solo se admiten literales, clases, ., anclas, | y cuantificadores simples")
+    return unbounded
+
+
+def validate_pattern(pattern: str) -> str:
+    """Patrón limpio, compilable y dentro del subconjunto seguro (regex sobre la descripción en mayúsculas).
+    ValueError si no lo es."""
+    pattern = (pattern or "").strip()
+    if not pattern:
+        raise ValueError("El patrón no puede estar vacío")
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        raise ValueError(f"El patrón no puede superar {MAX_PATTERN_LENGTH} caracteres")
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error as e:
+        raise ValueError(f"Patrón no válido: {e}")
+    if parsed.state.flags & ~re.UNICODE:
+        raise ValueError("Los flags en línea no están permitidos (la descripción ya va en mayúsculas)")
+    if _check_items(parsed, False) > MAX_UNBOUNDED_REPEATS:
+        raise ValueError(f"Como máximo {MAX_UNBOUNDED_REPEATS} cuantificadores sin límite (*, +, {{n,}})")
+    return pattern
+
+
+def _is_safe(pattern: str) -> bool:
+    try:
+        validate_pattern(pattern)
+    except ValueError:
+        return False
+    return True
+
+
+class UserRules:
+    """Reglas de un usuario agrupadas en capas por cuenta."""
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = rules
+        common: List[Tuple[str, str, Optional[str]]] = []
+        by_account: Dict[str, List[Tuple[str, str, Optional[str]]]] = defaultdict(list)
+        for rule in rules:
+            if not _is_safe(rule["pattern"]):
+                # Reglas guardadas antes de validar el subconjunto seguro: no se evalúan
+                print(f"[WARN] regla {rule.get('id')} ignorada: patrón fuera del subconjunto permitido")
+                continue
+            entry = (rule["pattern"], rule["categoria"], rule.get("subcategoria"))
+            if rule.get("account_id"):
+                by_account[rule["account_id"]].append(entry)
+            else:
+                common.append(entry)
+        self._common = common
+        self._layers = {account_id: entries + common for account_id, entries in by_account.items()}
+
+    @classmethod
+    def load(cls, user_id: str) -> "UserRules":
+        return cls(storage_service.get_category_rules(user_id))
+
+    @property
+    def version(self) -> str:
+        return rules_version(
+            [(r.get("account_id"), r["pattern"], r["categoria"], r.get("subcategoria")) for r in self.rules]
+        )
+
+    def matcher(self, account_id: Optional[str]) -> Optional[RuleMatcher]:
+        layer = self._layers.get(account_id, self._common) if account_id else self._common
+        return get_matcher(layer) if layer else None
+
+    def match(self, account_id: Optional[str], descriptions: pd.Series) -> Optional[Tuple[pd.Series, pd.Series]]:
+        """(categoria, subcategoria) de la capa de la cuenta; categoria None donde no coincide. None si no hay reglas."""
+        matcher = self.matcher(account_id)
+        if matcher is None:
+            return None
+        _, upper = upper_descriptions(descriptions)
+        return matcher.match(upper)
+
+    def apply(self, records: List[Dict[str, Any]], account_id: Optional[str]) -> int:
+        """Aplica la capa de la cuenta a filas ya parseadas (claves descripcion/categoria/subcategoria).
+        Devuelve cuántas han coincidido con alguna regla del usuario."""
+        if not records:
+            return 0
+        matched = self.match(account_id, pd.Series([r.get("descripcion") for r in records], dtype=object))
+        if matched is None:
+            return 0
+        applied = 0
+        for record, categoria, subcategoria in zip(records, *matched):
+            if categoria is not None:
+                record["categoria"] = categoria
+                record["subcategoria"] = subcategoria
+                applied += 1
+        return applied
@@ -0,0 +1,4 @@
+"""
+CLI Package
+Herramientas de línea de comandos (sin HTTP ni auth): python -m app.cli.<herramienta>
+"""
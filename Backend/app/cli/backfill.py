@@ -0,0 +1,224 @@
+"""
+Backfill offline: importa todos los extractos de un directorio (recursivo, también .zip) para un usuario,
+sin pasar por HTTP ni auth. Usa el backend de Settings.STORAGE_BACKEND (en Supabase, con service_role).
+
+  - Parseo en un pool de procesos (mismo main_file_parser y decoders que la subida).
+  - Cuentas resueltas una vez por stable_key; reglas propias del usuario; inserción por bloques (--chunk-size).
+  - Checkpoint JSON: cada fichero terminado queda anotado (ruta + sha256), así que relanzar el mismo
+    comando continúa donde se quedó. Un fichero modificado se vuelve a importar (los duplicados se descartan).
+  - Al final imprime filas/s y MB/s.
+
+Uso (desde Backend/):
+    python -m app.cli.backfill /ruta/extractos --user-id <uuid>
+    python -m app.cli.backfill /ruta/extractos --user-id <uuid> --processes 4 --chunk-size 500 --dry-run
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.api.services.ingest import ALLOWED_EXTENSIONS, INSERT_CHUNK_SIZE, IngestError, expand_batch, parse_statement
+from app.api.services.storage import storage_service
+from app.api.services.user_rules import UserRules
+
+CHECKPOINT_NAME = ".backfill_checkpoint.json"
+
+
+def find_statements(root: Path) -> List[Path]:
+    extensions = ALLOWED_EXTENSIONS | {".zip"}
+    return sorted(
+        p for p in root.rglob("*")
+        if p.is_file() and p.suffix.lower() in extensions and not p.name.startswith(".")
+    )
+
+
+class Checkpoint:
+    """Ficheros ya importados: {ruta relativa: {sha256, rows, inserted, duplicates, done_at}}. Escritura atómica."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            self.files = json.loads(path.read_text(encoding="utf-8")).get("files", {})
+
+    def is_done(self, rel: str, digest: str) -> bool:
+        entry = self.files.get(rel)
+        return entry is not None and entry.get("sha256") == digest
+
+    def mark_done(self, rel: str, digest: str, **stats: Any) -> None:
+        self.files[rel] = {"sha256": digest, **stats, "done_at": datetime.now().isoformat(timespec="seconds")}
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"files": self.files}, indent=2, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+def _parse_file(rel: str, data: bytes) -> List[Dict[str, Any]]:
+    """Worker: un fichero (o cada extracto de un .zip) -> resultados de parse_statement."""
+    if rel.lower().endswith(".zip"):
+        try:
+            # Sin los límites de /upload/batch: un histórico en .zip puede tener cientos de extractos
+            entries = expand_batch([(rel, data)], limits=False)
+        except IngestError as e:
+            return [{"filename": rel, "error": e.detail}]
+        return [parse_statement(name, content) for name, content in entries]
+    return [parse_statement(rel, data)]
+
+
+def _pending(root: Path, checkpoint: Checkpoint, stats: Dict[str, Any]) -> Iterator[Tuple[str, str, bytes]]:
+    for path in find_statements(root):
+        rel = path.relative_to(root).as_posix()
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        if checkpoint.is_done(rel, digest):
+            stats["skipped"] += 1
+            continue
+        yield rel, digest, data
+
+
+class Backfill:
+    def __init__(self, user_id: str, chunk_size: int, dry_run: bool):
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.import_batch = str(uuid.uuid4())
+        self.accounts: Dict[str, str] = {}
+        self.user_rules = None if dry_run else UserRules.load(user_id)
+
+    def account_id(self, parsed: Dict[str, Any]) -> str:
+        key = parsed["account_identifier"]
+        if key not in self.accounts:
+            if self.dry_run:
+                self.accounts[key] = f"dry-run:{key}"
+            else:
+                self.accounts[key] = storage_service.get_or_create_account(
+                    stable_key=key,
+                    source=parsed["source_type"].lower(),
+                    display_name=parsed["display_name"],
+                )
+                storage_service.link_user_account(user_id=self.user_id, account_id=self.accounts[key])
+        return self.accounts[key]
+
+    def insert(self, parsed: Dict[str, Any]) -> Tuple[int, int]:
+        """Inserta un extracto parseado por bloques. Devuelve (insertadas, duplicadas)."""
+        account_id = self.account_id(parsed)
+        records = parsed["records"]
+        if self.user_rules is not None:
+            self.user_rules.apply(records, account_id)
+        for t in records:
+            t["account_id"] = account_id
+            t["import_batch"] = self.import_batch
+        if self.dry_run:
+            return 0, 0
+        inserted = duplicates = 0
+        for start in range(0, len(records), self.chunk_size):
+            result = storage_service.insert_transactions(records[start:start + self.chunk_size])
+            inserted += result["inserted"]
+            duplicates += len(result["duplicates"])
+        return inserted, duplicates
+
+
+def run(args: argparse.Namespace) -> int:
+    root = Path(args.directory).resolve()
+    if not root.is_dir():
+        print(f"[ERROR] no es un directorio: {root}")
+        return 2
+    if not args.dry_run:
+        if not storage_service.is_connected():
+            print("[ERROR] backend de persistencia no conectado")
+            return 2
+        if not storage_service.uses_service_role():
+            print("[WARN] sin service_role: las inserciones pueden fallar por RLS")
+
+    checkpoint = Checkpoint(Path(args.checkpoint) if args.checkpoint else root / CHECKPOINT_NAME)
+    backfill = Backfill(args.user_id, args.chunk_size, args.dry_run)
+    stats: Dict[str, Any] = {"files": 0, "skipped": 0, "failed": [], "rows": 0, "inserted": 0, "duplicates": 0, "bytes": 0}
+    processes = args.processes or (os.cpu_count() or 1)
+    print(f"Backfill {root} -> usuario {args.user_id} (import_batch {backfill.import_batch}, {processes} procesos)")
+
+    started = time.perf_counter()
+    pending = _pending(root, checkpoint, stats)
+    in_flight: Dict[Any, Tuple[str, str, int]] = {}
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as pool:
+
+        def fill() -> None:
+            # Como mucho 2 ficheros por proceso en vuelo: acota la memoria con directorios grandes
+            while len(in_flight) < processes * 2:
+                item = next(pending, None)
+                if item is None:
+                    return
+                rel, digest, data = item
+                in_flight[pool.submit(_parse_file, rel, data)] = (rel, digest, len(data))
+
+        fill()
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                rel, digest, size = in_flight.pop(future)
+                rows = inserted = duplicates = 0
+                errors = []
+                for parsed in future.result():
+                    if "error" in parsed:
+                        name = parsed["filename"]
+                        errors.append(parsed["error"] if name == rel else f"{name}: {parsed['error']}")
+                        continue
+                    rows += len(parsed["records"])
+                    ins, dup = backfill.insert(parsed)
+                    inserted += ins
+                    duplicates += dup
+                stats["files"] += 1
+                stats["bytes"] += size
+                stats["rows"] += rows
+                stats["inserted"] += inserted
+                stats["duplicates"] += duplicates
+                if errors:
+                    stats["failed"].extend(errors)
+                    print(f"  ✗ {rel}: {'; '.join(errors)}")
+                else:
+                    if not args.dry_run:
+                        checkpoint.mark_done(rel, digest, rows=rows, inserted=inserted, duplicates=duplicates)
+                    print(f"  ✓ {rel}: {rows} filas, {inserted} insertadas, {duplicates} duplicadas")
+            fill()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(
+        f"\nFicheros: {stats['files']} procesados, {stats['skipped']} ya en checkpoint, {len(stats['failed'])} con error\n"
+        f"Filas: {stats['rows']} leídas, {stats['inserted']} insertadas, {stats['duplicates']} duplicadas\n"
+        f"Cuentas: {len(backfill.accounts)}  |  {elapsed:.1f}s  |  "
+        f"{stats['rows'] / elapsed:,.0f} filas/s  |  {stats['bytes'] / 2**20 / elapsed:.2f} MB/s"
+    )
+    return 1 if stats["failed"] else 0
+
+
+def _chunk_size(value: str) -> int:
+    """--chunk-size entre 1 e INSERT_CHUNK_SIZE: por encima, el in_() de get_existing_transaction_ids no cabe en la URL."""
+    size = int(value)
+    if not 1 <= size <= INSERT_CHUNK_SIZE:
+        raise argparse.ArgumentTypeError(f"debe estar entre 1 y {INSERT_CHUNK_SIZE}")
+    return size
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directorio con extractos (.xlsx, .xls, .csv, .zip)")
+    parser.add_argument("--user-id", required=True, help="Usuario al que se vinculan las cuentas")
+    parser.add_argument("--processes", type=int, default=0, help="Procesos de parseo (0 = nº de CPUs)")
+    parser.add_argument(
+        "--chunk-size", type=_chunk_size, default=INSERT_CHUNK_SIZE, help=f"Filas por insert (máximo {INSERT_CHUNK_SIZE})"
+    )
+    parser.add_argument("--checkpoint", default=None, help=f"Fichero de checkpoint (por defecto <directorio>/{CHECKPOINT_NAME})")
+    parser.add_argument("--dry-run", action="store_true", help="Solo parsear: ni cuentas, ni inserts, ni checkpoint")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Carga reglas de categoría desde un YAML en las reglas propias de un usuario (tabla category_rules),
+sin pasar por HTTP ni auth. Usa el backend de Settings.STORAGE_BACKEND (en Supabase, con service_role).
+
+  - Mismo formato que POST /rules: pattern, categoria, subcategoria, account_id (opcional), priority.
+  - Cada patrón se valida igual que en la API (validate_pattern).
+  - Idempotente: las reglas con el mismo (account_id, pattern) que ya tenga el usuario se omiten.
+  - Para aplicarlas al histórico: POST /GET/transactions/recategorize?scope=all.
+
+Uso (desde Backend/):
+    python -m app.cli.import_rules config/household_rules.yaml --user-id <uuid>
+    python -m app.cli.import_rules config/household_rules.yaml --user-id <uuid> --dry-run
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from app.api.services.storage import storage_service
+from app.api.services.user_rules import validate_pattern
+
+
+def load_rules(path: Path) -> List[Dict[str, Any]]:
+    """Reglas del YAML normalizadas y validadas (ValueError con la posición de la que no lo es)."""
+    data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    rules = []
+    for i, raw in enumerate(data.get("rules") or [], start=1):
+        try:
+            categoria = str(raw.get("categoria") or "").strip()
+            if not categoria or len(categoria) > 50:
+                raise ValueError("categoria es obligatoria (máx. 50 caracteres)")
+            rules.append({
+                "pattern": validate_pattern(str(raw.get("pattern") or "")),
+                "categoria": categoria,
+                "subcategoria": (str(raw.get("subcategoria") or "").strip()[:100] or None),
+                "account_id": raw.get("account_id") or None,
+                "priority": int(raw.get("priority") or 0),
+            })
+        except (AttributeError, TypeError, ValueError) as e:
+            raise ValueError(f"Regla {i}: {e}")
+    return rules
+
+
+def run(args: argparse.Namespace) -> int:
+    try:
+        rules = load_rules(Path(args.file))
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"[ERROR] import_rules: {e}")
+        return 1
+    if not storage_service.is_connected():
+        print("[ERROR] import_rules: servicio de base de datos no disponible")
+        return 1
+
+    own_accounts = set(storage_service.get_user_account_ids(args.user_id))
+    existing = {(r.get("account_id"), r["pattern"]) for r in storage_service.get_category_rules(args.user_id)}
+    created = skipped = 0
+    for rule in rules:
+        if rule["account_id"] and rule["account_id"] not in own_accounts:
+            print(f"[ERROR] import_rules: la cuenta {rule['account_id']} no es del usuario ({rule['pattern']})")
+            return 1
+        if (rule["account_id"], rule["pattern"]) in existing:
+            skipped += 1
+            continue
+        if not args.dry_run:
+            storage_service.create_category_rule({**rule, "user_id": args.user_id})
+        existing.add((rule["account_id"], rule["pattern"]))
+        created += 1
+    suffix = " (dry-run)" if args.dry_run else ""
+    print(f"Reglas: {created} creadas, {skipped} ya existían{suffix}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="YAML con la lista `rules`")
+    parser.add_argument("--user-id", required=True, help="Usuario al que se añaden las reglas")
+    parser.add_argument("--dry-run", action="store_true", help="Solo validar y contar, sin crear nada")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
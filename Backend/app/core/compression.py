@@ -0,0 +1,172 @@
+"""
+Compresión de respuestas negociada por Accept-Encoding (br > gzip) con umbral de tamaño.
+Como GZipMiddleware de Starlette pero con Brotli si el paquete está instalado.
+Los formatos que ya van comprimidos (XLSX es un zip, Parquet usa zstd) salen tal cual.
+"""
+
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # Brotli es opcional: sin él solo se ofrece gzip
+    brotli = None
+
+# Media types ya comprimidos: volver a comprimirlos gasta CPU sin reducir el tamaño
+COMPRESSED_MEDIA_TYPES = frozenset({
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.apache.parquet",
+    "application/zip",
+    "application/gzip",
+})
+
+
+def _accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """Parsea Accept-Encoding -> {codificación: q}."""
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class _Encoder:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        """Vacía lo pendiente sin cerrar el stream (respuestas en streaming)."""
+        if self.encoding == "br":
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            encoding = choose_encoding(Headers(scope=scope).get("Accept-Encoding", ""))
+            if encoding:
+                responder = _CompressionResponder(
+                    self.app, self.minimum_size, _Encoder(encoding, self.gzip_level, self.brotli_quality)
+                )
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, minimum_size: int, encoder: _Encoder) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoder = encoder
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _set_encoding_headers(self) -> MutableHeaders:
+        headers = MutableHeaders(raw=self.initial_message["headers"])
+        headers["Content-Encoding"] = self.encoder.encoding
+        headers.add_vary_header("Accept-Encoding")
+        # El ETag se calcula sobre el JSON sin comprimir: pasa a débil (como hace nginx)
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        return headers
+
+    async def send_compressed(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # No se envía hasta saber si se comprime (cambian las cabeceras)
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+            self.passthrough = "content-encoding" in headers or media_type in COMPRESSED_MEDIA_TYPES
+        elif message_type == "http.response.body" and self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+        elif message_type == "http.response.body" and not self.started:
+            self.started = True
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if len(body) < self.minimum_size and not more_body:
+                # Respuestas pequeñas (y 304 sin cuerpo) salen tal cual
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+            elif not more_body:
+                body = self.encoder.compress(body) + self.encoder.finish()
+                headers = self._set_encoding_headers()
+                headers["Content-Length"] = str(len(body))
+                message["body"] = body
+                await self.send(self.initial_message)
+                await self.send(message)
+            else:
+                # Primer trozo de una respuesta en streaming
+                headers = self._set_encoding_headers()
+                del headers["Content-Length"]
+                message["body"] = self.encoder.compress(body) + self.encoder.flush()
+                await self.send(self.initial_message)
+                await self.send(message)
+        elif message_type == "http.response.body":
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            chunk = self.encoder.compress(body)
+            chunk += self.encoder.flush() if more_body else self.encoder.finish()
+            message["body"] = chunk
+            await self.send(message)
@@ -46,6 +46,13 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("SUPABASE_SERVICE_ROLE_KEY", "SUPABASE_SERVICE_KEY"),
     )
     
+    # Backend de persistencia: "supabase" (hospedado) | "sqlite" (local, sin red)
+    STORAGE_BACKEND: str = Field(default="supabase", description="supabase | sqlite")
+    SQLITE_PATH: str = Field(default="banka_local.db", description="Fichero SQLite si STORAGE_BACKEND=sqlite")
+    # SQLite no valida tokens: el Bearer token se toma como user_id. Solo desarrollo; sin esto (o en producción)
+    # la API no arranca con STORAGE_BACKEND=sqlite
+    SQLITE_DEV_AUTH: bool = Field(default=False, description="Solo desarrollo: Bearer token = user_id con sqlite")
+    
     # OpenAI Configuration
     OPENAI_API_KEY: str = ""
     
@@ -59,6 +66,37 @@ class Settings(BaseSettings):
     APP_URL: str = Field(default="https://bankaapptracker.onrender.com", description="URL pública del backend")
     KEEP_ALIVE_INTERVAL_SECONDS: int = Field(default=720, description="Intervalo en segundos entre pings keep-alive (default 12 min)")
 
+    # Jobs en segundo plano (subidas con ?mode=job): hilos, máximo en cola y terminados que se recuerdan
+    JOB_WORKERS: int = 2
+    JOB_MAX_PENDING: int = Field(default=20, description="Jobs en cola/ejecución admitidos; por encima se responde 503")
+    JOB_RETENTION: int = Field(default=200, description="Jobs terminados que se conservan para GET /jobs/{id}")
+
+    # Subida por lotes (/upload/batch): procesos de parseo (-1 = nº de CPUs, 0 = en el hilo) y límites
+    PARSE_PROCESSES: int = Field(default=-1, description="Procesos para parsear lotes; -1 = nº de CPUs, 0 = sin procesos")
+    BATCH_MAX_FILES: int = 50
+    BATCH_MAX_BYTES: int = Field(default=100 * 1024 * 1024, description="Tamaño máximo del lote (descomprimido)")
+
+    # Prewarm tras el arranque (imports del pipeline, reglas, accounts.yaml, pool HTTP de Supabase)
+    PREWARM_ENABLED: bool = True
+    PREWARM_DELAY_SECONDS: float = Field(default=0.5, description="Espera antes del prewarm para que el servidor haga bind primero")
+
+    # Compresión de respuestas (br si está instalado brotli, si no gzip). Por debajo del umbral no se comprime
+    COMPRESSION_MINIMUM_SIZE: int = Field(default=1024, description="Bytes mínimos para comprimir una respuesta")
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 4
+
+    # Trazas por petición: cabecera Server-Timing y log del desglose de las peticiones lentas (0 = no loguear)
+    SERVER_TIMING_ENABLED: bool = True
+    SLOW_REQUEST_MS: int = Field(default=1000, description="Umbral en ms para loguear el desglose de una petición")
+
+    # Administración (ej. ADMIN_USER_IDS=["<uuid>"]): endpoints /admin
+    ADMIN_USER_IDS: List[str] = []
+
+    # Profiler por muestreo bajo demanda (/admin/profile)
+    PROFILE_DIR: str = Field(default="profiles", description="Carpeta de los perfiles .collapsed")
+    PROFILE_MAX_FILES: int = Field(default=50, description="Perfiles que se conservan (se borran los más antiguos)")
+    PROFILE_INTERVAL_MS: int = Field(default=5, description="Intervalo de muestreo")
+
 
 # Global settings instance
 settings = Settings()
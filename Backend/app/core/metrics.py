@@ -0,0 +1,108 @@
+"""
+Métricas Prometheus (expuestas en GET /metrics).
+  - banka_http_request_seconds: latencia por ruta (plantilla, no la URL concreta), método y status.
+  - banka_pipeline_stage_seconds: etapas de main_file_parser por banco (decode = decoder del banco).
+  - banka_storage_call_seconds / _rows / _errors_total: cada llamada al backend de persistencia.
+  - banka_auth_seconds: validación del Bearer token en get_current_user.
+  - banka_cache_requests_total: aciertos/fallos de las cachés (ETag -> 304, ...).
+  - banka_uploads_in_flight: subidas en curso (síncronas o en job).
+  - banka_jobs_pending: jobs en cola o ejecutándose.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Latencias de red/BD: de 5 ms a 30 s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "banka_http_request_seconds", "Latencia de las peticiones HTTP",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    "banka_pipeline_stage_seconds", "Duración de cada etapa del pipeline de ingesta",
+    ["stage", "source"], buckets=LATENCY_BUCKETS,
+)
+STORAGE_CALL_SECONDS = Histogram(
+    "banka_storage_call_seconds", "Latencia de las llamadas al backend de persistencia",
+    ["method"], buckets=LATENCY_BUCKETS,
+)
+STORAGE_ROWS = Histogram(
+    "banka_storage_rows", "Filas devueltas/escritas por llamada al backend de persistencia",
+    ["method"], buckets=ROW_BUCKETS,
+)
+STORAGE_ERRORS = Counter(
+    "banka_storage_errors_total", "Errores en llamadas al backend de persistencia", ["method"],
+)
+AUTH_SECONDS = Histogram(
+    "banka_auth_seconds", "Validación del Bearer token", ["outcome"], buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "banka_cache_requests_total", "Consultas a cachés por resultado", ["cache", "result"],
+)
+UPLOADS_IN_FLIGHT = Gauge("banka_uploads_in_flight", "Subidas de extractos en curso")
+JOBS_PENDING = Gauge("banka_jobs_pending", "Jobs en cola o ejecutándose")
+
+
+@contextmanager
+def observe(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """Registra en el histograma la duración del bloque (también si lanza)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - t0)
+
+
+def cache_result(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def metrics_response(_request: Request) -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def _route_template(scope: Scope) -> str:
+    """Plantilla de la ruta (/GET/transactions/{row_id}) para no crear una serie por id."""
+    app = scope.get("app")
+    for route in getattr(app, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "") or "desconocida"
+    return "desconocida"
+
+
+class MetricsMiddleware:
+    """Mide la latencia total de cada petición HTTP (hasta el último byte del body)."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(
+                method=scope["method"], route=_route_template(scope), status=str(status),
+            ).observe(time.perf_counter() - t0)
@@ -0,0 +1,80 @@
+"""
+Prewarm en segundo plano tras el arranque.
+La app hace bind y responde /health sin importar pandas/openpyxl ni crear el cliente de Supabase;
+después, en un hilo, se cargan esas dependencias y se calientan las cachés para que la primera
+subida/consulta real no pague el arranque en frío. Cada paso es independiente: si uno falla se
+loguea y se sigue con el resto (el código de los endpoints vuelve a hacerlo bajo demanda).
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def _import_pipeline() -> None:
+    import openpyxl  # noqa: F401  (pandas lo importa en el primer read_excel)
+    import app.api.services.pipe_extract_transactions.main  # noqa: F401
+
+
+def _compile_category_rules() -> None:
+    from app.api.services.pipe_extract_transactions.category_rules import precompile_rules
+    precompile_rules()
+
+
+def _load_accounts_yaml() -> None:
+    from app.api.services.account_config import reload_config
+    reload_config()
+
+
+def _open_storage() -> None:
+    from app.api.services.storage import get_storage_service
+    get_storage_service().warm_up()
+
+
+def _prime_parsers() -> None:
+    """Un CSV mínimo por read_csv y un Excel mínimo por read_excel (inicializan los motores de pandas)."""
+    from io import BytesIO
+    from openpyxl import Workbook
+    from app.api.services.pipe_extract_transactions.main import read_statement
+
+    read_statement(b"a,b\n1,2\n", is_csv=True)
+    wb = Workbook()
+    wb.active.append(["a", "b"])
+    buf = BytesIO()
+    wb.save(buf)
+    read_statement(buf.getvalue())
+
+
+# Orden: lo que más tarda y más se usa primero. Otras cachés se añaden aquí.
+PREWARM_STEPS: List[Tuple[str, Callable[[], Any]]] = [
+    ("imports", _import_pipeline),
+    ("category_rules", _compile_category_rules),
+    ("accounts_yaml", _load_accounts_yaml),
+    ("storage", _open_storage),
+    ("parsers", _prime_parsers),
+]
+
+PREWARM_STATUS: Dict[str, Any] = {"state": "pending", "steps": {}}
+
+
+def run_prewarm_steps() -> Dict[str, Any]:
+    """Ejecuta los pasos (síncrono) y devuelve {paso: ms | error}."""
+    PREWARM_STATUS["state"] = "running"
+    for name, step in PREWARM_STEPS:
+        t0 = time.perf_counter()
+        try:
+            step()
+            PREWARM_STATUS["steps"][name] = round((time.perf_counter() - t0) * 1000, 1)
+        except Exception as e:
+            PREWARM_STATUS["steps"][name] = f"error: {type(e).__name__}: {e}"
+            print(f"[prewarm] {name} falló: {type(e).__name__}: {e}")
+    PREWARM_STATUS["state"] = "done"
+    return PREWARM_STATUS["steps"]
+
+
+async def prewarm(delay_seconds: float = 0.0) -> None:
+    """Tarea de fondo del lifespan: deja que el servidor haga bind y luego calienta en un hilo."""
+    await asyncio.sleep(delay_seconds)
+    t0 = time.perf_counter()
+    steps = await asyncio.to_thread(run_prewarm_steps)
+    print(f"[prewarm] listo en {(time.perf_counter() - t0) * 1000:.0f}ms: {steps}")
@@ -0,0 +1,266 @@
+"""
+Profiler por muestreo bajo demanda (sin dependencias: sys._current_frames desde un hilo aparte).
+Un admin lo arma para las próximas N peticiones (opcionalmente filtradas por ruta y usuario);
+cada petición perfilada deja un fichero .collapsed (formato "pila;de;frames N", compatible con
+flamegraph.pl y speedscope) en Settings.PROFILE_DIR, conservando solo los PROFILE_MAX_FILES más recientes.
+
+La petición se reclama al autenticarse (get_current_user llama a profile_request), cuando ya se conoce el
+usuario. Solo se muestrean sus propios hilos: el del event loop, y de él solo las pilas que pasan por la
+corrutina de esta petición (no las de otras peticiones concurrentes), más los hilos del threadpool que
+ejecutan trabajo suyo (request_thread).
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+
+# Hojas de pila de hilos ociosos (event loop esperando, workers del threadpool sin trabajo)
+_IDLE_LEAVES = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get")}
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename.replace("\\", "/")
+    for marker in ("/site-packages/", "/Backend/"):
+        if marker in path:
+            path = path.split(marker, 1)[1]
+            break
+    else:
+        path = os.path.basename(path)
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({path})"
+
+
+class SamplingProfiler:
+    """Muestrea cada `interval` segundos las pilas de los hilos de una petición mientras está activo:
+    del hilo `loop_thread` solo las que contienen `root_frame`; de los de `threads`, todas."""
+
+    def __init__(self, interval: float, loop_thread: int, root_frame: Any, threads: Set[int]):
+        self.interval = interval
+        self.loop_thread = loop_thread
+        self.root_frame = root_frame
+        self.threads = threads
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            targets = {self.loop_thread, *self.threads}
+            for ident, frame in sys._current_frames().items():
+                if ident not in targets:
+                    continue
+                leaf = frame.f_code
+                if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES:
+                    continue
+                stack = []
+                ours = ident != self.loop_thread
+                while frame is not None:
+                    ours = ours or frame is self.root_frame
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if not ours:
+                    continue  # event loop ejecutando otra petición
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, "thread"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfileSession:
+    """Estado de armado: cuántas peticiones quedan por perfilar y con qué filtros. Una a la vez."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.remaining = 0
+        self.path_prefix: Optional[str] = None
+        self.user_id: Optional[str] = None
+        self.armed_by: Optional[str] = None
+        self._active = False
+
+    def arm(self, requests: int, path_prefix: Optional[str], user_id: Optional[str], armed_by: str) -> None:
+        with self._lock:
+            self.remaining = requests
+            self.path_prefix = path_prefix
+            self.user_id = user_id
+            self.armed_by = armed_by
+
+    def disarm(self) -> None:
+        with self._lock:
+            self.remaining = 0
+
+    def armed(self, path: str) -> bool:
+        """Comprobación barata antes de autenticar: puede que esta petición se perfile."""
+        return self.remaining > 0 and not (self.path_prefix and not path.startswith(self.path_prefix))
+
+    def claim(self, path: str, user_id: Optional[str]) -> bool:
+        """True si esta petición (ya autenticada) se perfila: consume una del cupo."""
+        with self._lock:
+            if self.remaining <= 0 or self._active:
+                return False
+            if self.path_prefix and not path.startswith(self.path_prefix):
+                return False
+            if self.user_id and user_id != self.user_id:
+                return False
+            self.remaining -= 1
+            self._active = True
+            return True
+
+    def finish(self) -> None:
+        with self._lock:
+            self._active = False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "remaining": self.remaining,
+            "path_prefix": self.path_prefix,
+            "user_id": self.user_id,
+            "armed_by": self.armed_by,
+            "active": self._active,
+        }
+
+
+profile_session = ProfileSession()
+
+
+class _RequestProfile:
+    """Petición candidata (la crea ProfilingMiddleware): su hilo, su corrutina raíz y, si se reclama, el profiler."""
+
+    def __init__(self, path: str, loop_thread: int, root_frame: Any):
+        self.path = path
+        self.loop_thread = loop_thread
+        self.root_frame = root_frame
+        self.threads: Set[int] = set()
+        self.profiler: Optional[SamplingProfiler] = None
+
+
+_REQUEST_PROFILE: ContextVar[Optional[_RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def profile_request(user_id: Optional[str]) -> None:
+    """Tras autenticar: reclama la petición actual si el profiler está armado para ella y empieza a muestrear."""
+    request = _REQUEST_PROFILE.get()
+    if request is None or request.profiler is not None or not profile_session.claim(request.path, user_id):
+        return
+    request.profiler = SamplingProfiler(
+        settings.PROFILE_INTERVAL_MS / 1000, request.loop_thread, request.root_frame, request.threads
+    )
+    request.profiler.start()
+
+
+def request_thread(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Envuelve fn (para run_in_threadpool) para que, si la petición se perfila, se muestree el hilo que la ejecuta."""
+    request = _REQUEST_PROFILE.get()
+    if request is None:
+        return fn
+
+    def run(*args, **kwargs):
+        ident = threading.get_ident()
+        request.threads.add(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            request.threads.discard(ident)
+
+    return run
+
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def profile_dir() -> Path:
+    return Path(settings.PROFILE_DIR)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    files = sorted(directory.glob("*.collapsed"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [{"name": p.name, "bytes": p.stat().st_size} for p in files]
+
+
+def profile_path(name: str) -> Optional[Path]:
+    """Ruta de un perfil existente; None si el nombre no es válido (evita salir de PROFILE_DIR)."""
+    if _SAFE_NAME.sub("", name) != name or not name.endswith(".collapsed"):
+        return None
+    path = profile_dir() / name
+    return path if path.is_file() else None
+
+
+def save_profile(profiler: SamplingProfiler, method: str, path: str, status: int, elapsed_ms: float) -> Optional[Path]:
+    if not profiler.samples:
+        return None
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = _SAFE_NAME.sub("_", path.strip("/")) or "root"
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    target = directory / f"{stamp}_{method}_{slug}_{status}_{elapsed_ms:.0f}ms.collapsed"
+    target.write_text(profiler.collapsed(), encoding="utf-8")
+    _enforce_retention(directory)
+    return target
+
+
+def _enforce_retention(directory: Path) -> None:
+    files = sorted(directory.glob("*.collapsed"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[max(0, settings.PROFILE_MAX_FILES):]:
+        try:
+            old.unlink()
+        except OSError as e:
+            print(f"[profiler] no se pudo borrar {old}: {e}")
+
+
+class ProfilingMiddleware:
+    """Prepara la petición para profile_request mientras el profiler está armado; si se reclamó, guarda el perfil."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not profile_session.armed(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        request = _RequestProfile(scope["path"], threading.get_ident(), sys._getframe())
+        token = _REQUEST_PROFILE.set(request)
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _REQUEST_PROFILE.reset(token)
+            if request.profiler is not None:
+                request.profiler.stop()
+                profile_session.finish()
+                elapsed_ms = (time.perf_counter() - t0) * 1000
+                saved = save_profile(request.profiler, scope["method"], scope["path"], status, elapsed_ms)
+                print(f"[profiler] {scope['method']} {scope['path']} {elapsed_ms:.0f}ms -> {saved}")
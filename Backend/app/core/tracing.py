@@ -0,0 +1,114 @@
+"""
+Traza por petición: cada llamada a Supabase/Auth (vía InstrumentedStorage y get_current_user)
+y cada etapa del pipeline añade un span a la traza de la petición en curso (ContextVar; se
+propaga también a los endpoints síncronos que corren en el threadpool).
+  - Cabecera Server-Timing con el desglose (visible en las dev tools del navegador).
+  - Las peticiones más lentas que Settings.SLOW_REQUEST_MS se loguean con su desglose.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+
+class Trace:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self.user_id: Optional[str] = None  # lo rellena get_current_user
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans.append((name, seconds))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def summary(self) -> Dict[str, Tuple[int, float]]:
+        """name -> (nº de llamadas, ms totales), en orden de primera aparición."""
+        out: Dict[str, Tuple[int, float]] = {}
+        for name, seconds in self.spans:
+            count, ms = out.get(name, (0, 0.0))
+            out[name] = (count + 1, ms + seconds * 1000)
+        return out
+
+    def server_timing(self) -> str:
+        parts = [
+            f'{name};dur={ms:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+            for name, (count, ms) in self.summary().items()
+        ]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+    def breakdown(self) -> str:
+        items = [
+            f"{name} {ms:.0f}ms" + (f" (x{count})" if count > 1 else "")
+            for name, (count, ms) in self.summary().items()
+        ]
+        return " | ".join(items) or "sin spans"
+
+
+_CURRENT_TRACE: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def add_span(name: str, seconds: float) -> None:
+    """Añade un span a la traza de la petición en curso (no hace nada fuera de una petición)."""
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+def current_trace() -> Optional[Trace]:
+    return _CURRENT_TRACE.get()
+
+
+class TracingMiddleware:
+    """Abre una traza por petición HTTP, añade Server-Timing y loguea las lentas."""
+
+    def __init__(self, app: ASGIApp, slow_request_ms: Optional[int] = None, server_timing: bool = True) -> None:
+        self.app = app
+        self.slow_request_ms = settings.SLOW_REQUEST_MS if slow_request_ms is None else slow_request_ms
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"])
+        token = _CURRENT_TRACE.set(trace)
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", trace.server_timing())
+                    # Sin esto el navegador oculta Server-Timing en peticiones cross-origin
+                    origin = _header(scope, b"origin")
+                    if origin:
+                        headers["Timing-Allow-Origin"] = origin
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _CURRENT_TRACE.reset(token)
+            elapsed = trace.elapsed_ms()
+            if self.slow_request_ms and elapsed >= self.slow_request_ms:
+                print(f"[SLOW] {trace.method} {trace.path} -> {status} {elapsed:.0f}ms: {trace.breakdown()}")
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
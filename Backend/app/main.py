@@ -7,15 +7,24 @@ import asyncio
 import os
 from contextlib import asynccontextmanager
 from datetime import datetime
-import httpx
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import MetricsMiddleware, metrics_response
+from app.core.prewarm import PREWARM_STATUS, prewarm
+from app.core.profiler import ProfilingMiddleware
+from app.core.tracing import TracingMiddleware
 from app.api.routers.upload_extract_file import router as upload_router
 from app.api.routers.get_transactions import router as get_router
-from app.api.services.supabase.supabase_service import supabase_service
+from app.api.routers.admin import router as admin_router
+from app.api.routers.jobs import router as jobs_router
+from app.api.routers.rules import router as rules_router
+from app.api.services.ingest import shutdown_parse_pool
+from app.api.services.storage import storage_service
 
 KEEP_ALIVE_TASK: asyncio.Task | None = None
+PREWARM_TASK: asyncio.Task | None = None
 
 
 async def _keep_alive_loop() -> None:
@@ -23,6 +32,8 @@ async def _keep_alive_loop() -> None:
     base_url = (settings.APP_URL or os.getenv("RENDER_EXTERNAL_URL") or "").rstrip("/")
     if not base_url:
         return
+    import httpx
+
     interval = max(60, settings.KEEP_ALIVE_INTERVAL_SECONDS)
     url = f"{base_url}/health"
     while True:
@@ -44,12 +55,18 @@ async def _keep_alive_loop() -> None:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global KEEP_ALIVE_TASK
+    global KEEP_ALIVE_TASK, PREWARM_TASK
+    # Pipeline (pandas/openpyxl) y Supabase se cargan en segundo plano: /health responde ya
+    if settings.PREWARM_ENABLED:
+        PREWARM_TASK = asyncio.create_task(prewarm(settings.PREWARM_DELAY_SECONDS))
     base_url = settings.APP_URL or os.getenv("RENDER_EXTERNAL_URL")
     if base_url:
         KEEP_ALIVE_TASK = asyncio.create_task(_keep_alive_loop())
         print(f"[keep-alive] iniciado cada {settings.KEEP_ALIVE_INTERVAL_SECONDS}s -> {base_url}/health")
     yield
+    if PREWARM_TASK and not PREWARM_TASK.done():
+        PREWARM_TASK.cancel()
+    shutdown_parse_pool()
     if KEEP_ALIVE_TASK and not KEEP_ALIVE_TASK.done():
         KEEP_ALIVE_TASK.cancel()
         try:
@@ -84,6 +101,13 @@ else:
     cors_credentials = True
     print(f"[CORS] Development mode: origins={cors_origins}")
 
+# SQLite no valida tokens (Bearer = user_id): solo con SQLITE_DEV_AUTH explícito y nunca en producción
+if settings.STORAGE_BACKEND.lower() == "sqlite" and (not settings.SQLITE_DEV_AUTH or is_production):
+    raise RuntimeError(
+        "STORAGE_BACKEND=sqlite acepta cualquier Bearer token como user_id: "
+        "solo para desarrollo, con SQLITE_DEV_AUTH=true y fuera de producción"
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
@@ -92,9 +116,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresión negociada (br/gzip) de las respuestas grandes (listados de transacciones)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=settings.GZIP_LEVEL,
+    brotli_quality=settings.BROTLI_QUALITY,
+)
+
+# Latencia por ruta para /metrics. El último middleware añadido es el más externo: este no lo es (la traza y el
+# profiler lo envuelven), pero sí envuelve la compresión y CORS, así que su tiempo entra en la medida
+app.add_middleware(MetricsMiddleware)
+
+# Profiler por muestreo bajo demanda (/admin/profile); la petición se reclama al autenticarse (get_current_user)
+app.add_middleware(ProfilingMiddleware)
+
+# Traza por petición: Server-Timing + log de las lentas (Settings.SLOW_REQUEST_MS)
+app.add_middleware(
+    TracingMiddleware,
+    slow_request_ms=settings.SLOW_REQUEST_MS,
+    server_timing=settings.SERVER_TIMING_ENABLED,
+)
+
 # Include routers
 app.include_router(upload_router)
 app.include_router(get_router)
+app.include_router(jobs_router)
+app.include_router(rules_router)
+app.include_router(admin_router)
 
 @app.api_route("/", methods=["GET", "HEAD"])
 async def root():
@@ -112,15 +161,21 @@ async def health_check():
     return {"status": "healthy"}
 
 
+# Métricas Prometheus (scrape)
+app.add_route("/metrics", metrics_response, methods=["GET"], include_in_schema=False)
+
+
 @app.get("/test")
 async def test():
     """Test endpoint para diagnosticar Render vs local.
     Usar: GET https://tu-backend.onrender.com/test"""
-    supabase_ok = supabase_service.is_connected()
-    uses_sr = supabase_service.uses_service_role() if hasattr(supabase_service, "uses_service_role") else None
+    supabase_ok = storage_service.is_connected()
+    uses_sr = storage_service.uses_service_role() if hasattr(storage_service, "uses_service_role") else None
     return {
         "status": "ok",
         "environment": os.getenv("ENVIRONMENT", "development"),
+        "storage_backend": settings.STORAGE_BACKEND,
+        "prewarm": PREWARM_STATUS,
         "supabase_connected": supabase_ok,
         "supabase_uses_service_role": uses_sr,
         "hint": "Si uses_service_role=false en Render, añade SUPABASE_SERVICE_ROLE_KEY en Environment" if (supabase_ok and uses_sr is False) else None,
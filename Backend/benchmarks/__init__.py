@@ -0,0 +1,3 @@
+"""
+Benchmarks del backend. Ejecutar desde Backend/: python -m benchmarks.<modulo>
+"""
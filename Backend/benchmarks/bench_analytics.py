@@ -0,0 +1,99 @@
+"""
+Benchmark de la analítica sobre TransactionFrame: memoria frente a list[dict] y tiempo de cada operación.
+Memoria (tracemalloc): las filas completas tal como las devuelve Supabase frente al frame construido por
+páginas (como TransactionFrame.load), sin tener todas las filas a la vez.
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_analytics --rows 50000 --repeat 5
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import date
+from typing import Any, Callable, Dict, Iterator, List
+
+import numpy as np
+
+from app.api.services.balance_series import resample
+from app.api.services.recurring import detect_recurring
+from app.api.services.transaction_frame import PAGE_SIZE, TransactionFrame, _Builder
+from benchmarks.bench_serialization import synthetic_rows
+
+
+def _pages(rows: int, page_size: int = PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Filas sintéticas página a página, como las devuelve fetch_transactions_page (nunca todas a la vez)."""
+    for seed, start in enumerate(range(0, rows, page_size)):
+        yield synthetic_rows(min(page_size, rows - start), seed=seed)
+
+
+def _traced(fn: Callable[[], Any]) -> tuple[Any, float, float]:
+    """(resultado, MB retenidos, MB de pico) de fn()."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current / 2**20, peak / 2**20
+
+
+def _best_of(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _build_paged(rows: int) -> TransactionFrame:
+    builder = _Builder()
+    for page in _pages(rows):
+        builder.extend(page)
+    return builder.build()
+
+
+def run(rows: int, repeat: int) -> Dict[str, Any]:
+    data, rows_mb, _ = _traced(lambda: synthetic_rows(rows))
+    frame, frame_mb, frame_peak_mb = _traced(lambda: _build_paged(rows))
+    detailed = TransactionFrame.from_rows(data, details=True)
+    # Cierres diarios de una cuenta, como los guarda la caché de balance_series
+    closings = next(iter(frame.balance_series("day").values()))
+    days = np.array([c["period"] for c in closings], dtype="datetime64[D]").astype(np.int64)
+    saldos = np.array([c["saldo"] for c in closings])
+
+    timings = {
+        "build (from_rows)": _best_of(lambda: TransactionFrame.from_rows(data), repeat),
+        "transferencias internas": _best_of(frame.internal_transfer_mask, repeat),
+        "saldos por día": _best_of(lambda: frame.balance_series("day"), repeat),
+        "rollup mes x categoría": _best_of(lambda: frame.rollup(["month", "categoria"]), repeat),
+        "pagos recurrentes": _best_of(lambda: detect_recurring(detailed), repeat),
+        "serie de saldo mensual": _best_of(lambda: resample(days, saldos, "month", date.today()), repeat),
+    }
+    return {
+        "rows": rows,
+        "memory_mb": {"list[dict]": rows_mb, "frame": frame_mb, "frame_build_peak": frame_peak_mb},
+        "seconds": timings,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    report = run(args.rows, args.repeat)
+    mem = report["memory_mb"]
+    print(f"{args.rows:,} filas")
+    print(f"  memoria list[dict]: {mem['list[dict]']:>8.1f} MB")
+    print(f"  memoria frame:      {mem['frame']:>8.1f} MB  (pico al construir por páginas: {mem['frame_build_peak']:.1f} MB)")
+    for name, seconds in report["seconds"].items():
+        print(f"  {name:<26} {seconds * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
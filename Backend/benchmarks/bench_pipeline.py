@@ -0,0 +1,168 @@
+"""
+Benchmark del pipeline de ingesta (main_file_parser) por etapas:
+read, detect, decode, categorize, hash, dup-check y rename.
+Para cada etapa mide tiempo (mejor de --repeat) y pico de memoria (tracemalloc, en una pasada aparte).
+"categorize" se mide por separado sobre las descripciones del extracto; su coste también
+está incluido en "decode", que es donde lo ejecutan los decoders.
+
+Los resultados se guardan en benchmarks/results/pipeline_<commit>.json para comparar entre commits.
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_pipeline --sizes 1000,10000 --sources ibercaja,revolut,pluxee
+    python -m benchmarks.bench_pipeline --sizes 100000 --compare benchmarks/results/pipeline_abc1234.json
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from app.api.services.pipe_extract_transactions.category_rules import CATEGORY_RULES, analyze_descriptions
+from app.api.services.pipe_extract_transactions.main import (
+    assign_transaction_ids,
+    check_duplicate_ids,
+    decode_statement,
+    detect_source,
+    read_statement,
+    rename_columns,
+)
+from benchmarks.common import save_report
+from benchmarks.generators import GENERATORS, statement_file
+
+STAGES = ["read", "detect", "decode", "categorize", "hash", "dup-check", "rename"]
+
+
+def _categorize(descriptions: List[str]) -> pd.DataFrame:
+    return analyze_descriptions(pd.Series(descriptions, dtype=object), CATEGORY_RULES)
+
+
+def _stage_plan(file_bytes: bytes, is_csv: bool) -> List[Tuple[str, Callable[[Dict[str, Any]], None]]]:
+    """Etapas en orden; cada una lee/escribe su estado en `ctx`."""
+
+    def read(ctx):
+        ctx["df"] = read_statement(file_bytes, is_csv=is_csv)
+
+    def detect(ctx):
+        ctx["source"] = detect_source(ctx["df"])
+
+    def decode(ctx):
+        ctx["descriptions"] = _raw_descriptions(ctx["df"], ctx["source"])
+        ctx["tx"], _, _ = decode_statement(ctx["df"], ctx["source"])
+
+    def categorize(ctx):
+        _categorize(ctx["descriptions"])
+
+    def hash_(ctx):
+        ctx["tx"] = assign_transaction_ids(ctx["tx"])
+
+    def dup_check(ctx):
+        check_duplicate_ids(ctx["tx"])
+
+    def rename(ctx):
+        ctx["tx"] = rename_columns(ctx["tx"])
+
+    return list(zip(STAGES, [read, detect, decode, categorize, hash_, dup_check, rename]))
+
+
+def _raw_descriptions(df: pd.DataFrame, source: str) -> List[str]:
+    """Descripciones del extracto crudo (las que categorizan los decoders)."""
+    if source == "Revolut":
+        col = df["Descripción"]
+    elif source == "Ibercaja":
+        col = df.iloc[7:, 4]
+    else:  # Pluxee: columna de la cabecera que contiene "descripci"
+        header = [str(c).lower() for c in df.iloc[8].values]
+        idx = next((i for i, c in enumerate(header) if "descripci" in c), 1)
+        col = df.iloc[9:, idx]
+    return col.fillna("").astype(str).str.strip().tolist()
+
+
+def _run_once(file_bytes: bytes, is_csv: bool, measure_memory: bool) -> Dict[str, float]:
+    ctx: Dict[str, Any] = {}
+    out: Dict[str, float] = {}
+    for name, stage in _stage_plan(file_bytes, is_csv):
+        if measure_memory:
+            # La basura cíclica de la etapa anterior (openpyxl) se liberaría a mitad de esta y falsearía el pico
+            gc.collect()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            stage(ctx)
+            out[name] = (tracemalloc.get_traced_memory()[1] - before) / 2**20
+        else:
+            t0 = time.perf_counter()
+            stage(ctx)
+            out[name] = time.perf_counter() - t0
+    return out
+
+
+def bench(source: str, rows: int, repeat: int, memory: bool) -> Dict[str, Any]:
+    path = statement_file(source, rows)
+    file_bytes = path.read_bytes()
+    is_csv = GENERATORS[source][1] == ".csv"
+
+    with contextlib.redirect_stdout(io.StringIO()):  # el pipeline hace print de la detección
+        timings = [_run_once(file_bytes, is_csv, measure_memory=False) for _ in range(repeat)]
+        peaks: Dict[str, float] = {}
+        if memory:
+            tracemalloc.start()
+            try:
+                peaks = _run_once(file_bytes, is_csv, measure_memory=True)
+            finally:
+                tracemalloc.stop()
+
+    stages = {
+        name: {
+            "seconds": min(t[name] for t in timings),
+            **({"peak_mb": peaks[name]} if name in peaks else {}),
+        }
+        for name in STAGES
+    }
+    total = sum(v["seconds"] for k, v in stages.items() if k != "categorize")
+    return {"source": source, "rows": rows, "file_bytes": len(file_bytes), "total_seconds": total, "stages": stages}
+
+
+def _print_table(results: List[Dict[str, Any]], baseline: Dict[Tuple[str, int], Dict[str, Any]]) -> None:
+    print(f"{'fuente':<9} {'filas':>9} " + " ".join(f"{s:>11}" for s in STAGES) + f" {'total s':>9} {'vs base':>8}")
+    for r in results:
+        cells = " ".join(f"{r['stages'][s]['seconds']:>11.4f}" for s in STAGES)
+        base = baseline.get((r["source"], r["rows"]))
+        delta = f"{r['total_seconds'] / base['total_seconds']:>7.0%}" if base else f"{'-':>8}"
+        print(f"{r['source']:<9} {r['rows']:>9,} {cells} {r['total_seconds']:>9.3f} {delta}")
+        if "peak_mb" in r["stages"]["read"]:
+            mem = " ".join(f"{r['stages'][s]['peak_mb']:>10.1f}M" for s in STAGES)
+            print(f"{'':<9} {'pico mem':>9} {mem}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="Filas por extracto, separadas por comas (ej. 1000,10000,100000,1000000)")
+    parser.add_argument("--sources", default=",".join(GENERATORS), help="ibercaja,revolut,pluxee")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="No medir memoria (tracemalloc ralentiza)")
+    parser.add_argument("--output", type=Path, default=None, help="JSON de salida (por defecto results/pipeline_<commit>.json)")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON de un run anterior para comparar totales")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    sources = [s.strip() for s in args.sources.split(",") if s.strip()]
+    results = [bench(src, n, args.repeat, memory=not args.no_memory) for src in sources for n in sizes]
+
+    baseline: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    if args.compare:
+        previous = json.loads(args.compare.read_text(encoding="utf-8"))
+        baseline = {(r["source"], r["rows"]): r for r in previous["results"]}
+    _print_table(results, baseline)
+
+    output = save_report("pipeline", {"pandas": pd.__version__, "results": results}, args.output)
+    print(f"Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
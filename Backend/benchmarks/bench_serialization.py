@@ -0,0 +1,129 @@
+"""
+Benchmark de serialización de /GET/transactions: tiempo de encode y bytes en el cable.
+Antes: jsonable_encoder + json.dumps (JSONResponse de FastAPI), sin comprimir.
+Después: orjson (FastJSONResponse) + gzip / brotli con los niveles de Settings.
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_serialization --rows 10000 --repeat 5
+"""
+
+import argparse
+import json
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+
+from app.api.responses import FastJSONResponse
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CUENTAS = ["Conjunta", "Personal", "Revolut", "Pluxee"]
+CATEGORIAS = [
+    ("Supermercado", "Mercadona"), ("Restaurantes", None), ("Transporte", "Gasolina"),
+    ("Suministros", "Luz"), ("bizum", "JUAN PEREZ"), ("Transferencia", "Interna"), ("otros", None),
+]
+
+
+def synthetic_rows(n: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Filas con la forma de la tabla transactions tal como las devuelve Supabase."""
+    rnd = random.Random(seed)
+    start = datetime(2022, 1, 1)
+    rows = []
+    saldo = 5000.0
+    for i in range(n):
+        importe = round(rnd.uniform(-150, 60), 2)
+        saldo = round(saldo + importe, 2)
+        categoria, subcategoria = rnd.choice(CATEGORIAS)
+        dt = start + timedelta(minutes=97 * i)
+        rows.append({
+            "id": i + 1,
+            "transaction_id": f"{rnd.getrandbits(128):032x}",
+            "account_id": f"00000000-0000-4000-8000-{i % 4:012d}",
+            "dt_date": dt.strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+            "importe": importe,
+            "saldo": saldo,
+            "cuenta": rnd.choice(CUENTAS),
+            "descripcion": f"COMPRA TARJ. 5402XXXXXXXX{rnd.randint(1000, 9999)} MERCADONA VALDEBERNARDO-MADRID",
+            "categoria": categoria,
+            "subcategoria": subcategoria,
+            "bizum_mensaje": None,
+            "referencia": str(rnd.randint(10**11, 10**12)),
+            "import_batch": None,
+            "created_at": "2026-01-17T10:00:00.000000+00:00",
+        })
+    return rows
+
+
+def _baseline_encode(payload: Dict[str, Any]) -> bytes:
+    # Mismo camino que JSONResponse de FastAPI con response_model=Dict[str, Any]
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _orjson_encode(payload: Dict[str, Any]) -> bytes:
+    return FastJSONResponse(payload).body
+
+
+def _gzip(body: bytes) -> bytes:
+    c = zlib.compressobj(settings.GZIP_LEVEL, zlib.DEFLATED, 31)
+    return c.compress(body) + c.flush()
+
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=settings.BROTLI_QUALITY)
+
+
+def _best_of(fn: Callable[[], bytes], repeat: int) -> tuple[float, bytes]:
+    best = float("inf")
+    out = b""
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def run(rows: int, repeat: int) -> List[Dict[str, Any]]:
+    data = synthetic_rows(rows)
+    payload = {"success": True, "count": len(data), "data": data}
+    results = []
+
+    t_base, body_base = _best_of(lambda: _baseline_encode(payload), repeat)
+    results.append({"variant": "antes: jsonable_encoder+json.dumps", "encode_ms": t_base * 1000, "bytes": len(body_base)})
+
+    t_fast, body_fast = _best_of(lambda: _orjson_encode(payload), repeat)
+    results.append({"variant": "después: orjson", "encode_ms": t_fast * 1000, "bytes": len(body_fast)})
+
+    t_gz, body_gz = _best_of(lambda: _gzip(body_fast), repeat)
+    results.append({"variant": f"después: orjson+gzip({settings.GZIP_LEVEL})", "encode_ms": (t_fast + t_gz) * 1000, "bytes": len(body_gz)})
+
+    if brotli is not None:
+        t_br, body_br = _best_of(lambda: _brotli(body_fast), repeat)
+        results.append({"variant": f"después: orjson+br({settings.BROTLI_QUALITY})", "encode_ms": (t_fast + t_br) * 1000, "bytes": len(body_br)})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run(args.rows, args.repeat)
+    base = results[0]
+    print(f"{'variante':<40} {'encode ms':>10} {'bytes':>12} {'vs antes':>9}")
+    for r in results:
+        print(f"{r['variant']:<40} {r['encode_ms']:>10.1f} {r['bytes']:>12,} {r['bytes'] / base['bytes']:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
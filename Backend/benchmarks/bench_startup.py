@@ -0,0 +1,136 @@
+"""
+Benchmark de arranque en frío (cada medida en un proceso nuevo, con el backend SQLite en memoria):
+  - import: tiempo de `import app.main`.
+  - health: desde lanzar uvicorn hasta el primer 200 de /health (bind + import + lifespan).
+  - prewarm: desde lanzar uvicorn hasta que /test informa el prewarm terminado.
+  - first_upload: latencia de la primera subida (con prewarm: una vez terminado; sin él: justo tras /health).
+
+Uso (desde Backend/):
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --no-prewarm   # solo carga diferida, sin calentar
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import save_report
+from benchmarks.generators import statement_file
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _env(prewarm: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": ":memory:",
+        "SQLITE_DEV_AUTH": "true",
+        "APP_URL": "",
+        "PREWARM_ENABLED": "true" if prewarm else "false",
+    })
+    return env
+
+
+def _import_seconds(prewarm: bool) -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=_env(prewarm),
+        capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(client: httpx.Client, url: str, started: float, timeout: float, ready=lambda r: True) -> float:
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            r = client.get(url)
+            if r.status_code == 200 and ready(r):
+                return time.perf_counter() - started
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f"{url} no respondió en {timeout}s")
+
+
+def _server_run(prewarm: bool, upload: bytes, timeout: float) -> Dict[str, Optional[float]]:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=_env(prewarm), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            health = _wait_for(client, f"{base}/health", started, timeout)
+            prewarm_done = None
+            if prewarm:
+                prewarm_done = _wait_for(
+                    client, f"{base}/test", started, timeout,
+                    ready=lambda resp: resp.json().get("prewarm", {}).get("state") == "done",
+                )
+            t0 = time.perf_counter()
+            r = client.post(
+                f"{base}/upload/Transactions",
+                headers={"Authorization": "Bearer bench"},
+                files={"file": ("ibercaja.xlsx", upload)},
+            )
+            r.raise_for_status()
+            first_upload = time.perf_counter() - t0
+        return {"health": health, "first_upload": first_upload, "prewarm": prewarm_done}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _stats(values: List[float]) -> Dict[str, float]:
+    return {"median_ms": statistics.median(values) * 1000, "min_ms": min(values) * 1000, "max_ms": max(values) * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=500, help="Filas del extracto de la primera subida")
+    parser.add_argument("--no-prewarm", action="store_true")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", type=Path, default=None, help="JSON de salida (por defecto results/startup_<commit>.json)")
+    args = parser.parse_args()
+
+    prewarm = not args.no_prewarm
+    upload = statement_file("ibercaja", args.rows).read_bytes()
+    imports = [_import_seconds(prewarm) for _ in range(args.runs)]
+    runs = [_server_run(prewarm, upload, args.timeout) for _ in range(args.runs)]
+
+    results: Dict[str, Any] = {"import": _stats(imports)}
+    for key in ("health", "first_upload", "prewarm"):
+        values = [r[key] for r in runs if r[key] is not None]
+        if values:
+            results[key] = _stats(values)
+
+    print(f"{'medida':<14} {'mediana ms':>11} {'mín ms':>9} {'máx ms':>9}")
+    for key, s in results.items():
+        print(f"{key:<14} {s['median_ms']:>11.1f} {s['min_ms']:>9.1f} {s['max_ms']:>9.1f}")
+
+    config = {"runs": args.runs, "rows": args.rows, "prewarm": prewarm}
+    output = save_report("startup", {"config": config, "results": results}, args.output)
+    print(f"Resultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
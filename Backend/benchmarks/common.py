@@ -0,0 +1,46 @@
+"""
+Utilidades comunes de los benchmarks: commit actual y guardado de resultados en JSON.
+"""
+
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[idx]
+
+
+def save_report(name: str, report: Dict[str, Any], output: Optional[Path] = None) -> Path:
+    """Guarda el informe en results/<name>_<commit>.json (o en `output`) y devuelve la ruta."""
+    commit = git_commit()
+    full = {
+        "benchmark": name,
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        **report,
+    }
+    path = output or RESULTS_DIR / f"{name}_{commit}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(full, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path
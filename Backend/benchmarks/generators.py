@@ -0,0 +1,175 @@
+"""
+Generadores de extractos sintéticos con el mismo formato que los reales:
+  - Ibercaja .xlsx: bloque de cabecera "Consulta Movimientos de la Cuenta:" + IBAN en G3, tabla desde la fila 7.
+  - Revolut .csv: cabecera exacta de la exportación de Revolut.
+  - Pluxee .xlsx: "Pluxee Tarjeta Restaurante" en C6, saldo final en G6, tabla desde la fila 9.
+Los ficheros generados se cachean en benchmarks/.data/ (son deterministas por semilla).
+"""
+
+import csv
+import io
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Tuple
+
+from openpyxl import Workbook
+
+DATA_DIR = Path(__file__).resolve().parent / ".data"
+
+IBERCAJA_ACCOUNT = "20859254******716650"
+
+# (concepto, descripción, referencia, rango de importe)
+IBERCAJA_OPERATIONS = [
+    ("TARJETA VISA", "MERCADONA VALDEBERNA", "8460884859637", (-120, -5)),
+    ("TARJETA VISA", "CARREFOUR EXPRESS MADRID", "8460884859637", (-80, -3)),
+    ("TARJETA VISA", "Wellhub EU", "8460884859637", (-40, -30)),
+    ("TARJETA VISA", "DREAMFIT VALDEBERNA", "8460884859637", (-10, -5)),
+    ("TARJETA VISA", "REPSOL E.S. VALDEBERNARDO", "8460884859637", (-70, -30)),
+    ("TARJETA VISA", "RESTAURANTE LA TAGLIATELLA", "8460884859637", (-60, -15)),
+    ("TARJETA VISA", "CONSUMICIONES EVENT", "8460884859637", (-20, -2)),
+    ("TARJETA VISA", "AMAZON MKTPLACE EU", "8460884859637", (-90, -8)),
+    ("IBERCAJA PAY", "BIZUM CARGO JUAN PEREZ GOMEZ CENA VIERNES . BENEF: JUAN PEREZ GOMEZ", "0", (-40, -5)),
+    ("IBERCAJA PAY", "BIZUM ABONO MARIA LOPEZ RUIZ REGALO . ORDEN: MARIA LOPEZ RUIZ", "0", (5, 40)),
+    ("TRANSFERENCIA INTERNA", "GASTOS CONJUNTOS", "6010303307165", (-1000, -200)),
+    ("TRANSFERENCIA OTRA ENTIDAD", "PAGO ALQUILER PLAZA . BENEF: GARAJES MADRID SL", "0", (-120, -60)),
+    ("RECIBO GAS", "NATURGY IBERIA SA RECIBO GAS", "0", (-90, -30)),
+    ("RECIBO AGUA", "RECIBO AGUA CANAL DE ISABEL II", "0", (-50, -20)),
+    ("RECIBO SEGUROS", "IBERVIDA SEGUROS RECIBO", "0", (-40, -20)),
+    ("NOMINA", "NóMINA INDRA SISTEMAS SA", "0", (1800, 2600)),
+    ("LIQUIDACION INTERESES DE LA CUENTA", "", "0", (1, 30)),
+    ("OPERACION PRESTAMO-CREDITO-AVAL", "CUOTA PRESTAMO HIPOTECARIO", "0", (-900, -700)),
+    ("VARIOS", "COMPRA ONLINE TIENDA DESCONOCIDA", "0", (-60, -5)),
+]
+
+REVOLUT_HEADER = [
+    "Tipo", "Producto", "Fecha de inicio", "Fecha de finalización", "Descripción",
+    "Importe", "Comisión", "Divisa", "State", "Saldo",
+]
+
+REVOLUT_OPERATIONS = [
+    ("Pago con tarjeta", "Mercadona", (-90, -4)),
+    ("Pago con tarjeta", "Uber Eats", (-35, -10)),
+    ("Pago con tarjeta", "Apple.com/bill", (-15, -1)),
+    ("Pago con tarjeta", "Cabify", (-25, -6)),
+    ("Pago con tarjeta", "Zara", (-80, -15)),
+    ("Recargar", "Una recarga de Apple Pay con *1234", (20, 300)),
+    ("Transferencia", "Transferencia a JUAN PEREZ", (-200, -10)),
+    ("Intercambio", "Kraken", (-100, -20)),
+]
+
+PLUXEE_RESTAURANTS = [
+    "RESTAURANTE EL BUEN COMER", "BAR LA ESQUINA", "CAFETERIA CENTRAL", "BURGER KING GETAFE",
+    "MESON ORO Y PLATA", "SIEMENS GETAFE", "TABERNA DEL PUERTO", "DOMINOS PIZZA",
+]
+
+
+def _eur(value: float) -> str:
+    """Formato español de los Excel de Ibercaja: -1000,00"""
+    return f"{value:.2f}".replace(".", ",")
+
+
+def _chronological_days(n: int, rnd: random.Random, end: datetime, per_day: Tuple[int, int]) -> Iterator[datetime]:
+    """Fechas (solo día) en orden cronológico con varias operaciones por día."""
+    days = []
+    day = end
+    while len(days) < n:
+        for _ in range(rnd.randint(*per_day)):
+            days.append(day)
+        day -= timedelta(days=1)
+    days = days[:n]
+    days.reverse()
+    return iter(days)
+
+
+def ibercaja_xlsx(n: int, seed: int = 1) -> bytes:
+    rnd = random.Random(seed)
+    rows = []
+    saldo = 25.0 * n
+    for day in _chronological_days(n, rnd, datetime(2026, 1, 16), (1, 6)):
+        concepto, desc, ref, (lo, hi) = rnd.choice(IBERCAJA_OPERATIONS)
+        importe = round(rnd.uniform(lo, hi), 2) or 0.01
+        saldo = round(saldo + importe, 2)
+        rows.append((day.strftime("%d/%m/%Y"), concepto, desc, ref, importe, saldo))
+    rows.reverse()  # Ibercaja exporta del más reciente (Nº Orden 1) al más antiguo
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([])
+    ws.append([])
+    ws.append(["Consulta Movimientos de la Cuenta:", None, None, None, None, None, IBERCAJA_ACCOUNT])
+    ws.append(["Fecha de generación del informe en Banca Digital: 17/01/2026 16:38:58"])
+    ws.append([])
+    ws.append([])
+    ws.append(["Nº Orden", "Fecha Operacion", "Fecha Valor", "Concepto", "Descripción", "Referencia", "Importe", "Saldo"])
+    for i, (fecha, concepto, desc, ref, importe, saldo) in enumerate(rows, start=1):
+        ws.append([i, fecha, fecha, concepto, desc, ref, _eur(importe), _eur(saldo)])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def revolut_csv(n: int, seed: int = 2) -> bytes:
+    rnd = random.Random(seed)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(REVOLUT_HEADER)
+    ts = datetime(2026, 1, 16, 23, 0, 0) - timedelta(hours=5 * n)
+    saldo = 800.0
+    for _ in range(n):
+        ts += timedelta(seconds=rnd.randint(60, 36000))
+        tipo, desc, (lo, hi) = rnd.choice(REVOLUT_OPERATIONS)
+        importe = round(rnd.uniform(lo, hi), 2) or 0.01
+        saldo = round(saldo + importe, 2)
+        fecha = ts.strftime("%Y-%m-%d %H:%M:%S")
+        writer.writerow([tipo, "Actual", fecha, fecha, desc, importe, 0.0, "EUR", "COMPLETADO", saldo])
+    return buf.getvalue().encode("utf-8")
+
+
+def pluxee_xlsx(n: int, seed: int = 3) -> bytes:
+    rnd = random.Random(seed)
+    rows = []
+    saldo = 0.0
+    for day in _chronological_days(n, rnd, datetime(2026, 1, 16), (0, 3)):
+        if rnd.random() < 0.08:
+            importe = 11.0 * rnd.randint(10, 20)  # carga mensual
+            desc = "CARGA PLUXEE INDRA"
+        else:
+            importe = -round(rnd.uniform(6, 30), 2)
+            desc = rnd.choice(PLUXEE_RESTAURANTS)
+        saldo = round(saldo + importe, 2)
+        rows.append((day.strftime("%d/%m/%Y"), desc, importe))
+    rows.reverse()
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for _ in range(5):
+        ws.append([])
+    ws.append([None, None, "Pluxee Tarjeta Restaurante", None, None, "Saldo", _eur(saldo)])
+    ws.append([])
+    ws.append([])
+    ws.append(["Fecha", "Descripción", "Importe"])
+    for fecha, desc, importe in rows:
+        ws.append([fecha, desc, _eur(importe)])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+GENERATORS: Dict[str, Tuple[Callable[[int], bytes], str]] = {
+    "ibercaja": (ibercaja_xlsx, ".xlsx"),
+    "revolut": (revolut_csv, ".csv"),
+    "pluxee": (pluxee_xlsx, ".xlsx"),
+}
+
+
+def statement_file(source: str, n: int) -> Path:
+    """Ruta al extracto sintético (lo genera y cachea si no existe)."""
+    generator, ext = GENERATORS[source]
+    path = DATA_DIR / f"{source}_{n}{ext}"
+    if not path.exists():
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(generator(n))
+        tmp.replace(path)
+    return path
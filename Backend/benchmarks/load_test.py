@@ -0,0 +1,209 @@
+"""
+Prueba de carga de la API HTTP contra la app FastAPI en proceso (httpx + ASGITransport).
+Supabase y Auth se sustituyen por el backend SQLite local envuelto en LatencyStorage, que añade
+una latencia configurable (bloqueante, como el cliente síncrono de Supabase) a cada llamada.
+
+Endpoints: /upload/Transactions, /GET/transactions, /GET/shared-transactions, /GET/balances.
+Informa p50/p95/p99 y throughput por endpoint y nivel de concurrencia.
+
+Uso (desde Backend/):
+    python -m benchmarks.load_test --concurrency 1,10,50 --duration 10 --latency-ms 30 --auth-latency-ms 80
+    python -m benchmarks.load_test --revalidate   # los GET envían If-None-Match (caché del navegador)
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# El backend local se elige antes de importar la app
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", ":memory:")
+os.environ.setdefault("SQLITE_DEV_AUTH", "true")
+os.environ.setdefault("APP_URL", "")
+
+import httpx  # noqa: E402
+
+from app.api.services.pipe_extract_transactions.main import main_file_parser  # noqa: E402
+from app.api.services.storage import InstrumentedStorage, StorageBackend, get_storage_service  # noqa: E402
+import app.api.services.storage as storage_pkg  # noqa: E402
+from benchmarks.common import percentile, save_report  # noqa: E402
+from benchmarks.generators import revolut_csv  # noqa: E402
+
+# Llamadas que en Supabase no salen a la red
+_LOCAL_METHODS = {"is_connected", "uses_service_role"}
+
+
+class LatencyStorage:
+    """Envuelve un StorageBackend y duerme (bloqueando) antes de cada llamada, como un round trip real."""
+
+    def __init__(self, backend: StorageBackend, latency_s: float, auth_latency_s: float, jitter: float = 0.2):
+        self._backend = backend
+        self._latency_s = latency_s
+        self._auth_latency_s = auth_latency_s
+        self._jitter = jitter
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._backend, name)
+        if name.startswith("_") or name in _LOCAL_METHODS or not callable(attr):
+            return attr
+        delay = self._auth_latency_s if name == "get_user_from_token" else self._latency_s
+
+        def call(*args, **kwargs):
+            self.calls[name] += 1
+            if delay:
+                time.sleep(delay * random.uniform(1 - self._jitter, 1 + self._jitter))
+            return attr(*args, **kwargs)
+
+        return call
+
+
+def install_storage(fake: Any) -> None:
+    """Sustituye la instancia compartida (el storage_service de los routers delega en ella)."""
+    storage_pkg._STORAGE_SERVICE = fake
+
+
+def seed(backend: StorageBackend, users: int, rows: int) -> List[str]:
+    """Crea usuarios con una cuenta personal de `rows` transacciones; cada pareja comparte una conjunta."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        df, *_ = main_file_parser(revolut_csv(rows), is_csv=True)
+    template = df.to_dict(orient="records")
+    user_ids = [f"user-{i}" for i in range(users)]
+
+    def fill(account_id: str, label: str) -> None:
+        backend.insert_transactions([
+            {**t, "transaction_id": f"{label}-{t['transaction_id']}"[:64], "account_id": account_id, "cuenta": label}
+            for t in template
+        ])
+
+    for i, uid in enumerate(user_ids):
+        personal = backend.get_or_create_account(f"personal_{uid}", "revolut", f"Personal {i}")
+        backend.link_user_account(uid, personal)
+        fill(personal, f"p{i}")
+        if i % 2 == 1:
+            joint = backend.get_or_create_account(f"conjunta_{i // 2}", "ibercaja", f"Conjunta {i // 2}")
+            backend.link_user_account(uid, joint)
+            backend.link_user_account(user_ids[i - 1], joint)
+            fill(joint, f"c{i // 2}")
+    return user_ids
+
+
+ENDPOINT_MIX: List[Tuple[str, float]] = [
+    ("GET /GET/transactions", 0.4),
+    ("GET /GET/shared-transactions", 0.2),
+    ("GET /GET/balances", 0.3),
+    ("POST /upload/Transactions", 0.1),
+]
+
+
+async def _worker(
+    client: httpx.AsyncClient,
+    user_id: str,
+    upload_body: bytes,
+    deadline: float,
+    revalidate: bool,
+    samples: Dict[str, List[float]],
+    errors: Dict[str, int],
+) -> None:
+    rnd = random.Random(user_id)
+    names = [n for n, _ in ENDPOINT_MIX]
+    weights = [w for _, w in ENDPOINT_MIX]
+    etags: Dict[str, str] = {}
+    headers = {"Authorization": f"Bearer {user_id}"}
+    while time.perf_counter() < deadline:
+        endpoint = rnd.choices(names, weights)[0]
+        method, path = endpoint.split(" ", 1)
+        t0 = time.perf_counter()
+        if method == "POST":
+            r = await client.post(path, headers=headers, files={"file": ("revolut.csv", upload_body, "text/csv")})
+        else:
+            req_headers = dict(headers)
+            if revalidate and path in etags:
+                req_headers["If-None-Match"] = etags[path]
+            r = await client.get(path, headers=req_headers)
+            if "etag" in r.headers:
+                etags[path] = r.headers["etag"]
+        elapsed = time.perf_counter() - t0
+        if r.status_code >= 400:
+            errors[endpoint] += 1
+        else:
+            samples[endpoint].append(elapsed)
+
+
+async def run_level(app, user_ids: List[str], concurrency: int, duration: float, revalidate: bool, upload_rows: int) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    upload_body = revolut_csv(upload_rows)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # los endpoints hacen print
+            await asyncio.gather(*[
+                _worker(client, user_ids[i % len(user_ids)], upload_body, deadline, revalidate, samples, errors)
+                for i in range(concurrency)
+            ])
+        wall = time.perf_counter() - started
+
+    endpoints = {}
+    for name, _ in ENDPOINT_MIX:
+        values = sorted(samples.get(name, []))
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": errors.get(name, 0),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "rps": len(values) / wall,
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {"concurrency": concurrency, "seconds": wall, "throughput_rps": total / wall, "endpoints": endpoints}
+
+
+def _print_level(level: Dict[str, Any]) -> None:
+    print(f"\nconcurrencia={level['concurrency']}  throughput={level['throughput_rps']:.1f} req/s")
+    print(f"  {'endpoint':<32} {'n':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for name, e in level["endpoints"].items():
+        print(f"  {name:<32} {e['requests']:>6} {e['errors']:>4} {e['p50_ms']:>9.1f} {e['p95_ms']:>9.1f} {e['p99_ms']:>9.1f} {e['rps']:>8.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,10,50", help="Usuarios concurrentes por nivel, separados por comas")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por nivel")
+    parser.add_argument("--users", type=int, default=20, help="Usuarios sembrados")
+    parser.add_argument("--rows", type=int, default=2000, help="Transacciones por cuenta sembrada")
+    parser.add_argument("--upload-rows", type=int, default=300, help="Filas del CSV de Revolut que se sube")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="Latencia por llamada al storage")
+    parser.add_argument("--auth-latency-ms", type=float, default=80.0, help="Latencia de la validación del token")
+    parser.add_argument("--revalidate", action="store_true", help="Los GET envían If-None-Match con el último ETag")
+    parser.add_argument("--output", type=Path, default=None, help="JSON de salida (por defecto results/load_<commit>.json)")
+    args = parser.parse_args()
+
+    from app.main import app
+
+    backend = get_storage_service().wrapped
+    user_ids = seed(backend, args.users, args.rows)
+    # La latencia va dentro del proxy de métricas para que /metrics la refleje
+    install_storage(InstrumentedStorage(LatencyStorage(backend, args.latency_ms / 1000, args.auth_latency_ms / 1000)))
+
+    levels = []
+    for concurrency in [int(c) for c in args.concurrency.split(",") if c]:
+        level = asyncio.run(run_level(app, user_ids, concurrency, args.duration, args.revalidate, args.upload_rows))
+        _print_level(level)
+        levels.append(level)
+
+    config = {k: v for k, v in vars(args).items() if k != "output"}
+    path = save_report("load", {"config": config, "levels": levels}, args.output)
+    print(f"\nResultados guardados en {path}")
+
+
+if __name__ == "__main__":
+    main()
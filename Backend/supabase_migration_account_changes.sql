@@ -0,0 +1,37 @@
+-- Migración: registro de cambios por cuenta para cachés por periodo (GET /GET/balances/series).
+-- Cada escritura que incrementa data_version anota el rango de fechas que toca (from_date/to_date);
+-- NULL en ambas = cambio sin efecto en fechas ni saldos (renombrado, recategorización).
+-- Una versión sin fila aquí (p. ej. edición de fecha o saldo) obliga a recalcular la cuenta entera.
+-- Ejecutar en Supabase Dashboard > SQL Editor (después de supabase_migration_account_versions.sql).
+
+CREATE TABLE IF NOT EXISTS public.account_changes (
+    account_id UUID NOT NULL REFERENCES public.accounts(id) ON DELETE CASCADE,
+    data_version BIGINT NOT NULL,
+    from_date TIMESTAMPTZ,
+    to_date TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (account_id, data_version)
+);
+
+-- Retención: solo las últimas 100 versiones por cuenta. Una caché más antigua no encuentra todos sus
+-- cambios (faltan filas) y recalcula la cuenta entera, que de todos modos es más barato que 100 rangos.
+CREATE OR REPLACE FUNCTION public.prune_account_changes()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM public.account_changes
+    WHERE account_id = NEW.account_id AND data_version <= NEW.data_version - 100;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS account_changes_retention ON public.account_changes;
+CREATE TRIGGER account_changes_retention
+    AFTER INSERT ON public.account_changes
+    FOR EACH ROW EXECUTE FUNCTION public.prune_account_changes();
+
+-- Filas acumuladas antes de la retención
+DELETE FROM public.account_changes AS c
+USING public.accounts AS a
+WHERE c.account_id = a.id AND c.data_version <= a.data_version - 100;
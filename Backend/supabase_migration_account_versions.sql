@@ -0,0 +1,16 @@
+-- Migración: versión de datos por cuenta para ETag / If-None-Match en los GET.
+-- Cada escritura (subida, edición, borrado, renombrado de cuenta) incrementa data_version de las cuentas afectadas.
+-- Ejecutar en Supabase Dashboard > SQL Editor.
+
+ALTER TABLE public.accounts ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0;
+
+-- Incremento atómico (PostgREST no permite "data_version = data_version + 1" en un PATCH)
+CREATE OR REPLACE FUNCTION public.bump_account_versions(p_account_ids UUID[])
+RETURNS TABLE (id UUID, data_version BIGINT)
+LANGUAGE sql
+AS $$
+    UPDATE public.accounts AS a
+    SET data_version = a.data_version + 1
+    WHERE a.id = ANY(p_account_ids)
+    RETURNING a.id, a.data_version;
+$$;
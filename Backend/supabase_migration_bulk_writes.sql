@@ -0,0 +1,152 @@
+-- Migración: escrituras en una sola transacción: borrado y edición en bloque (PATCH /GET/transactions/bulk,
+-- POST /GET/transactions/bulk-delete y las ediciones de una fila), inserción de extractos y renombrado de cuenta.
+-- La escritura, el incremento de data_version y el registro en account_changes van en la misma sentencia:
+-- o se aplica toda la selección o nada (antes era un PATCH/DELETE de PostgREST por bloque de 500 ids).
+-- Los ids van en el cuerpo de la llamada RPC, sin el límite de longitud de la URL de in_().
+-- Ejecutar en Supabase Dashboard > SQL Editor (después de supabase_migration_account_changes.sql).
+
+CREATE OR REPLACE FUNCTION public.bulk_delete_transactions(
+    p_account_ids UUID[],
+    p_ids BIGINT[] DEFAULT NULL,
+    p_from_date TIMESTAMPTZ DEFAULT NULL,
+    p_to_date TIMESTAMPTZ DEFAULT NULL,
+    p_import_batch UUID DEFAULT NULL
+)
+RETURNS TABLE (id BIGINT, account_id UUID)
+LANGUAGE sql
+AS $$
+    WITH deleted AS (
+        DELETE FROM public.transactions AS t
+        WHERE t.account_id = ANY(p_account_ids)
+          AND (p_ids IS NULL OR t.id = ANY(p_ids))
+          AND (p_from_date IS NULL OR t.dt_date >= p_from_date)
+          AND (p_to_date IS NULL OR t.dt_date <= p_to_date)
+          AND (p_import_batch IS NULL OR t.import_batch = p_import_batch)
+        RETURNING t.id, t.account_id, t.dt_date
+    ),
+    touched AS (
+        SELECT d.account_id, min(d.dt_date) AS from_date, max(d.dt_date) AS to_date
+        FROM deleted AS d GROUP BY d.account_id
+    ),
+    bumped AS (
+        UPDATE public.accounts AS a
+        SET data_version = a.data_version + 1
+        FROM touched
+        WHERE a.id = touched.account_id
+        RETURNING a.id, a.data_version, touched.from_date, touched.to_date
+    ),
+    logged AS (
+        INSERT INTO public.account_changes (account_id, data_version, from_date, to_date)
+        SELECT b.id, b.data_version, b.from_date, b.to_date FROM bumped AS b
+    )
+    SELECT d.id, d.account_id FROM deleted AS d;
+$$;
+
+-- p_data: columnas a cambiar (las ausentes no se tocan). Si cambia dt_date o saldo no se anota rango en
+-- account_changes: las fechas previas ya no se conocen y las cachés por periodo recalculan la cuenta.
+-- p_skip_manual: no tocar filas con categoria_manual (la recategorización en segundo plano; la condición va
+-- en el UPDATE, así que una edición manual hecha mientras corre el job no se pisa).
+-- Versión anterior sin p_skip_manual: se borra para que no quede una sobrecarga
+DROP FUNCTION IF EXISTS public.bulk_update_transactions(UUID[], JSONB, BIGINT[], TIMESTAMPTZ, TIMESTAMPTZ, UUID);
+CREATE OR REPLACE FUNCTION public.bulk_update_transactions(
+    p_account_ids UUID[],
+    p_data JSONB,
+    p_ids BIGINT[] DEFAULT NULL,
+    p_from_date TIMESTAMPTZ DEFAULT NULL,
+    p_to_date TIMESTAMPTZ DEFAULT NULL,
+    p_import_batch UUID DEFAULT NULL,
+    p_skip_manual BOOLEAN DEFAULT false
+)
+RETURNS TABLE (id BIGINT, account_id UUID)
+LANGUAGE sql
+AS $$
+    WITH updated AS (
+        UPDATE public.transactions AS t SET
+            dt_date = CASE WHEN p_data ? 'dt_date' THEN (p_data->>'dt_date')::TIMESTAMPTZ ELSE t.dt_date END,
+            importe = CASE WHEN p_data ? 'importe' THEN (p_data->>'importe')::DECIMAL ELSE t.importe END,
+            saldo = CASE WHEN p_data ? 'saldo' THEN (p_data->>'saldo')::DECIMAL ELSE t.saldo END,
+            descripcion = CASE WHEN p_data ? 'descripcion' THEN p_data->>'descripcion' ELSE t.descripcion END,
+            categoria = CASE WHEN p_data ? 'categoria' THEN p_data->>'categoria' ELSE t.categoria END,
+            subcategoria = CASE WHEN p_data ? 'subcategoria' THEN p_data->>'subcategoria' ELSE t.subcategoria END,
+            categoria_manual = CASE
+                WHEN p_data ? 'categoria_manual' THEN (p_data->>'categoria_manual')::BOOLEAN
+                ELSE t.categoria_manual
+            END
+        WHERE t.account_id = ANY(p_account_ids)
+          AND (p_ids IS NULL OR t.id = ANY(p_ids))
+          AND (p_from_date IS NULL OR t.dt_date >= p_from_date)
+          AND (p_to_date IS NULL OR t.dt_date <= p_to_date)
+          AND (p_import_batch IS NULL OR t.import_batch = p_import_batch)
+          AND NOT (p_skip_manual AND t.categoria_manual)
+        RETURNING t.id, t.account_id
+    ),
+    bumped AS (
+        UPDATE public.accounts AS a
+        SET data_version = a.data_version + 1
+        WHERE a.id IN (SELECT u.account_id FROM updated AS u)
+        RETURNING a.id, a.data_version
+    ),
+    logged AS (
+        INSERT INTO public.account_changes (account_id, data_version, from_date, to_date)
+        SELECT b.id, b.data_version, NULL, NULL FROM bumped AS b
+        WHERE NOT (p_data ?| ARRAY['dt_date', 'saldo'])
+    )
+    SELECT u.id, u.account_id FROM updated AS u;
+$$;
+
+-- p_rows: filas a insertar (claves = columnas de transactions). Las que ya existen (transaction_id) se omiten.
+-- Si falla el incremento de data_version tampoco quedan las filas: el ETag no puede quedarse atrás.
+CREATE OR REPLACE FUNCTION public.insert_transactions(p_rows JSONB)
+RETURNS TABLE (id BIGINT, account_id UUID)
+LANGUAGE sql
+AS $$
+    WITH inserted AS (
+        INSERT INTO public.transactions AS t (
+            transaction_id, account_id, dt_date, importe, saldo, cuenta, descripcion,
+            categoria, subcategoria, categoria_manual, bizum_mensaje, referencia, import_batch
+        )
+        SELECT
+            r.transaction_id, r.account_id, r.dt_date, r.importe, r.saldo, r.cuenta, r.descripcion,
+            r.categoria, r.subcategoria, COALESCE(r.categoria_manual, false), r.bizum_mensaje, r.referencia,
+            r.import_batch
+        FROM jsonb_to_recordset(p_rows) AS r(
+            transaction_id VARCHAR(64), account_id UUID, dt_date TIMESTAMPTZ, importe DECIMAL(12, 2),
+            saldo DECIMAL(12, 2), cuenta VARCHAR(100), descripcion TEXT, categoria VARCHAR(50),
+            subcategoria VARCHAR(100), categoria_manual BOOLEAN, bizum_mensaje TEXT, referencia VARCHAR(100),
+            import_batch UUID
+        )
+        ON CONFLICT (transaction_id) DO NOTHING
+        RETURNING t.id, t.account_id, t.dt_date
+    ),
+    touched AS (
+        SELECT i.account_id, min(i.dt_date) AS from_date, max(i.dt_date) AS to_date
+        FROM inserted AS i GROUP BY i.account_id
+    ),
+    bumped AS (
+        UPDATE public.accounts AS a
+        SET data_version = a.data_version + 1
+        FROM touched
+        WHERE a.id = touched.account_id
+        RETURNING a.id, a.data_version, touched.from_date, touched.to_date
+    ),
+    logged AS (
+        INSERT INTO public.account_changes (account_id, data_version, from_date, to_date)
+        SELECT b.id, b.data_version, b.from_date, b.to_date FROM bumped AS b
+    )
+    SELECT i.id, i.account_id FROM inserted AS i;
+$$;
+
+-- Renombrado e incremento de data_version en el mismo UPDATE (cambio sin efecto en fechas ni saldos)
+CREATE OR REPLACE FUNCTION public.rename_account(p_account_id UUID, p_display_name TEXT)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    WITH renamed AS (
+        UPDATE public.accounts AS a
+        SET display_name = p_display_name, data_version = a.data_version + 1
+        WHERE a.id = p_account_id
+        RETURNING a.id, a.data_version
+    )
+    INSERT INTO public.account_changes (account_id, data_version, from_date, to_date)
+    SELECT r.id, r.data_version, NULL, NULL FROM renamed AS r;
+$$;
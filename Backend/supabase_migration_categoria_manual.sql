@@ -0,0 +1,6 @@
+-- Migración: marca de categoría editada a mano.
+-- Las ediciones de categoría (PATCH /GET/transactions/{id}/category y /GET/transactions/bulk) la ponen a true;
+-- la recategorización en segundo plano (POST /GET/transactions/recategorize) no toca esas filas.
+-- Ejecutar en Supabase Dashboard > SQL Editor.
+
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS categoria_manual BOOLEAN NOT NULL DEFAULT false;
@@ -0,0 +1,16 @@
+-- Migración: reglas de categoría por usuario (y opcionalmente por cuenta), por encima de CATEGORY_RULES.
+-- Se gestionan en /rules; se aplican al subir extractos y en POST /GET/transactions/recategorize.
+-- Ejecutar en Supabase Dashboard > SQL Editor.
+
+CREATE TABLE IF NOT EXISTS public.category_rules (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL,
+    account_id UUID REFERENCES public.accounts(id) ON DELETE CASCADE,  -- NULL: todas las cuentas del usuario
+    pattern TEXT NOT NULL,                  -- regex sobre la descripción en mayúsculas
+    categoria VARCHAR(50) NOT NULL,
+    subcategoria VARCHAR(100),
+    priority INTEGER NOT NULL DEFAULT 0,    -- menor = se evalúa antes
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_category_rules_user_id ON public.category_rules(user_id);
@@ -0,0 +1,7 @@
+-- Migración: import_batch en transactions para poder seleccionar (y deshacer) una importación concreta.
+-- Cada subida a /upload/Transactions genera un UUID de lote y lo guarda en todas sus filas.
+-- Ejecutar en Supabase Dashboard > SQL Editor.
+
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS import_batch UUID;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_import_batch ON public.transactions(import_batch);
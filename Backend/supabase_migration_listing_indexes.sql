@@ -0,0 +1,11 @@
+-- Migración: índices compuestos para los listados filtrados (GET /GET/transactions?account_id=&categoria=...).
+-- Los listados filtran siempre por cuenta y ordenan por fecha; con categoría, además la igualdad sobre categoria.
+-- (account_id, dt_date) cubre también las consultas solo por account_id: el índice simple sobra.
+-- Ejecutar en Supabase Dashboard > SQL Editor.
+
+CREATE INDEX IF NOT EXISTS idx_transactions_account_dt_date
+    ON public.transactions(account_id, dt_date DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_categoria_dt_date
+    ON public.transactions(account_id, categoria, dt_date DESC);
+
+DROP INDEX IF EXISTS public.idx_transactions_account_id;
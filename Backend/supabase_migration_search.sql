@@ -0,0 +1,77 @@
+-- Migración: búsqueda de texto en transacciones (GET /GET/transactions/search).
+-- Busca en descripcion, bizum_mensaje y subcategoria sin distinguir mayúsculas ni acentos:
+--   - search_tsv (tsvector, índice GIN): palabras completas, con ranking ts_rank.
+--   - search_text + pg_trgm (índice GIN trigram): prefijos y erratas ("ikae" -> "IKEA") con word_similarity.
+-- Las columnas son GENERATED: se mantienen solas en cada INSERT/UPDATE.
+-- Ejecutar en Supabase Dashboard > SQL Editor.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() no es IMMUTABLE (depende del diccionario): envoltorio para poder usarlo en columnas generadas
+CREATE OR REPLACE FUNCTION public.immutable_unaccent(TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, $1);
+$$;
+
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS search_text TEXT
+    GENERATED ALWAYS AS (
+        lower(public.immutable_unaccent(
+            coalesce(descripcion, '') || ' ' || coalesce(bizum_mensaje, '') || ' ' || coalesce(subcategoria, '')
+        ))
+    ) STORED;
+
+-- Una columna generada no puede usar otra: se repite la expresión
+ALTER TABLE public.transactions ADD COLUMN IF NOT EXISTS search_tsv TSVECTOR
+    GENERATED ALWAYS AS (
+        to_tsvector('simple'::regconfig, lower(public.immutable_unaccent(
+            coalesce(descripcion, '') || ' ' || coalesce(bizum_mensaje, '') || ' ' || coalesce(subcategoria, '')
+        )))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_transactions_search_tsv ON public.transactions USING GIN (search_tsv);
+CREATE INDEX IF NOT EXISTS idx_transactions_search_trgm ON public.transactions USING GIN (search_text gin_trgm_ops);
+
+-- Resultados ordenados por relevancia (ts_rank + word_similarity) y, a igualdad, por fecha descendente
+CREATE OR REPLACE FUNCTION public.search_transactions(
+    p_account_ids UUID[],
+    p_query TEXT,
+    p_limit INTEGER DEFAULT 50,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id BIGINT,
+    transaction_id VARCHAR,
+    account_id UUID,
+    dt_date TIMESTAMPTZ,
+    importe DECIMAL,
+    saldo DECIMAL,
+    cuenta VARCHAR,
+    descripcion TEXT,
+    categoria VARCHAR,
+    subcategoria VARCHAR,
+    categoria_manual BOOLEAN,
+    bizum_mensaje TEXT,
+    referencia VARCHAR,
+    import_batch UUID,
+    created_at TIMESTAMPTZ,
+    rank REAL
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH q AS (
+        SELECT lower(public.immutable_unaccent(p_query)) AS text,
+               plainto_tsquery('simple'::regconfig, lower(public.immutable_unaccent(p_query))) AS ts
+    )
+    SELECT t.id, t.transaction_id, t.account_id, t.dt_date, t.importe, t.saldo, t.cuenta, t.descripcion,
+           t.categoria, t.subcategoria, t.categoria_manual, t.bizum_mensaje, t.referencia, t.import_batch,
+           t.created_at,
+           (ts_rank(t.search_tsv, q.ts) + word_similarity(q.text, t.search_text))::REAL AS rank
+    FROM public.transactions AS t, q
+    WHERE t.account_id = ANY(p_account_ids)
+      AND (t.search_tsv @@ q.ts OR q.text <% t.search_text)
+    ORDER BY rank DESC, t.dt_date DESC, t.id DESC
+    LIMIT p_limit OFFSET p_offset;
+$$;
@@ -10,6 +10,7 @@ CREATE TABLE IF NOT EXISTS accounts (
     stable_key VARCHAR(50) UNIQUE NOT NULL,  -- "ibercaja_716552" | "revolut"
     display_name VARCHAR(100),               -- nombre mostrado, editable por el usuario
     source VARCHAR(20) NOT NULL DEFAULT 'ibercaja',
+    data_version BIGINT NOT NULL DEFAULT 0,  -- se incrementa con cada escritura (ETag de los GET)
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
@@ -34,19 +35,86 @@ CREATE TABLE IF NOT EXISTS transactions (
     descripcion TEXT,
     categoria VARCHAR(50),
     subcategoria VARCHAR(100),
+    categoria_manual BOOLEAN NOT NULL DEFAULT false,  -- editada a mano: la recategorización no la toca
     bizum_mensaje TEXT,
     referencia VARCHAR(100),
+    import_batch UUID,            -- lote de importación (una subida de extracto)
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_transactions_account_id ON transactions(account_id);
+-- Listados: siempre por cuenta y fecha, a menudo también por categoría (ver supabase_migration_listing_indexes.sql)
+CREATE INDEX IF NOT EXISTS idx_transactions_account_dt_date ON transactions(account_id, dt_date DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_account_categoria_dt_date ON transactions(account_id, categoria, dt_date DESC);
 CREATE INDEX IF NOT EXISTS idx_transactions_dt_date ON transactions(dt_date DESC);
 CREATE INDEX IF NOT EXISTS idx_transactions_transaction_id ON transactions(transaction_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_import_batch ON transactions(import_batch);
+
+-- 4. Reglas de categoría por usuario/cuenta (ver supabase_migration_category_rules.sql)
+CREATE TABLE IF NOT EXISTS category_rules (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL,
+    account_id UUID REFERENCES accounts(id) ON DELETE CASCADE,  -- NULL: todas las cuentas del usuario
+    pattern TEXT NOT NULL,                  -- regex sobre la descripción en mayúsculas
+    categoria VARCHAR(50) NOT NULL,
+    subcategoria VARCHAR(100),
+    priority INTEGER NOT NULL DEFAULT 0,    -- menor = se evalúa antes
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_category_rules_user_id ON category_rules(user_id);
+
+-- 5. Incremento atómico de data_version (ver supabase_migration_account_versions.sql)
+CREATE OR REPLACE FUNCTION bump_account_versions(p_account_ids UUID[])
+RETURNS TABLE (id UUID, data_version BIGINT)
+LANGUAGE sql
+AS $$
+    UPDATE accounts AS a
+    SET data_version = a.data_version + 1
+    WHERE a.id = ANY(p_account_ids)
+    RETURNING a.id, a.data_version;
+$$;
+
+-- 6. Búsqueda de texto (GET /GET/transactions/search): columnas generadas search_text/search_tsv,
+--    índices GIN y función search_transactions. Ejecutar supabase_migration_search.sql.
+
+-- 7. Registro de cambios por cuenta (rango de fechas de cada data_version, para las series de saldo)
+CREATE TABLE IF NOT EXISTS account_changes (
+    account_id UUID NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    data_version BIGINT NOT NULL,
+    from_date TIMESTAMPTZ,
+    to_date TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (account_id, data_version)
+);
+
+-- Retención: solo las últimas 100 versiones por cuenta. Una caché más antigua no encuentra todos sus
+-- cambios (faltan filas) y recalcula la cuenta entera, que de todos modos es más barato que 100 rangos.
+CREATE OR REPLACE FUNCTION prune_account_changes()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM account_changes
+    WHERE account_id = NEW.account_id AND data_version <= NEW.data_version - 100;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS account_changes_retention ON account_changes;
+CREATE TRIGGER account_changes_retention
+    AFTER INSERT ON account_changes
+    FOR EACH ROW EXECUTE FUNCTION prune_account_changes();
+
+-- 8. Escrituras en una transacción (escritura + data_version + account_changes): funciones
+--    bulk_delete_transactions, bulk_update_transactions, insert_transactions y rename_account.
+--    Ejecutar supabase_migration_bulk_writes.sql.
 
 -- =============================================
 -- EMPEZAR DESDE CERO (si ya tienes tablas antiguas):
 -- Ejecuta primero esto, luego el script de arriba:
 --
+--   DROP TABLE IF EXISTS account_changes CASCADE;
+--   DROP TABLE IF EXISTS category_rules CASCADE;
 --   DROP TABLE IF EXISTS transactions CASCADE;
 --   DROP TABLE IF EXISTS user_accounts CASCADE;
 --   DROP TABLE IF EXISTS accounts CASCADE;